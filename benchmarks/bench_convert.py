@@ -0,0 +1,111 @@
+# benchmarks/bench_convert.py
+# Micro-benchmark for tensor <-> uint8 conversions: the previous numpy code
+# path against nodes/image_convert.py. Every case runs in a fresh process so
+# the peak RSS delta (ru_maxrss) belongs to that conversion only.
+#
+#   python benchmarks/bench_convert.py [--sizes 512 1024 2048 4096] [--batches 1 4 16]
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nodes.image_convert import tensor_to_uint8, pil_images_to_tensor # noqa: E402
+
+
+# --- Previous implementations (as they were in nodes/utils.py) ---
+
+def legacy_encode(image_tensor):
+    results = []
+    for image in image_tensor:
+        image_np = image.cpu().numpy()
+        if image_np.min() < 0.0 or image_np.max() > 1.0:
+            image_np = np.clip(image_np, 0.0, 1.0)
+        results.append((image_np * 255).astype(np.uint8))
+    return results
+
+
+def legacy_decode(images):
+    tensors = []
+    for i in images:
+        image = np.array(i.convert("RGB")).astype(np.float32) / 255.0
+        tensors.append(torch.from_numpy(image)[None,])
+    return torch.cat(tensors, dim=0)
+
+
+# --- New implementations ---
+
+def new_encode(image_tensor):
+    return tensor_to_uint8(image_tensor)
+
+
+def new_encode_normalized(image_tensor):
+    return tensor_to_uint8(image_tensor, assume_normalized=True)
+
+
+def new_decode(images):
+    return pil_images_to_tensor(images)
+
+
+CASES = {
+    "encode/legacy": (legacy_encode, "tensor"),
+    "encode/new": (new_encode, "tensor"),
+    "encode/new[0,1]": (new_encode_normalized, "tensor"),
+    "decode/legacy": (legacy_decode, "pil"),
+    "decode/new": (new_decode, "pil"),
+}
+
+
+def _max_rss_bytes():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _run_case(name, size, batch, queue):
+    func, kind = CASES[name]
+    torch.manual_seed(0)
+    image_tensor = torch.rand(batch, size, size, 3)
+    data = image_tensor
+    if kind == "pil":
+        pixels = (image_tensor * 255).to(torch.uint8).numpy()
+        data = [Image.fromarray(p, "RGB") for p in pixels]
+        del image_tensor
+    baseline = _max_rss_bytes()
+    start = time.perf_counter()
+    func(data)
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, max(0, _max_rss_bytes() - baseline)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tensor <-> image conversion micro-benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048, 4096])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-gb", type=float, default=2.0, help="skip cases whose float32 input exceeds this")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'size':>6} {'batch':>5} {'case':>16} {'time s':>8} {'peak +MB':>9}")
+    for size in args.sizes:
+        for batch in args.batches:
+            if batch * size * size * 3 * 4 > args.max_gb * 2**30:
+                print(f"{size:>6} {batch:>5} {'(skipped)':>16}")
+                continue
+            for name in CASES:
+                queue = context.Queue()
+                process = context.Process(target=_run_case, args=(name, size, batch, queue))
+                process.start()
+                elapsed, peak = queue.get()
+                process.join()
+                print(f"{size:>6} {batch:>5} {name:>16} {elapsed:>8.3f} {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
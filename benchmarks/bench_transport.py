@@ -0,0 +1,60 @@
+# benchmarks/bench_transport.py
+# Compares the request body size and peak traced memory of the base64-in-JSON
+# launch payload against the binary multipart payload. No network access.
+#
+#   python benchmarks/bench_transport.py [--sizes 512 1024 2048] [--format PNG]
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import torch
+from urllib3 import encode_multipart_formdata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nodes.utils import tensor_to_base64_data_uri, tensor_to_image_bytes # noqa: E402
+
+
+def base64_body(image, image_format):
+    data_uri = tensor_to_base64_data_uri(image, image_format=image_format)
+    return json.dumps({"inputs": {"image": data_uri, "upscalingResize": 2.0}}).encode("utf-8")
+
+
+def multipart_body(image, image_format):
+    image_bytes, mime_type = tensor_to_image_bytes(image, image_format=image_format)
+    body, _ = encode_multipart_formdata({
+        "inputs": (None, json.dumps({"upscalingResize": 2.0}), "application/json"),
+        "image": ("image." + mime_type.split("/")[-1], image_bytes, mime_type),
+    })
+    return body
+
+
+def measure(build, image, image_format):
+    tracemalloc.start()
+    start = time.perf_counter()
+    body = build(image, image_format)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(body), peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Base64 JSON vs multipart launch payloads")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048])
+    parser.add_argument("--format", default="PNG", choices=["PNG", "JPEG"])
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'path':>10} {'wire MB':>9} {'peak MB':>9} {'time s':>8}")
+    for size in args.sizes:
+        torch.manual_seed(0)
+        image = torch.rand(1, size, size, 3)
+        for name, build in (("base64", base64_body), ("multipart", multipart_body)):
+            wire, peak, elapsed = measure(build, image, args.format)
+            print(f"{size:>6} {name:>10} {wire / 2**20:>9.2f} {peak / 2**20:>9.2f} {elapsed:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 # nodes/any_llm_node.py
-import time
 import json
 
-# Import helpers from utils.py
-from .utils import post_request, get_request
+# Shared launch/poll engine
+from .launch_engine import PollPolicy, LaunchResult, run_launch, launch_url_for, extract_llm_answer
+from .request_memo import node_fingerprint
+from .llm_cache import cached_llm_answer, lookup_answer, store_answer
+from .async_utils import run_async, gather_launches, race_launches
 
 class PiperAskAnyLLM:
     # Full list of models for the dropdown
@@ -27,6 +29,10 @@ class PiperAskAnyLLM:
         "olmo-2-32b", "olmo-4-synthetic", "lfm-40b", "evil"
     ]
 
+    # How `question` is read: one question, one question per line, or a JSON array of questions
+    BATCH_MODES = ["off", "lines", "json"]
+    MAX_BATCH_CONCURRENCY = 64
+
     @classmethod
     def INPUT_TYPES(s):
         s.MODEL_LIST.sort() # Sort models alphabetically
@@ -37,20 +43,49 @@ class PiperAskAnyLLM:
                 "model": (s.MODEL_LIST, {"default": "gpt-4o-mini"}), # Add model selection
                 "poll_interval": ("INT", {"default": 1, "min": 1, "max": 30}),
                 "max_wait_time": ("INT", {"default": 120, "min": 10, "max": 600}), # Increased timeout slightly
+            },
+            "optional": {
+                # Off = always ask the model again (bypasses the answer cache)
+                "use_cache": ("BOOLEAN", {"default": True}),
+                "batch_mode": (s.BATCH_MODES, {"default": "off"}),
+                "max_concurrency": ("INT", {"default": 8, "min": 1, "max": s.MAX_BATCH_CONCURRENCY}),
+                # Race mode: fallback models (comma or newline separated) asked after `model`;
+                # the first valid answer wins and the other launches stop polling
+                "race_models": ("STRING", {"multiline": True, "default": ""}),
+                # Seconds between hedged launches; 0 = launch all race models at once
+                "race_stagger": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 120.0, "step": 0.5}),
             }
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("llm_answer",)
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        return node_fingerprint("ask-llm-agent-free-v1", kwargs)
+
+    # In batch mode llm_answer is a JSON array of answers (null for failed items);
+    # batch_results always holds the per-item status/answer/error list
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("llm_answer", "batch_results")
     FUNCTION = "ask_any_llm" # New function name
     CATEGORY = "PiperAPI/LLM" # Main LLM category
 
     # New method name
-    def ask_any_llm(self, api_key, question, model, poll_interval, max_wait_time):
-        # Use the generic LLM agent URL
-        launch_url = "https://app.piper.my/api/ask-llm-agent-free-v1/launch"
-        state_url_template = "https://app.piper.my/api/launches/{}/state"
-        default_error_result = "Error: Processing failed before completion"
+    def ask_any_llm(self, api_key, question, model, poll_interval, max_wait_time, use_cache=True,
+                    batch_mode="off", max_concurrency=8, race_models="", race_stagger=0.0):
+        policy = PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time)
+        if batch_mode != "off":
+            try:
+                questions = self.parse_questions(question, batch_mode)
+            except ValueError as e:
+                err_msg = f"Error: Invalid question list ({e})"
+                print(err_msg)
+                return (err_msg, json.dumps([], ensure_ascii=False))
+            if race_models.strip():
+                print("[PiperAskAnyLLM] race_models is ignored in batch mode")
+            return self.ask_batch(api_key, questions, model, policy, use_cache, max_concurrency)
+
+        models = self.parse_race_models(model, race_models)
+        if len(models) > 1:
+            return self.ask_race(api_key, question, models, policy, use_cache, race_stagger)
 
         # 1. Launch LLM task including the selected model
         launch_data = {
@@ -59,54 +94,130 @@ class PiperAskAnyLLM:
                 "model": model # Pass selected model
             }
         }
-        launch_response = post_request(launch_url, api_key, launch_data)
-
-        if not launch_response or "_id" not in launch_response:
-            err_msg = "Error: Failed to launch Any LLM task or get launch ID."
-            print(err_msg)
-            return (err_msg,)
-
-        launch_id = launch_response["_id"]
-        state_url = state_url_template.format(launch_id)
-
-        # 2. Poll based on 'outputs' and 'errors' fields (same logic as before)
-        start_time = time.time()
-        while True:
-            current_time = time.time()
-            if current_time - start_time > max_wait_time:
-                err_msg = f"Error: Timed out waiting for Any LLM response {launch_id}"
-                print(err_msg)
-                return (err_msg,)
 
-            state_response = get_request(state_url, api_key)
+        # 2. Launch and poll through the shared engine (unless the answer is cached)
+        result = cached_llm_answer(
+            "ask-llm-agent-free-v1", model, question,
+            lambda: run_launch(launch_url_for("ask-llm-agent-free-v1"), api_key, launch_data,
+                               extractor=extract_llm_answer, policy=policy, log_prefix="[PiperAskAnyLLM]"),
+            use_cache=use_cache, log_prefix="[PiperAskAnyLLM]")
+
+        batch_results = json.dumps([self.item_result(0, question, result)], ensure_ascii=False)
+        if result.ok:
+            return (result.value, batch_results)
+
+        print(f"Error: Any LLM task failed ({result.message})")
+        return (self.error_text(result), batch_results)
+
+    @staticmethod
+    def error_text(result):
+        if result.status == LaunchResult.API_ERROR:
+            return f"Error: API processing failed - {json.dumps(result.errors)}"
+        if result.status == LaunchResult.BAD_OUTPUTS:
+            return f"Completed (no answer found): {json.dumps(result.outputs)}"
+        return f"Error: {result.message}"
 
-            if not state_response:
-                print(f"Retrying state check in {poll_interval}s...")
-                time.sleep(poll_interval)
+    def item_result(self, index, item_question, result):
+        entry = {"index": index, "question": item_question, "status": result.status, "launch_id": result.launch_id}
+        if result.ok:
+            entry["answer"] = result.value
+            entry["cached"] = result.message == "cached"
+        else:
+            entry["error"] = self.error_text(result)
+        return entry
+
+    def parse_race_models(self, model, race_models):
+        """Ordered, de-duplicated race list starting with `model`; unknown names are skipped."""
+        models = [model]
+        for name in (race_models or "").replace(",", "\n").splitlines():
+            name = name.strip()
+            if not name or name in models:
+                continue
+            if name not in self.MODEL_LIST:
+                print(f"[PiperAskAnyLLM] Unknown race model '{name}' skipped")
                 continue
+            models.append(name)
+        return models
 
-            errors = state_response.get("errors")
-            if errors and isinstance(errors, list) and len(errors) > 0:
-                err_msg = f"Error: Any LLM task failed (API Errors: {errors})"
-                print(err_msg)
-                print(f"Full state response: {state_response}")
-                return (f"Error: API processing failed - {json.dumps(errors)}",)
-
-            outputs = state_response.get("outputs")
-            if outputs:
-                 answer = None
-                 if isinstance(outputs, str):
-                     answer = outputs
-                 elif isinstance(outputs, dict):
-                     answer = outputs.get("answer") or outputs.get("text") or outputs.get("result")
-                     if answer is None and len(outputs) == 1:
-                         answer = list(outputs.values())[0]
-
-                 if answer is not None and isinstance(answer, str):
-                     return (answer,)
-                 else:
-                     err_msg = f"Completed, but answer not found or invalid in outputs: {outputs}"
-                     print(err_msg)
-                     return (f"Completed (no answer found): {json.dumps(outputs)}",)
-
-            time.sleep(poll_interval) 
\ No newline at end of file
+    def ask_race(self, api_key, question, models, policy, use_cache, stagger):
+        """Asks the same question on several models (hedged) and returns the first valid answer."""
+        endpoint = "ask-llm-agent-free-v1"
+        if use_cache:
+            for model in models:
+                cached = lookup_answer(endpoint, model, question, "[PiperAskAnyLLM]")
+                if cached is not None:
+                    item = self.item_result(0, question, cached)
+                    item.update({"model": model, "latency_s": 0.0})
+                    return (cached.value, json.dumps([item], ensure_ascii=False))
+
+        print(f"[PiperAskAnyLLM] Racing {len(models)} models (stagger {stagger}s): {models}")
+        launches = [{
+            "launch_url": launch_url_for(endpoint),
+            "api_key": api_key,
+            "launch_data": {"inputs": {"question": question, "model": model}},
+            "extractor": extract_llm_answer,
+            "policy": policy,
+        } for model in models]
+        winner, results, latencies = run_async(race_launches(launches, stagger=stagger))
+
+        race = [{"model": model, "status": result.status if result else "cancelled",
+                 "latency_s": round(latency, 3) if latency is not None else None}
+                for model, result, latency in zip(models, results, latencies)]
+        if winner is None:
+            failed = [result for result in results if result is not None]
+            result = failed[0] if failed else LaunchResult(LaunchResult.LAUNCH_FAILED, message="no model answered")
+            item = self.item_result(0, question, result)
+            item["race"] = race
+            print(f"Error: Any LLM race failed on all {len(models)} models")
+            return (self.error_text(result), json.dumps([item], ensure_ascii=False))
+
+        result = results[winner]
+        if use_cache:
+            store_answer(endpoint, models[winner], question, result)
+        print(f"[PiperAskAnyLLM] Race won by {models[winner]} in {latencies[winner]:.2f}s")
+        item = self.item_result(0, question, result)
+        item.update({"model": models[winner], "latency_s": round(latencies[winner], 3), "race": race})
+        return (result.value, json.dumps([item], ensure_ascii=False))
+
+    @staticmethod
+    def parse_questions(question, batch_mode):
+        """Splits the question input into a list of non-empty questions."""
+        if batch_mode == "json":
+            items = json.loads(question)
+            if not isinstance(items, list):
+                raise ValueError("expected a JSON array")
+            questions = [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in items]
+        else:
+            questions = question.splitlines()
+        questions = [q.strip() for q in questions if q and q.strip()]
+        if not questions:
+            raise ValueError("no questions found")
+        return questions
+
+    def ask_batch(self, api_key, questions, model, policy, use_cache, max_concurrency):
+        """Launches all uncached questions concurrently; answers keep the input order."""
+        endpoint = "ask-llm-agent-free-v1"
+        results = [lookup_answer(endpoint, model, q, "[PiperAskAnyLLM]") if use_cache else None for q in questions]
+        pending = [index for index, result in enumerate(results) if result is None]
+        print(f"[PiperAskAnyLLM] Batch of {len(questions)} questions: {len(questions) - len(pending)} cached, "
+              f"{len(pending)} launched (max {max_concurrency} in flight)")
+        if pending:
+            launches = [{
+                "launch_url": launch_url_for(endpoint),
+                "api_key": api_key,
+                "launch_data": {"inputs": {"question": questions[index], "model": model}},
+                "extractor": extract_llm_answer,
+                "policy": policy,
+            } for index in pending]
+            launched = run_async(gather_launches(launches, concurrency=max_concurrency))
+            for index, result in zip(pending, launched):
+                results[index] = result
+                if use_cache:
+                    store_answer(endpoint, model, questions[index], result)
+
+        items = [self.item_result(index, q, result) for index, (q, result) in enumerate(zip(questions, results))]
+        failed = [item["index"] for item in items if "error" in item]
+        if failed:
+            print(f"[PiperAskAnyLLM] {len(failed)}/{len(items)} questions failed: {failed}")
+        answers = [result.value if result.ok else None for result in results]
+        return (json.dumps(answers, ensure_ascii=False), json.dumps(items, ensure_ascii=False))
@@ -0,0 +1,565 @@
+# nodes/async_utils.py
+# Asyncio variants of the helpers in utils.py and of the launch engine, so a
+# single event loop can drive many launches at once. Uses aiohttp when it is
+# installed; otherwise each call runs the pooled sync helper in a worker thread.
+import asyncio
+import hashlib
+import json
+import os
+import atexit
+import threading
+import time
+import weakref
+
+try:
+    import aiohttp
+except ImportError: # aiohttp is optional
+    aiohttp = None
+
+from .utils import (
+    DEFAULT_MAX_CONNECTIONS,
+    DOWNLOAD_CHUNK_SIZE,
+    DownloadLimitError,
+    ImageDownload,
+    UPLOAD_URL,
+    post_request,
+    post_request_json,
+    get_request,
+    post_request_multipart,
+    upload_image_and_get_url,
+    url_to_image_tensor,
+    decoded_image_to_tensor,
+    tensor_to_png_bytes,
+    encode_upload_file,
+    PiperAPIError,
+    RetryableAPIError,
+    FatalAPIError,
+    admit_request,
+    record_outcome,
+    abandon_request,
+    api_error_for_status,
+)
+from .image_convert import uint8_to_tensor
+from .result_cache import get_result_cache
+from .rate_limiter import get_rate_limiter
+from .launch_engine import (
+    PollPolicy,
+    LaunchResult,
+    extract_raw_json,
+    parse_state,
+    parse_launch_response,
+    multipart_inputs,
+    finish_from_state,
+    launch_failed_result,
+    timeout_result,
+    state_url_for,
+    memo_key_for,
+    memo_lookup,
+    memo_remember,
+    LaunchInterrupted,
+    INTERRUPT_CHECK_INTERVAL,
+    interrupt_requested,
+    cancel_url_for,
+    fatal_result,
+    journal_key_for,
+    journal_reattach,
+    journal_record,
+    journal_finish,
+    JOURNAL_CANCELLED,
+)
+
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("PIPER_ASYNC_MAX_CONNECTIONS", str(DEFAULT_MAX_CONNECTIONS * 4)))
+DEFAULT_CONCURRENCY = 8
+
+# One aiohttp session per event loop (sessions cannot be shared across loops).
+# Node entry points all run on the background loop below, so in practice
+# there is a single long-lived session whose connections are reused.
+_async_sessions = weakref.WeakKeyDictionary()
+_async_http_stats = {"requests": 0, "new_connections": 0, "reused_connections": 0}
+_async_http_stats_lock = threading.Lock()
+
+
+def _count_async(name):
+    with _async_http_stats_lock:
+        _async_http_stats[name] += 1
+
+
+def _trace_config():
+    """Counts requests and new vs. reused pooled connections of the aiohttp connector."""
+    async def on_request_start(session, context, params):
+        _count_async("requests")
+
+    async def on_connection_create_end(session, context, params):
+        _count_async("new_connections")
+
+    async def on_connection_reuseconn(session, context, params):
+        _count_async("reused_connections")
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+
+def get_async_http_stats():
+    """Connection reuse counters of the aiohttp sessions, shaped like utils.get_http_stats()."""
+    with _async_http_stats_lock:
+        stats = dict(_async_http_stats)
+    stats["reuse_ratio"] = (stats["reused_connections"] / stats["requests"]) if stats["requests"] else 0.0
+    return stats
+
+
+def reset_async_http_stats():
+    with _async_http_stats_lock:
+        for key in _async_http_stats:
+            _async_http_stats[key] = 0
+
+
+def _get_async_session():
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=ASYNC_MAX_CONNECTIONS, limit_per_host=ASYNC_MAX_CONNECTIONS)
+        session = aiohttp.ClientSession(connector=connector, trace_configs=[_trace_config()])
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """Closes the aiohttp session bound to the running loop, if any."""
+    if aiohttp is None:
+        return
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    """Event loop on a daemon thread, started on first use and kept for the process lifetime."""
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="piper-async-loop", daemon=True)
+                thread.start()
+                _loop_thread = thread
+                _loop = loop
+    return _loop
+
+
+@atexit.register
+def _stop_background_loop():
+    loop = _loop
+    if loop is None or not loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(close_async_session(), loop).result(timeout=5)
+    except Exception as e:
+        print(f"[PiperAsync] Could not close the aiohttp session: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def run_async(coro):
+    """
+    Runs a coroutine to completion from sync code (node entry points) on the
+    shared background loop, so the aiohttp session and its pooled connections
+    survive between calls. Blocks the calling thread until the result is ready;
+    if the caller is interrupted the coroutine is cancelled.
+    """
+    loop = _background_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_async() called from the background loop; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+async def _request_json(method, url, headers, timeout, is_retry=False, **kwargs):
+    api_key = headers.get('api-token')
+    delay = admit_request(url, is_retry, api_key=api_key, wait=False)
+    settled = False
+    try:
+        if delay > 0:
+            await asyncio.sleep(delay) # Rate limiter: wait without blocking the loop
+        session = _get_async_session()
+        async with session.request(method, url, headers=headers,
+                                   timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+            if response.status >= 400:
+                error = api_error_for_status(response.status, await response.text(), url,
+                                             response.headers.get("Retry-After"))
+                record_outcome(url, error, api_key)
+                settled = True
+                raise error
+            record_outcome(url)
+            settled = True
+            return await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if not settled:
+            record_outcome(url, RetryableAPIError(f"Request to {url} failed: {e!r}", url=url))
+            settled = True
+        raise
+    finally:
+        if not settled: # Cancelled (e.g. a race loser): must not leave a half-open probe pinned
+            abandon_request(url)
+
+
+def _failed(error, raise_fatal):
+    if raise_fatal and isinstance(error, PiperAPIError) and not error.retryable:
+        raise error
+    return None
+
+
+# --- Async HTTP helpers (same return conventions as the sync ones) ---
+
+async def async_post_request(url, api_key, data, timeout=60, raise_fatal=False):
+    if aiohttp is None:
+        return await asyncio.to_thread(post_request, url, api_key, data, timeout=timeout, raise_fatal=raise_fatal)
+    headers = {'content-Type': 'application/json', 'api-token': api_key}
+    try:
+        return await _request_json("POST", url, headers, timeout, json=data)
+    except (PiperAPIError, aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+        return _failed(e, raise_fatal)
+
+
+async def async_post_request_json(url, api_key, json_data, timeout=60, raise_fatal=False):
+    if aiohttp is None:
+        return await asyncio.to_thread(post_request_json, url, api_key, json_data, timeout=timeout,
+                                       raise_fatal=raise_fatal)
+    headers = {'api-token': api_key, 'content-type': 'application/json'}
+    try:
+        delay = admit_request(url, api_key=api_key, wait=False)
+    except RetryableAPIError as e:
+        print(f"[AsyncUtils] {e}")
+        return {"error": str(e)}
+    settled = False
+    try:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        session = _get_async_session()
+        async with session.post(url, headers=headers, data=json.dumps(json_data),
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status >= 400:
+                error_content = await response.text()
+                print(f"[AsyncUtils] Ошибка POST JSON запроса к {url}: HTTP {response.status}")
+                error = api_error_for_status(response.status, error_content, url, response.headers.get("Retry-After"))
+                record_outcome(url, error, api_key)
+                settled = True
+                _failed(error, raise_fatal)
+                try:
+                    return json.loads(error_content)
+                except ValueError:
+                    return {"error": f"HTTP Error: {response.status}. Response: {error_content or 'No content'}"}
+            record_outcome(url)
+            settled = True
+            return await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if not settled:
+            record_outcome(url, RetryableAPIError(f"Request to {url} failed: {e!r}", url=url))
+            settled = True
+        print(f"[AsyncUtils] Ошибка POST JSON запроса к {url}: {e!r}")
+        return {"error": f"Request failed: {e!r}"}
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON response from server"}
+    finally:
+        if not settled: # Cancelled: free a half-open probe without counting a failure
+            abandon_request(url)
+
+
+async def async_get_request(url, api_key, timeout=60, raise_fatal=False, is_retry=False):
+    if aiohttp is None:
+        return await asyncio.to_thread(get_request, url, api_key, timeout=timeout, raise_fatal=raise_fatal,
+                                       is_retry=is_retry)
+    try:
+        return await _request_json("GET", url, {'api-token': api_key}, timeout, is_retry=is_retry)
+    except (PiperAPIError, aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+        return _failed(e, raise_fatal)
+
+
+async def async_post_request_multipart(url, api_key, json_data, image_tensor, timeout=120, image_field='image',
+                                       image_bytes=None, mime_type='image/png', raise_fatal=False):
+    if aiohttp is None:
+        return await asyncio.to_thread(post_request_multipart, url, api_key, json_data, image_tensor, timeout=timeout,
+                                       image_field=image_field, image_bytes=image_bytes, mime_type=mime_type,
+                                       raise_fatal=raise_fatal)
+    if image_bytes is None:
+        image_bytes = await asyncio.to_thread(tensor_to_png_bytes, image_tensor)
+        mime_type = 'image/png'
+    if image_bytes is None:
+        return None
+    form = aiohttp.FormData()
+    form.add_field('inputs', json.dumps(json_data), content_type='application/json')
+    form.add_field(image_field, image_bytes, filename=f"image.{mime_type.split('/')[-1]}", content_type=mime_type)
+    try:
+        return await _request_json("POST", url, {'api-token': api_key}, timeout, data=form)
+    except (PiperAPIError, aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+        return _failed(e, raise_fatal)
+
+
+async def async_upload_image_and_get_url(image_tensor, api_key, timeout=60, image_format='PNG'):
+    if aiohttp is None:
+        return await asyncio.to_thread(upload_image_and_get_url, image_tensor, api_key, timeout=timeout,
+                                       image_format=image_format)
+    upload_file = await asyncio.to_thread(encode_upload_file, image_tensor, image_format)
+    if upload_file is None:
+        return None
+    filename, image_bytes, mime_type = upload_file
+    form = aiohttp.FormData()
+    form.add_field('file', image_bytes, filename=filename, content_type=mime_type)
+    try:
+        response_json = await _request_json("POST", UPLOAD_URL, {'api-token': api_key}, timeout, data=form)
+    except (PiperAPIError, aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError):
+        return None
+    return response_json.get("url") if isinstance(response_json, dict) else None
+
+
+async def async_url_to_image_tensor(image_url, timeout=60, max_bytes=None, max_pixels=None, max_side=None,
+                                   use_cache=True):
+    """Async counterpart of utils.url_to_image_tensor with the same size guards and result cache."""
+    if aiohttp is None:
+        return await asyncio.to_thread(url_to_image_tensor, image_url, timeout=timeout, max_bytes=max_bytes,
+                                       max_pixels=max_pixels, max_side=max_side, use_cache=use_cache)
+    cache = get_result_cache() if use_cache else None
+    if cache is not None:
+        pixels = await asyncio.to_thread(cache.get, image_url, max_side)
+        if pixels is not None:
+            return uint8_to_tensor(pixels)
+    hasher = hashlib.blake2b(digest_size=16) if cache is not None else None
+    download = ImageDownload(max_bytes=max_bytes, max_pixels=max_pixels, max_side=max_side, hasher=hasher)
+    delay = get_rate_limiter().reserve(None, image_url)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    session = _get_async_session()
+    try:
+        async with session.get(image_url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            download.check_declared(response.content_length)
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                # Incremental decoding is CPU-bound, keep it off the event loop
+                await asyncio.to_thread(download.feed, chunk)
+        return await asyncio.to_thread(_decode_downloaded, download, image_url, max_side, cache, hasher)
+    except DownloadLimitError as e:
+        print(f"[PiperAsync] Download of {image_url} rejected: {e}")
+        return None
+    except Exception:
+        return None
+
+
+def _decode_downloaded(download, image_url, max_side, cache, hasher):
+    with download.close() as image:
+        return decoded_image_to_tensor(image, image_url, max_side, cache, hasher)
+
+
+# --- Async launch engine ---
+
+async def async_start_launch(launch_url, api_key, launch_data, deadline=None, request_timeout=60, json_body=False,
+                             multipart_image=None):
+    """Async counterpart of launch_engine.start_launch."""
+    timeout = deadline.cap(request_timeout) if deadline else request_timeout
+    if multipart_image is not None:
+        field, image_bytes, mime_type = multipart_image
+        launch_response = await async_post_request_multipart(launch_url, api_key, multipart_inputs(launch_data, field),
+                                                             None, timeout=timeout, image_field=field,
+                                                             image_bytes=image_bytes, mime_type=mime_type,
+                                                             raise_fatal=True)
+        return parse_launch_response(launch_response)
+    sender = async_post_request_json if json_body else async_post_request
+    return parse_launch_response(await sender(launch_url, api_key, launch_data, timeout=timeout, raise_fatal=True))
+
+
+async def async_poll_launch(launch_id, api_key, extractor=extract_raw_json, policy=None, deadline=None):
+    """
+    Async counterpart of launch_engine.poll_launch (polls on the running loop).
+    A ComfyUI interrupt or a cancelled task also cancels the launch on the server.
+    """
+    policy = policy or PollPolicy()
+    deadline = deadline or policy.deadline()
+    state_url = state_url_for(launch_id)
+    attempt = 0
+    state_response = {}
+    try:
+        while True:
+            if deadline.expired():
+                return timeout_result(launch_id, policy)
+            try:
+                state_response = await async_get_request(state_url, api_key, raise_fatal=True,
+                                                         timeout=deadline.cap(policy.request_timeout),
+                                                         is_retry=state_response is None)
+            except FatalAPIError as e:
+                return fatal_result(launch_id, e)
+            parsed = parse_state(state_response)
+            if parsed is not None:
+                return finish_from_state(launch_id, parsed[0], parsed[1], extractor)
+            await async_interruptible_sleep(min(policy.interval(attempt), deadline.remaining()))
+            attempt += 1
+    except (asyncio.CancelledError, LaunchInterrupted):
+        await async_cancel_launch(launch_id, api_key)
+        raise
+
+
+async def async_interruptible_sleep(seconds):
+    """asyncio.sleep in short slices; raises LaunchInterrupted when ComfyUI is interrupted."""
+    end = time.monotonic() + max(0.0, seconds)
+    while True:
+        if interrupt_requested():
+            raise LaunchInterrupted("interrupted while polling")
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(INTERRUPT_CHECK_INTERVAL, remaining))
+
+
+async def async_cancel_launch(launch_id, api_key, timeout=5):
+    """Async counterpart of launch_engine.cancel_launch."""
+    response = await async_post_request_json(cancel_url_for(launch_id), api_key, {}, timeout=timeout)
+    accepted = isinstance(response, dict) and "error" not in response
+    print(f"[PiperAsync] Cancel of launch {launch_id} {'accepted' if accepted else f'failed: {response}'}")
+    return accepted
+
+
+async def async_run_launch(launch_url, api_key, launch_data, extractor=extract_raw_json, policy=None, json_body=False,
+                           multipart_image=None, memoize=False, seed=None, reattach=None, force_new=False,
+                           memo_validate=None):
+    """Async counterpart of launch_engine.run_launch."""
+    memo_key = None
+    if memoize:
+        memo_key = await asyncio.to_thread(memo_key_for, launch_url, api_key, launch_data, multipart_image, seed)
+        cached = None if force_new else await asyncio.to_thread(memo_lookup, memo_key, extractor, "[PiperAsync]",
+                                                                memo_validate)
+        if cached is not None:
+            return cached
+    if interrupt_requested():
+        raise LaunchInterrupted("interrupted before launch")
+    policy = policy or PollPolicy()
+    deadline = policy.deadline()
+    journal_key = await asyncio.to_thread(journal_key_for, launch_url, api_key, launch_data, multipart_image, seed,
+                                          memo_key)
+    if (memoize if reattach is None else reattach) and not force_new:
+        resumed_id = await asyncio.to_thread(journal_reattach, journal_key, "[PiperAsync]")
+        if resumed_id is not None:
+            result = await _async_poll_journaled(resumed_id, api_key, extractor, policy, deadline)
+            if result.status != LaunchResult.FATAL_ERROR:
+                if memo_key is not None:
+                    await asyncio.to_thread(memo_remember, memo_key, result)
+                return result
+            print(f"[PiperAsync] Launch {resumed_id} can no longer be re-attached ({result.message}); launching again.")
+    try:
+        launch_id, error_details = await async_start_launch(launch_url, api_key, launch_data, deadline=deadline,
+                                                            request_timeout=policy.request_timeout,
+                                                            json_body=json_body, multipart_image=multipart_image)
+    except FatalAPIError as e:
+        return fatal_result(None, e)
+    if launch_id is None:
+        return launch_failed_result(error_details)
+    await asyncio.to_thread(journal_record, journal_key, launch_url, launch_data, launch_id)
+    result = await _async_poll_journaled(launch_id, api_key, extractor, policy, deadline)
+    if memo_key is not None:
+        await asyncio.to_thread(memo_remember, memo_key, result)
+    return result
+
+
+async def _async_poll_journaled(launch_id, api_key, extractor, policy, deadline):
+    try:
+        result = await async_poll_launch(launch_id, api_key, extractor=extractor, policy=policy, deadline=deadline)
+    except (asyncio.CancelledError, LaunchInterrupted):
+        journal_finish(launch_id, JOURNAL_CANCELLED) # Synchronous: the task is already being cancelled
+        raise
+    await asyncio.to_thread(journal_finish, launch_id, result.status, result.message)
+    return result
+
+
+async def gather_launches(launches, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Runs many launches on the current loop with at most `concurrency` in flight.
+    Each item is a dict of async_run_launch keyword arguments. Returns the
+    LaunchResults in input order; unexpected exceptions become LAUNCH_FAILED.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(kwargs):
+        async with semaphore:
+            try:
+                return await async_run_launch(**kwargs)
+            except LaunchInterrupted:
+                raise
+            except Exception as e:
+                return LaunchResult(LaunchResult.LAUNCH_FAILED, errors=repr(e), message=f"launch raised {e!r}")
+
+    tasks = [asyncio.ensure_future(_one(kwargs)) for kwargs in launches]
+    try:
+        return await asyncio.gather(*tasks)
+    except LaunchInterrupted:
+        # Stop the siblings here so their server-side cancels run on this loop
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def race_launches(launches, stagger=0.0):
+    """
+    Hedged launches: starts launches[0], then the next one every `stagger`
+    seconds (all at once when stagger is 0, and immediately when a running one
+    fails). Returns (winner_index, results, latencies) as soon as one launch
+    succeeds; the others are cancelled and stop polling. winner_index is None
+    when every launch failed. results/latencies hold None for launches that
+    were cancelled or never started.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = [None] * len(launches)
+    latencies = [None] * len(launches)
+    tasks = {}
+
+    async def _one(index):
+        try:
+            result = await async_run_launch(**launches[index])
+        except LaunchInterrupted:
+            raise
+        except Exception as e:
+            result = LaunchResult(LaunchResult.LAUNCH_FAILED, errors=repr(e), message=f"launch raised {e!r}")
+        results[index] = result
+        latencies[index] = loop.time() - started
+        return index
+
+    async def _cancel_rest():
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _settled(done):
+        for task in done:
+            index = tasks.pop(task)
+            if task.exception() is not None: # Only LaunchInterrupted escapes _one
+                await _cancel_rest()
+                raise task.exception()
+            if results[index].ok:
+                return index
+        return None
+
+    for index in range(len(launches)):
+        if tasks and stagger > 0:
+            done, _ = await asyncio.wait(tasks, timeout=stagger, return_when=asyncio.FIRST_COMPLETED)
+            winner = await _settled(done)
+            if winner is not None:
+                await _cancel_rest()
+                return winner, results, latencies
+        tasks[asyncio.ensure_future(_one(index))] = index
+
+    while tasks:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        winner = await _settled(done)
+        if winner is not None:
+            await _cancel_rest()
+            return winner, results, latencies
+    return None, results, latencies
@@ -0,0 +1,131 @@
+# nodes/batch_runner.py
+# Runs one launch per image of an input IMAGE batch, concurrently and under a
+# bounded in-flight limit, and hands the results back in input order.
+import asyncio
+from functools import partial
+
+from .utils import split_image_batch, stack_image_tensors, create_empty_image_tensor
+from .launch_engine import LaunchResult, extract_image_url, memo_forget
+from .image_encoder import encode_parallel
+from .async_utils import run_async, gather_launches, async_url_to_image_tensor
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class BatchItem:
+    """Result for one image of the batch: the LaunchResult and, for image outputs, the downloaded tensor."""
+    def __init__(self, index, result, image=None):
+        self.index = index
+        self.result = result
+        self.image = image
+
+    @property
+    def ok(self):
+        return self.result.ok
+
+
+def is_image_batch(image_tensor):
+    return image_tensor is not None and image_tensor.dim() == 4 and image_tensor.shape[0] > 1
+
+
+def run_image_batch(api_key, launch_url, image_tensor, encode, build_launch_data, image_field="image",
+                    extractor=extract_image_url, policy=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, json_body=True,
+                    max_side=None, memoize=False, seed=None):
+    """
+    encode(image) turns a [1, H, W, C] tensor into (inline_value, multipart_part)
+    as returned by utils.prepare_image_transport (or None on failure);
+    build_launch_data(inline_value) returns the launch body. A multipart_part is
+    sent as the binary file part image_field.
+    When extractor is extract_image_url the result images are downloaded too
+    (decoded at reduced resolution when max_side is set).
+    memoize/seed are passed to every launch as in run_launch; each image's own
+    payload keeps the memo keys of the batch items distinct.
+    Returns a list of BatchItem in input order.
+    """
+    images = split_image_batch(image_tensor)
+    return run_async(_run_image_batch(api_key, launch_url, images, encode, build_launch_data, image_field,
+                                      extractor, policy, max_concurrency, json_body, max_side, memoize, seed))
+
+
+async def _run_image_batch(api_key, launch_url, images, encode, build_launch_data, image_field,
+                           extractor, policy, max_concurrency, json_body, max_side, memoize, seed):
+    # Encoding fans out on the shared encoder pool (Pillow releases the GIL while
+    # saving); the loop only waits for the ordered results
+    encoded = await asyncio.to_thread(encode_parallel, partial(_safe_encode, encode), images)
+
+    launches = []
+    launch_indexes = []
+    results = [None] * len(images)
+    for index, value in enumerate(encoded):
+        if value is None:
+            results[index] = LaunchResult(LaunchResult.LAUNCH_FAILED, message=f"image {index}: encoding failed")
+            continue
+        inline_value, multipart_part = value
+        launch_indexes.append(index)
+        launches.append({
+            "launch_url": launch_url,
+            "api_key": api_key,
+            "launch_data": build_launch_data(inline_value),
+            "extractor": extractor,
+            "policy": policy,
+            "json_body": json_body,
+            "multipart_image": (image_field, *multipart_part) if multipart_part else None,
+            "memoize": memoize,
+            "seed": seed,
+        })
+    encoded = None # Drop encoded payloads before the long poll phase
+
+    for index, result in zip(launch_indexes, await gather_launches(launches, concurrency=max_concurrency)):
+        results[index] = result
+
+    downloads = [None] * len(images)
+    if extractor is extract_image_url:
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def _download(result):
+            if not result.ok:
+                return None
+            async with semaphore:
+                return await async_url_to_image_tensor(result.value, max_side=max_side)
+
+        downloads = await asyncio.gather(*(_download(result) for result in results))
+
+    items = []
+    for index, result in enumerate(results):
+        item = BatchItem(index, result, downloads[index])
+        if extractor is extract_image_url and result.ok and item.image is None:
+            memo_forget(result) # The memoized URL is useless without its image
+            item.result = LaunchResult(LaunchResult.BAD_OUTPUTS, result.launch_id, outputs=result.outputs,
+                                       message=f"failed to download result image {result.value}")
+        items.append(item)
+    return items
+
+
+def _safe_encode(encode, image):
+    try:
+        return encode(image)
+    except Exception as e:
+        print(f"[PiperBatch] Image encoding failed: {e}")
+        return None
+
+
+def collect_image_batch(items, log_prefix):
+    """
+    Builds the (status_text, IMAGE) node output from batch items. The IMAGE
+    batch keeps input order and length: a failed item becomes a black
+    placeholder the size of the first successful image, and status_text lists
+    the failed indexes with their errors.
+    """
+    succeeded = [item.image for item in items if item.ok]
+    failed = [item for item in items if not item.ok]
+    for item in failed:
+        print(f"{log_prefix} Изображение {item.index}: {item.result.message}")
+    if not succeeded:
+        return (f"Критическая ошибка: Не удалось обработать ни одно из {len(items)} изображений.", create_empty_image_tensor())
+    height, width = succeeded[0].shape[1], succeeded[0].shape[2]
+    tensors = [item.image if item.ok else create_empty_image_tensor(width, height) for item in items]
+    status_text = f"Успех: Обработано {len(succeeded)}/{len(items)} изображений."
+    if failed:
+        errors = "; ".join(f"{item.index}: {item.result.message}" for item in failed)
+        status_text += f" Ошибки (чёрные заглушки) для индексов: {[item.index for item in failed]} ({errors})"
+    return (status_text, stack_image_tensors(tensors))
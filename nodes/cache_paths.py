@@ -0,0 +1,26 @@
+# nodes/cache_paths.py
+# Location of the on-disk caches kept by the Piper nodes. Everything lives
+# under one root so it can be moved or wiped in one place:
+#   PIPER_CACHE_DIR, else <ComfyUI user dir>/piper_cache, else ~/.cache/piper
+import os
+
+try:
+    import folder_paths # Available when running inside ComfyUI
+except ImportError:
+    folder_paths = None
+
+
+def cache_root():
+    root = os.environ.get("PIPER_CACHE_DIR")
+    if root:
+        return os.path.abspath(os.path.expanduser(root))
+    if folder_paths is not None and hasattr(folder_paths, "get_user_directory"):
+        return os.path.join(folder_paths.get_user_directory(), "piper_cache")
+    return os.path.join(os.path.expanduser("~"), ".cache", "piper")
+
+
+def cache_dir(name):
+    """Returns (and creates) the sub-directory for one cache."""
+    path = os.path.join(cache_root(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,168 @@
+# nodes/circuit_breaker.py
+# Shared failure memory for the HTTP helpers: one circuit breaker per API
+# endpoint (closed -> open after repeated failures -> half-open probe) and a
+# process-wide retry budget, so a degraded backend gets fewer, not more,
+# requests from every running node.
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+FAILURE_THRESHOLD = int(os.environ.get("PIPER_BREAKER_THRESHOLD", "5"))
+RESET_TIMEOUT = float(os.environ.get("PIPER_BREAKER_RESET", "30"))
+# A half-open probe that reports nothing for this long (lost, hung) stops blocking the next one
+PROBE_TIMEOUT = float(os.environ.get("PIPER_BREAKER_PROBE_TIMEOUT", "120"))
+RETRY_BUDGET_RATIO = float(os.environ.get("PIPER_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_MIN_PER_SECOND = float(os.environ.get("PIPER_RETRY_MIN_PER_SECOND", "1.0"))
+
+# Path segments that identify one object (launch IDs, hashes, numbers)
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[0-9a-fA-F-]{8,}$|^\d+$")
+
+
+def endpoint_key(url):
+    """'https://host/api/launches/<id>/state' -> 'host/api/launches/*/state'."""
+    parts = urlsplit(url)
+    segments = ["*" if _ID_SEGMENT.match(segment) else segment for segment in parts.path.split("/")]
+    return parts.netloc + "/".join(segments)
+
+
+class CircuitBreaker:
+    """
+    closed: requests pass, consecutive failures are counted.
+    open: requests are rejected until reset_timeout has passed.
+    half_open: exactly one probe passes; success closes, failure re-opens.
+    A probe that is abandoned (release_probe) or silent for probe_timeout
+    lets the next request probe instead.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT,
+                 probe_timeout=PROBE_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and self._probe_in_flight and now - self._probe_started >= self.probe_timeout:
+                print(f"[PiperCircuit] {self.name}: probe lost after {self.probe_timeout}s, allowing another")
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def release_probe(self):
+        """The admitted request ended without an outcome (cancelled): free the probe, count nothing."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"[PiperCircuit] {self.name}: closed again")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                print(f"[PiperCircuit] {self.name}: open for {self.reset_timeout}s after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class RetryBudget:
+    """
+    Token bucket for retries: every first attempt deposits `ratio` tokens, a
+    retry costs one, and `min_per_second` tokens trickle in so retries never
+    stop completely. Caps retries at roughly ratio x normal traffic.
+    """
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_per_second=RETRY_MIN_PER_SECOND, window=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(10.0, min_per_second * window)
+        self.tokens = self.capacity
+        self.stats = {"requests": 0, "retries": 0, "exhausted": 0}
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.min_per_second)
+        self._last = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+            self.stats["requests"] += 1
+
+    def try_spend(self):
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                self.stats["retries"] += 1
+                return True
+            self.stats["exhausted"] += 1
+            return False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_retry_budget = RetryBudget()
+
+
+def breaker_for(url):
+    key = endpoint_key(url)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(key)
+        return breaker
+
+
+def get_retry_budget():
+    return _retry_budget
+
+
+def get_resilience_stats():
+    """Breaker state per endpoint plus the retry budget counters."""
+    with _breakers_lock:
+        breakers = {key: breaker.snapshot() for key, breaker in _breakers.items()}
+    return {"breakers": breakers, "retry_budget": dict(_retry_budget.stats, tokens=round(_retry_budget.tokens, 2))}
+
+
+def reset_resilience():
+    """Closes every breaker and refills the retry budget (e.g. after fixing the network)."""
+    global _retry_budget
+    with _breakers_lock:
+        _breakers.clear()
+    _retry_budget = RetryBudget()
@@ -1,18 +1,17 @@
 # nodes/dress_node.py
-import time
-import torch
 import traceback # Для вывода критических ошибок
 
 # Импортируем нужные хелперы
 from .utils import (
-    # post_request, # Заменяем на post_request_json
-    post_request_json,
-    get_request,
     url_to_image_tensor,
     create_empty_image_tensor,
-    tensor_to_base64_data_uri # Наш конвертер
+    prepare_image_transport, # Base64 / multipart / загрузка
+    TRANSPORT_MODES,
     # upload_image_and_get_url # Больше не нужен
 )
+from .image_encoder import IMAGE_FORMAT_LIST # Политики кодирования
+from .batch_runner import DEFAULT_MAX_CONCURRENCY, is_image_batch, run_image_batch, collect_image_batch
+from .launch_engine import PollPolicy, LaunchResult, run_launch, extract_image_url, format_api_errors
 
 class PiperDressFactory:
     # Списки опций оставляем
@@ -41,10 +40,12 @@ class PiperDressFactory:
                 "gender": (s.GENDER_LIST, {"default": "auto"}),
                 "style": (s.STYLE_LIST, {"default": "red_swimsuit"}),
                 # Убрали poll_interval и max_wait_time
-                "image_format": (["PNG", "JPEG"], {"default": "PNG"}) # Формат для Base64
+                "image_format": (IMAGE_FORMAT_LIST, {"default": "PNG"}) # Формат для Base64
             },
             "optional": {
                  "prompt": ("STRING", {"multiline": True, "default": ""}),
+                 "max_concurrency": ("INT", {"default": DEFAULT_MAX_CONCURRENCY, "min": 1, "max": 32}), # Для батчей изображений
+                 "transport": (TRANSPORT_MODES, {"default": "base64"}), # Как передавать изображение в API
                  # Seed здесь не нужен, как и в ViolationsDetector
             }
         }
@@ -54,121 +55,94 @@ class PiperDressFactory:
     FUNCTION = "dress_image"
     CATEGORY = "PiperAPI/Image"
 
+    def build_launch_data(self, image_uri, gender, style, prompt):
+        return {
+            "inputs": {
+                "image": image_uri, # Data URI или URL загруженного файла
+                "gender": gender,
+                "style": style,
+                # Добавляем prompt только если он не пустой
+                **({"prompt": prompt.strip()} if prompt and prompt.strip() else {})
+            }
+        }
+
     # Убираем poll_interval, max_wait_time из аргументов, добавляем image_format
-    def dress_image(self, api_key, image, gender, style, image_format, prompt=None):
+    def dress_image(self, api_key, image, gender, style, image_format, prompt=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, transport="base64"):
         # Используем константы
         poll_interval = self.DEFAULT_POLL_INTERVAL
         max_wait_time = self.DEFAULT_MAX_WAIT_TIME
 
         launch_url = "https://app.piper.my/api/dress-factory-v1/launch"
-        state_url_template = "https://app.piper.my/api/launches/{}/state"
         empty_image = create_empty_image_tensor()
         status_text = "Ошибка: Неизвестный сбой."
 
-        # 1. Конвертация изображения в Base64
+        # Батч изображений: каждое изображение запускается отдельной задачей параллельно
+        if is_image_batch(image):
+            items = run_image_batch(
+                api_key, launch_url, image,
+                encode=lambda img: prepare_image_transport(img, api_key, transport=transport, image_format=image_format),
+                image_field="image",
+                build_launch_data=lambda uri: self.build_launch_data(uri, gender, style, prompt),
+                policy=PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time),
+                max_concurrency=max_concurrency,
+            )
+            return collect_image_batch(items, "[PiperDress]")
+
+        # 1. Подготовка изображения (Base64, multipart или загрузка)
         try:
-            base64_image_uri = tensor_to_base64_data_uri(image, image_format=image_format)
-            if not base64_image_uri:
-                err_msg = "Критическая ошибка: Не удалось конвертировать изображение в Base64."
+            prepared = prepare_image_transport(image, api_key, transport=transport, image_format=image_format)
+            if not prepared:
+                err_msg = f"Критическая ошибка: Не удалось подготовить изображение для отправки (transport={transport})."
                 print(f"[PiperDress] {err_msg}")
                 return (err_msg, empty_image)
         except Exception as e:
-            print(f"[PiperDress] Критическая ошибка при конвертации в Base64:")
+            print(f"[PiperDress] Критическая ошибка при подготовке изображения:")
             traceback.print_exc()
-            err_msg = f"Критическая ошибка подготовки Base64: {e}"
+            err_msg = f"Критическая ошибка подготовки изображения: {e}"
             return (err_msg, empty_image)
+        image_value, multipart_part = prepared # image_value = None для multipart
+        multipart_image = ("image", *multipart_part) if multipart_part else None
 
         # 2. Подготовка и запуск задачи
-        launch_data = {
-            "inputs": {
-                "image": base64_image_uri, # Используем Base64
-                "gender": gender,
-                "style": style,
-                # Добавляем prompt только если он не пустой
-                **({"prompt": prompt.strip()} if prompt and prompt.strip() else {})
-            }
-        }
+        launch_data = self.build_launch_data(image_value, gender, style, prompt)
 
-        try:
-            # print("[PiperDress] Отправка запроса на запуск...") # Убрано
-            # Используем post_request_json
-            launch_response = post_request_json(launch_url, api_key, launch_data)
-        except Exception as e:
-             print(f"[PiperDress] Критическая ошибка сети при запуске задачи:")
-             traceback.print_exc()
-             err_msg = f"Критическая ошибка сети (запуск): {e}"
-             return (err_msg, empty_image)
-
-        # 3. Проверка ответа на запуск
-        if not launch_response or not isinstance(launch_response, dict) or "_id" not in launch_response:
-            api_error_details = "Неизвестно"
-            if launch_response and isinstance(launch_response, dict): api_error_details = launch_response.get('error', launch_response)
-            elif launch_response: api_error_details = str(launch_response)
+        # Запуск и опрос через общий движок
+        policy = PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time)
+        result = run_launch(launch_url, api_key, launch_data, extractor=extract_image_url,
+                            policy=policy, log_prefix="[PiperDress]", json_body=True,
+                            multipart_image=multipart_image)
 
-            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {api_error_details}"
+        if result.status == LaunchResult.FATAL_ERROR: # 401/402/404 и т.п.: повтор не поможет
+            err_msg = f"Критическая ошибка API: {result.message}"
+            print(f"[PiperDress] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.LAUNCH_FAILED:
+            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {result.errors}"
+            print(f"[PiperDress] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.TIMEOUT:
+            err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {result.launch_id}"
+            print(f"[PiperDress] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.API_ERROR:
+            err_msg = f"Критическая ошибка API: Задача {result.launch_id} не удалась. Детали: {format_api_errors(result.errors)}"
+            print(f"[PiperDress] {err_msg}")
+            return (err_msg, empty_image)
+        if not result.ok:
+            err_msg = f"Критическая ошибка: В результатах задачи {result.launch_id} отсутствует или некорректен URL изображения. Ответ: {result.outputs}"
             print(f"[PiperDress] {err_msg}")
             return (err_msg, empty_image)
 
-        launch_id = launch_response["_id"]
-        state_url = state_url_template.format(launch_id)
-        # print(f"[PiperDress] Задача запущена. ID: {launch_id}. Опрос...") # Убрано
-
-        # 4. Опрос состояния
-        start_time = time.time()
-        while True:
-            current_time = time.time()
-            if current_time - start_time > max_wait_time:
-                err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {launch_id}"
-                print(f"[PiperDress] {err_msg}")
-                return (err_msg, empty_image)
-
-            try:
-                state_response = get_request(state_url, api_key)
-            except Exception as e:
-                 print(f"[PiperDress] Ошибка сети при опросе {launch_id} (повтор через {poll_interval} сек): {e}")
-                 time.sleep(poll_interval)
-                 continue
-
-            if not state_response or not isinstance(state_response, dict):
-                print(f"[PiperDress] Предупреждение: Некорректный ответ о состоянии {launch_id} (повтор через {poll_interval} сек).")
-                time.sleep(poll_interval)
-                continue
-
-            errors = state_response.get("errors")
-            if errors:
-                if isinstance(errors, list) and len(errors) > 0: error_details = ', '.join(map(str, errors))
-                elif isinstance(errors, str): error_details = errors
-                else: error_details = str(errors)
-                err_msg = f"Критическая ошибка API: Задача {launch_id} не удалась. Детали: {error_details}"
-                print(f"[PiperDress] {err_msg}")
-                # print(f"Full state response on error: {state_response}") # Можно раскомментировать для отладки
-                return (err_msg, empty_image)
-
-            outputs = state_response.get("outputs")
-            if outputs and isinstance(outputs, dict):
-                 output_image_url = outputs.get("image")
-                 if output_image_url and isinstance(output_image_url, str):
-                     try:
-                         output_image_tensor = url_to_image_tensor(output_image_url)
-                         if output_image_tensor is None:
-                             raise ValueError("Не удалось загрузить/обработать изображение по URL")
-                         status_text = f"Успех: Изображение обработано задачей {launch_id}."
-                         print(f"[PiperDress] {status_text}") # Сообщение об успехе
-                         return (status_text, output_image_tensor)
-                     except Exception as e:
-                         print(f"[PiperDress] Критическая ошибка обработки результирующего изображения ({launch_id}, URL: {output_image_url}):")
-                         traceback.print_exc()
-                         err_msg = f"Критическая ошибка обработки результата: {e}"
-                         return (err_msg, empty_image)
-                 else:
-                     err_msg = f"Критическая ошибка: В результатах задачи {launch_id} отсутствует или некорректен URL изображения. Ответ: {outputs}"
-                     print(f"[PiperDress] {err_msg}")
-                     return (err_msg, empty_image)
-
-            # Если нет ни ошибок, ни outputs - ждем дальше
-            time.sleep(poll_interval)
-
-        # Сюда код не должен дойти
-        # err_msg = f"Критическая ошибка: Цикл опроса неожиданно завершился для {launch_id}."
-        # print(f"[PiperDress] {err_msg}")
-        # return (err_msg, empty_image)
\ No newline at end of file
+        output_image_url = result.value
+        try:
+            output_image_tensor = url_to_image_tensor(output_image_url)
+            if output_image_tensor is None: # Проверка, если url_to_image_tensor вернул None
+                raise ValueError("Не удалось загрузить/обработать изображение по URL")
+            status_text = f"Успех: Изображение обработано задачей {result.launch_id}."
+            print(f"[PiperDress] {status_text}") # Сообщение об успехе
+            return (status_text, output_image_tensor)
+        except Exception as e:
+            print(f"[PiperDress] Критическая ошибка обработки результирующего изображения ({result.launch_id}, URL: {output_image_url}):")
+            traceback.print_exc()
+            err_msg = f"Критическая ошибка обработки результата: {e}"
+            return (err_msg, empty_image)
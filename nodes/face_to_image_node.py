@@ -1,18 +1,18 @@
 # nodes/face_to_image_node.py
-import time
-import torch
 import traceback # Оставляем для вывода критических ошибок
 
 # Импортируем нужные хелперы, включая Base64 конвертер
 from .utils import (
-    # post_request, # Заменяем на post_request_json если они делают одно и то же
-    post_request_json,
-    get_request,
     url_to_image_tensor,
     create_empty_image_tensor,
-    tensor_to_base64_data_uri # Наш конвертер
+    prepare_image_transport, # Base64 / multipart / загрузка
+    TRANSPORT_MODES,
     # upload_image_and_get_url # Больше не нужен
 )
+from .image_encoder import IMAGE_FORMAT_LIST # Политики кодирования
+from .batch_runner import DEFAULT_MAX_CONCURRENCY, is_image_batch, run_image_batch, collect_image_batch
+from .launch_engine import PollPolicy, LaunchResult, run_launch, extract_image_url, format_api_errors, memo_forget
+from .request_memo import node_fingerprint
 
 class PiperFaceToImage:
     # Списки моделей и размеров оставляем как есть
@@ -79,14 +79,20 @@ class PiperFaceToImage:
                 "performance": (s.PERFORMANCE_LIST, {"default": "speed"}),
                 # Убрали poll_interval и max_wait_time
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}), # Оставляем для UI
-                "image_format": (["PNG", "JPEG"], {"default": "PNG"}) # Формат для Base64
+                "image_format": (IMAGE_FORMAT_LIST, {"default": "PNG"}) # Формат для Base64
             },
             "optional": {
                  "negative_prompt": ("STRING", {"forceInput": True}),
                  "multilang": ("BOOLEAN", {"default": False}),
+                 "max_concurrency": ("INT", {"default": DEFAULT_MAX_CONCURRENCY, "min": 1, "max": 32}), # Для батчей изображений
+                 "transport": (TRANSPORT_MODES, {"default": "base64"}), # Как передавать изображение в API
             }
         }
 
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        return node_fingerprint("face-to-image-v1", kwargs)
+
     RETURN_TYPES = ("STRING", "IMAGE")
     RETURN_NAMES = ("status_text", "output_image")
     FUNCTION = "generate_face_image"
@@ -94,7 +100,8 @@ class PiperFaceToImage:
 
     # Убираем poll_interval, max_wait_time из аргументов, добавляем image_format
     def generate_face_image(self, api_key, face_image, positive_prompt, checkpoint, imageSize, performance,
-                              seed, image_format, negative_prompt="", multilang=False):
+                              seed, image_format, negative_prompt="", multilang=False,
+                              max_concurrency=DEFAULT_MAX_CONCURRENCY, transport="base64"):
 
         # Используем константы
         poll_interval = self.DEFAULT_POLL_INTERVAL
@@ -111,112 +118,92 @@ class PiperFaceToImage:
         # --- Конец предупреждения ---
 
         launch_url = "https://app.piper.my/api/face-to-image-v1/launch"
-        state_url_template = "https://app.piper.my/api/launches/{}/state"
         empty_image = create_empty_image_tensor()
         status_text = "Ошибка: Неизвестный сбой."
 
-        # 1. Конвертация изображения лица в Base64
+        def build_launch_data(face_uri):
+            return {
+                "inputs": {
+                    "face": face_uri, # Data URI или URL загруженного файла
+                    "prompt": positive_prompt,
+                    "checkpoint": checkpoint,
+                    "imageSize": imageSize,
+                    "performance": performance,
+                    "multilang": multilang,
+                    # Добавляем negativePrompt только если он не пустой
+                    **({"negativePrompt": negative_prompt} if negative_prompt and negative_prompt.strip() else {})
+                }
+            }
+
+        # Батч лиц: каждое лицо запускается отдельной задачей параллельно
+        if is_image_batch(face_image):
+            items = run_image_batch(
+                api_key, launch_url, face_image,
+                encode=lambda img: prepare_image_transport(img, api_key, transport=transport, image_format=image_format),
+                image_field="face",
+                build_launch_data=build_launch_data,
+                policy=PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time),
+                max_concurrency=max_concurrency,
+                memoize=True, seed=seed,
+            )
+            return collect_image_batch(items, "[PiperFaceToImage]")
+
+        # 1. Подготовка изображения (Base64, multipart или загрузка)
         try:
-            base64_face_uri = tensor_to_base64_data_uri(face_image, image_format=image_format)
-            if not base64_face_uri:
-                err_msg = "Критическая ошибка: Не удалось конвертировать изображение лица в Base64."
-                print(f"[PiperFaceToImage] {err_msg}") # Логируем ошибку
+            prepared = prepare_image_transport(face_image, api_key, transport=transport, image_format=image_format)
+            if not prepared:
+                err_msg = f"Критическая ошибка: Не удалось подготовить изображение для отправки (transport={transport})."
+                print(f"[PiperFaceToImage] {err_msg}")
                 return (err_msg, empty_image)
         except Exception as e:
-            print(f"[PiperFaceToImage] Критическая ошибка при конвертации лица в Base64:")
+            print(f"[PiperFaceToImage] Критическая ошибка при подготовке изображения:")
             traceback.print_exc()
-            err_msg = f"Критическая ошибка подготовки Base64 лица: {e}"
+            err_msg = f"Критическая ошибка подготовки изображения: {e}"
             return (err_msg, empty_image)
+        image_value, multipart_part = prepared # image_value = None для multipart
+        multipart_image = ("face", *multipart_part) if multipart_part else None
 
         # 2. Подготовка и запуск задачи
-        launch_data = {
-            "inputs": {
-                "face": base64_face_uri, # Используем Base64
-                "prompt": positive_prompt,
-                "checkpoint": checkpoint,
-                "imageSize": imageSize,
-                "performance": performance,
-                "multilang": multilang,
-                # Добавляем negativePrompt только если он не пустой
-                **({"negativePrompt": negative_prompt} if negative_prompt and negative_prompt.strip() else {})
-            }
-        }
+        launch_data = build_launch_data(image_value)
 
-        try:
-            # Используем post_request_json
-            launch_response = post_request_json(launch_url, api_key, launch_data)
-        except Exception as e:
-             print(f"[PiperFaceToImage] Критическая ошибка сети при запуске задачи:")
-             traceback.print_exc()
-             err_msg = f"Критическая ошибка сети (запуск): {e}"
-             return (err_msg, empty_image)
-
-        # 3. Проверка ответа на запуск
-        if not launch_response or not isinstance(launch_response, dict) or "_id" not in launch_response:
-            api_error_details = "Неизвестно"
-            if launch_response and isinstance(launch_response, dict): api_error_details = launch_response.get('error', launch_response)
-            elif launch_response: api_error_details = str(launch_response)
-
-            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {api_error_details}"
+        # Запуск и опрос через общий движок
+        policy = PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time)
+        result = run_launch(launch_url, api_key, launch_data, extractor=extract_image_url,
+                            policy=policy, log_prefix="[PiperFaceToImage]", json_body=True,
+                            multipart_image=multipart_image, memoize=True, seed=seed)
+
+        if result.status == LaunchResult.FATAL_ERROR: # 401/402/404 и т.п.: повтор не поможет
+            err_msg = f"Критическая ошибка API: {result.message}"
+            print(f"[PiperFaceToImage] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.LAUNCH_FAILED:
+            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {result.errors}"
+            print(f"[PiperFaceToImage] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.TIMEOUT:
+            err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {result.launch_id}"
+            print(f"[PiperFaceToImage] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.API_ERROR:
+            err_msg = f"Критическая ошибка API: Задача {result.launch_id} не удалась. Детали: {format_api_errors(result.errors)}"
+            print(f"[PiperFaceToImage] {err_msg}")
+            return (err_msg, empty_image)
+        if not result.ok:
+            err_msg = f"Критическая ошибка: В результатах задачи {result.launch_id} отсутствует или некорректен URL изображения. Ответ: {result.outputs}"
             print(f"[PiperFaceToImage] {err_msg}")
             return (err_msg, empty_image)
 
-        launch_id = launch_response["_id"]
-        state_url = state_url_template.format(launch_id)
-        # print(f"[PiperFaceToImage] Задача запущена. ID: {launch_id}. Опрос...") # Убрано
-
-        # 4. Опрос состояния
-        start_time = time.time()
-        while True:
-            current_time = time.time()
-            if current_time - start_time > max_wait_time:
-                err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {launch_id}"
-                print(f"[PiperFaceToImage] {err_msg}")
-                return (err_msg, empty_image)
-
-            try:
-                state_response = get_request(state_url, api_key)
-            except Exception as e:
-                 print(f"[PiperFaceToImage] Ошибка сети при опросе {launch_id} (повтор через {poll_interval} сек): {e}")
-                 time.sleep(poll_interval)
-                 continue
-
-            if not state_response or not isinstance(state_response, dict):
-                print(f"[PiperFaceToImage] Предупреждение: Некорректный ответ о состоянии {launch_id} (повтор через {poll_interval} сек).")
-                time.sleep(poll_interval)
-                continue
-
-            errors = state_response.get("errors")
-            if errors:
-                if isinstance(errors, list) and len(errors) > 0: error_details = ', '.join(map(str, errors))
-                elif isinstance(errors, str): error_details = errors
-                else: error_details = str(errors)
-                err_msg = f"Критическая ошибка API: Задача {launch_id} не удалась. Детали: {error_details}"
-                print(f"[PiperFaceToImage] {err_msg}")
-                # print(f"Full state response on error: {state_response}") # Можно раскомментировать для полной отладки ошибок API
-                return (err_msg, empty_image)
-
-            outputs = state_response.get("outputs")
-            if outputs and isinstance(outputs, dict):
-                 output_image_url = outputs.get("image")
-                 if output_image_url and isinstance(output_image_url, str):
-                     try:
-                         output_image_tensor = url_to_image_tensor(output_image_url)
-                         if output_image_tensor is None: # Проверка, если url_to_image_tensor вернул None
-                             raise ValueError("Не удалось загрузить/обработать изображение по URL")
-                         #status_text = f"Успех: Изображение сгенерировано задачей {launch_id}."
-                         print(f"[PiperFaceToImage] {status_text}") # Выводим сообщение об успехе
-                         return (status_text, output_image_tensor)
-                     except Exception as e:
-                         print(f"[PiperFaceToImage] Критическая ошибка обработки результирующего изображения ({launch_id}, URL: {output_image_url}):")
-                         traceback.print_exc()
-                         err_msg = f"Критическая ошибка обработки результата: {e}"
-                         return (err_msg, empty_image)
-                 else:
-                     # Это тоже критическая ошибка - outputs есть, а URL картинки нет
-                     err_msg = f"Критическая ошибка: В результатах задачи {launch_id} отсутствует или некорректен URL изображения. Ответ: {outputs}"
-                     print(f"[PiperFaceToImage] {err_msg}")
-                     return (err_msg, empty_image)
-
-            # Если нет ни ошибок, ни outputs - ждем дальше
-            time.sleep(poll_interval)
\ No newline at end of file
+        output_image_url = result.value
+        try:
+            output_image_tensor = url_to_image_tensor(output_image_url)
+            if output_image_tensor is None: # Проверка, если url_to_image_tensor вернул None
+                raise ValueError("Не удалось загрузить/обработать изображение по URL")
+            status_text = f"Успех: Изображение сгенерировано задачей {result.launch_id}."
+            print(f"[PiperFaceToImage] {status_text}") # Выводим сообщение об успехе
+            return (status_text, output_image_tensor)
+        except Exception as e:
+            memo_forget(result) # Запомненный URL без изображения бесполезен
+            print(f"[PiperFaceToImage] Критическая ошибка обработки результирующего изображения ({result.launch_id}, URL: {output_image_url}):")
+            traceback.print_exc()
+            err_msg = f"Критическая ошибка обработки результата: {e}"
+            return (err_msg, empty_image)
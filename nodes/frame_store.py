@@ -0,0 +1,220 @@
+# nodes/frame_store.py
+# Decodes a video (URL or local file) frame by frame into a memory-mapped
+# float32 [N, H, W, 3] file, so the IMAGE batch handed to ComfyUI is backed by
+# the page cache instead of a full decoded copy in RAM. Decoding uses PyAV
+# when installed and OpenCV otherwise; both are optional dependencies.
+import glob
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from .cache_paths import cache_dir
+
+try:
+    import av
+except ImportError:
+    av = None
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+DEFAULT_MAX_BYTES = int(os.environ.get("PIPER_FRAME_STORE_MAX_BYTES", str(8 * 2**30)))
+
+
+class DecoderUnavailable(RuntimeError):
+    """Neither PyAV nor OpenCV is installed."""
+
+
+def decoder_name():
+    return "av" if av is not None else "cv2" if cv2 is not None else None
+
+
+def target_size(width, height, resize_width=0, resize_height=0):
+    """Output size; a 0 side follows the aspect ratio, both 0 keeps the original."""
+    if resize_width and resize_height:
+        return resize_width, resize_height
+    if resize_width:
+        return resize_width, max(1, round(height * resize_width / width))
+    if resize_height:
+        return max(1, round(width * resize_height / height)), resize_height
+    return width, height
+
+
+def _iter_av(source, resize_width, resize_height):
+    container = av.open(source)
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO" # Frame/slice threads inside FFmpeg
+        fps = float(stream.average_rate or 0)
+        yield fps
+        size = None
+        for frame in container.decode(stream):
+            if size is None:
+                size = target_size(frame.width, frame.height, resize_width, resize_height)
+            # reformat scales and converts to RGB in one swscale pass
+            yield lambda frame=frame: frame.reformat(width=size[0], height=size[1], format="rgb24").to_ndarray()
+    finally:
+        container.close()
+
+
+def _iter_cv2(source, resize_width, resize_height):
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"OpenCV could not open {source}")
+    try:
+        yield float(capture.get(cv2.CAP_PROP_FPS) or 0)
+        size = None
+        while True:
+            # grab() decodes without the BGR conversion; retrieve() only for kept frames
+            if not capture.grab():
+                break
+            def convert():
+                ok, pixels = capture.retrieve()
+                if not ok:
+                    raise IOError("OpenCV could not retrieve a decoded frame")
+                nonlocal size
+                if size is None:
+                    size = target_size(pixels.shape[1], pixels.shape[0], resize_width, resize_height)
+                if (pixels.shape[1], pixels.shape[0]) != size:
+                    pixels = cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+                return cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB)
+            yield convert
+    finally:
+        capture.release()
+
+
+def iter_frames(source, resize_width=0, resize_height=0):
+    """
+    Generator: first yields the fps, then one callable per decoded frame that
+    returns its uint8 RGB pixels. Frames that are skipped are never converted.
+    """
+    if av is not None:
+        return _iter_av(source, resize_width, resize_height)
+    if cv2 is not None:
+        return _iter_cv2(source, resize_width, resize_height)
+    raise DecoderUnavailable("Install 'av' (PyAV) or 'opencv-python' to decode video frames")
+
+
+class FrameStore:
+    """
+    <key>.f32 raw float32 frames plus a <key>.json {"shape", "fps"} sidecar.
+    The key covers the source URL and every decode option; recency is the data
+    file's mtime and drives eviction beyond the byte budget.
+    """
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(video_url, **options):
+        text = json.dumps([video_url, sorted(options.items())])
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _paths(self, key):
+        return os.path.join(self.root, f"{key}.f32"), os.path.join(self.root, f"{key}.json")
+
+    def get(self, key):
+        """Returns (frames, fps) with frames a copy-on-write memmap, or None."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            frames = np.memmap(data_path, dtype=np.float32, mode="c", shape=tuple(meta["shape"]))
+            os.utime(data_path)
+        except (OSError, ValueError, KeyError):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return frames, meta["fps"]
+
+    def decode(self, key, source, stride=1, start_frame=0, max_frames=0, resize_width=0, resize_height=0,
+               should_abort=None):
+        """
+        Decodes source into the store and returns (frames, fps). Only every
+        stride-th frame from start_frame is converted, at most max_frames
+        (0 = all). should_abort() is checked between frames.
+        """
+        data_path, meta_path = self._paths(key)
+        tmp_path = os.path.join(self.root, f"incoming-{uuid.uuid4().hex}.f32")
+        frames_iter = iter_frames(source, resize_width, resize_height)
+        count, shape = 0, None
+        try:
+            fps = next(frames_iter)
+            with open(tmp_path, "wb") as f:
+                for index, convert in enumerate(frames_iter):
+                    if should_abort is not None and should_abort():
+                        raise InterruptedError("frame decoding aborted")
+                    if index < start_frame or (index - start_frame) % stride:
+                        continue
+                    pixels = convert()
+                    if shape is None:
+                        shape = pixels.shape
+                    elif pixels.shape != shape:
+                        raise ValueError(f"frame {index} is {pixels.shape}, expected {shape}")
+                    # One frame in memory at a time; the batch only exists on disk
+                    f.write(np.multiply(pixels, 1.0 / 255.0, dtype=np.float32).tobytes())
+                    count += 1
+                    if max_frames and count >= max_frames:
+                        break
+        except BaseException:
+            frames_iter.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        frames_iter.close()
+        if count == 0:
+            os.remove(tmp_path)
+            raise ValueError("no frames decoded")
+        os.replace(tmp_path, data_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"shape": [count, *shape], "fps": fps}, f)
+        self._evict(keep=data_path)
+        frames = np.memmap(data_path, dtype=np.float32, mode="c", shape=(count, *shape))
+        return frames, fps
+
+    def _evict(self, keep=None):
+        with self._lock:
+            entries = []
+            for path in glob.glob(os.path.join(self.root, "*.f32")):
+                if os.path.basename(path).startswith("incoming-"):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    # Open memmaps of an evicted file stay valid until released
+                    os.remove(path)
+                    os.remove(f"{path[:-4]}.json")
+                except OSError:
+                    pass
+                total -= size
+                self.stats["evictions"] += 1
+
+
+_frame_store = None
+_frame_store_lock = threading.Lock()
+
+
+def get_frame_store():
+    """Process-wide FrameStore under the cache dir; PIPER_FRAME_STORE_MAX_BYTES sets the budget."""
+    global _frame_store
+    if _frame_store is None:
+        with _frame_store_lock:
+            if _frame_store is None:
+                _frame_store = FrameStore(cache_dir("frames"))
+    return _frame_store
@@ -1,5 +1,9 @@
-import time
-from .utils import post_request, get_request, url_to_image_tensor, create_empty_image_tensor
+import asyncio
+import json
+from .utils import url_to_image_tensor, create_empty_image_tensor, stack_image_tensors
+from .launch_engine import PollPolicy, run_launch, launch_url_for, extract_image_url, memo_forget
+from .async_utils import run_async, gather_launches, async_url_to_image_tensor
+from .request_memo import node_fingerprint
 
 class PiperGenerateImage:
     MODEL_LIST = [
@@ -13,6 +17,8 @@ class PiperGenerateImage:
         "midjourney",
     ]
 
+    MAX_BATCH_SIZE = 64
+
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -23,78 +29,108 @@ class PiperGenerateImage:
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
                 "poll_interval": ("INT", {"default": 5, "min": 1, "max": 60}),
                 "max_wait_time": ("INT", {"default": 300, "min": 30, "max": 1800}),
+            },
+            "optional": {
+                # Number of variants launched concurrently per prompt
+                "batch_size": ("INT", {"default": 1, "min": 1, "max": s.MAX_BATCH_SIZE}),
+                # One prompt per line; when set it replaces `prompt`
+                "prompt_list": ("STRING", {"multiline": True, "default": ""}),
+                "max_concurrency": ("INT", {"default": 8, "min": 1, "max": s.MAX_BATCH_SIZE}),
             }
         }
 
-    RETURN_TYPES = ("STRING", "IMAGE")
-    RETURN_NAMES = ("status_text", "image_output")
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        return node_fingerprint("generate-image-for-free-v1", kwargs)
+
+    RETURN_TYPES = ("STRING", "IMAGE", "STRING")
+    RETURN_NAMES = ("status_text", "image_output", "batch_status")
     FUNCTION = "generate_image"
     CATEGORY = "PiperAPI/Image"
 
-    def generate_image(self, api_key, prompt, model, seed, poll_interval, max_wait_time):
-        print(f"PiperGenerateImage called with seed: {seed} (Note: Seed is used for refresh, not sent to API)")
+    def generate_image(self, api_key, prompt, model, seed, poll_interval, max_wait_time,
+                       batch_size=1, prompt_list="", max_concurrency=8):
+        print(f"PiperGenerateImage called with seed: {seed} (part of the request memo key: same seed and inputs reuse the earlier result)")
 
-        launch_url = "https://app.piper.my/api/generate-image-for-free-v1/launch"
-        state_url_template = "https://app.piper.my/api/launches/{}/state"
         empty_image = create_empty_image_tensor()
+        prompts = [line.strip() for line in (prompt_list or "").splitlines() if line.strip()] or [prompt]
+        # (prompt, variant) pairs; the variant index keeps memoized batch variants distinct
+        jobs = [(p, variant) for p in prompts for variant in range(max(1, batch_size))]
+        policy = PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time)
+
+        if len(jobs) > 1:
+            return self.generate_batch(api_key, jobs, model, policy, max_concurrency, seed)
 
         launch_data = {
             "inputs": {
-                "prompt": prompt,
+                "prompt": jobs[0][0],
                 "model": model
             }
         }
         print(f"Launching Piper generation with data: {launch_data}")
 
-        launch_response = post_request(launch_url, api_key, launch_data)
+        result = run_launch(launch_url_for("generate-image-for-free-v1"), api_key, launch_data,
+                            extractor=extract_image_url, policy=policy, log_prefix="[PiperGenerateImage]",
+                            memoize=True, seed=seed)
 
-        if not launch_response or "_id" not in launch_response:
-            err_msg = "Error: Failed to launch generation or get launch ID."
+        if not result.ok:
+            err_msg = f"Error: Generation failed ({result.message})"
+            print(err_msg)
+            return (err_msg, empty_image, json.dumps([{"index": 0, "status": result.status, "error": result.message}]))
+
+        image_url = result.value
+        image_tensor = url_to_image_tensor(image_url)
+        if image_tensor is not None:
+            status_msg = f"Success: Image generated from {image_url}"
+            return (status_msg, image_tensor, json.dumps([{"index": 0, "status": "success", "image_url": image_url}]))
+        memo_forget(result) # The memoized URL is useless without its image
+        err_msg = f"Completed, but failed to download/process image from {image_url}"
+        print(err_msg)
+        return (err_msg, empty_image, json.dumps([{"index": 0, "status": "download_failed", "image_url": image_url}]))
+
+    def generate_batch(self, api_key, jobs, model, policy, max_concurrency, seed=0):
+        """Launches one job per (prompt, variant) concurrently and stacks the successful images."""
+        print(f"Launching {len(jobs)} Piper generations (max {max_concurrency} in flight)")
+        results, images = run_async(self._generate_batch_async(api_key, jobs, model, policy, max_concurrency, seed))
+        prompts = [item_prompt for item_prompt, _ in jobs]
+
+        item_status = []
+        tensors = []
+        for index, (item_prompt, result, image) in enumerate(zip(prompts, results, images)):
+            entry = {"index": index, "prompt": item_prompt, "status": result.status, "launch_id": result.launch_id}
+            if result.ok:
+                entry["image_url"] = result.value
+                if image is None:
+                    entry["status"] = "download_failed"
+                    memo_forget(result)
+                else:
+                    tensors.append(image)
+            else:
+                entry["error"] = result.message
+            item_status.append(entry)
+
+        batch_status = json.dumps(item_status, ensure_ascii=False)
+        if not tensors:
+            err_msg = f"Error: All {len(prompts)} generations failed"
             print(err_msg)
-            return (err_msg, empty_image)
-
-        launch_id = launch_response["_id"]
-        state_url = state_url_template.format(launch_id)
-
-        start_time = time.time()
-        while True:
-            current_time = time.time()
-            if current_time - start_time > max_wait_time:
-                err_msg = f"Error: Timed out waiting for generation {launch_id}"
-                print(err_msg)
-                return (err_msg, empty_image)
-
-            state_response = get_request(state_url, api_key)
-
-            if not state_response:
-                print(f"Retrying state check in {poll_interval}s...")
-                time.sleep(poll_interval)
-                continue
-
-            errors = state_response.get("errors")
-            if errors and isinstance(errors, list) and len(errors) > 0:
-                err_msg = f"Error: Generation failed (API Errors: {errors})"
-                print(err_msg)
-                print(f"Full state response: {state_response}")
-                return (err_msg, empty_image)
-
-            outputs = state_response.get("outputs")
-            if outputs and isinstance(outputs, dict) and len(outputs) > 0:
-                 image_url = outputs.get("image")
-
-                 if image_url and isinstance(image_url, str):
-                     image_tensor = url_to_image_tensor(image_url)
-                     if image_tensor is not None:
-                         status_msg = f"Success: Image generated from {image_url}"
-                         return (status_msg, image_tensor,)
-                     else:
-                         err_msg = f"Completed, but failed to download/process image from {image_url}"
-                         print(err_msg)
-                         return (err_msg, empty_image)
-                 else:
-                     err_msg = f"Completed, but image URL not found or invalid in outputs: {outputs}"
-                     print(err_msg)
-                     return (err_msg, empty_image)
-
-            print(f"Outputs/Errors are empty for {launch_id}. Assuming 'running'. Waiting {poll_interval}s...")
-            time.sleep(poll_interval)
\ No newline at end of file
+            return (err_msg, create_empty_image_tensor(), batch_status)
+        status_msg = f"Success: {len(tensors)}/{len(prompts)} images generated"
+        return (status_msg, stack_image_tensors(tensors), batch_status)
+
+    async def _generate_batch_async(self, api_key, jobs, model, policy, max_concurrency, seed):
+        launches = [{
+            "launch_url": launch_url_for("generate-image-for-free-v1"),
+            "api_key": api_key,
+            "launch_data": {"inputs": {"prompt": item_prompt, "model": model}},
+            "extractor": extract_image_url,
+            "policy": policy,
+            "memoize": True,
+            "seed": [seed, variant],
+        } for item_prompt, variant in jobs]
+        results = await gather_launches(launches, concurrency=max_concurrency)
+
+        async def _download(result):
+            return await async_url_to_image_tensor(result.value) if result.ok else None
+
+        images = await asyncio.gather(*(_download(result) for result in results))
+        return results, images
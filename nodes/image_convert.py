@@ -0,0 +1,86 @@
+# nodes/image_convert.py
+# Copy-minimal conversions between ComfyUI IMAGE tensors (float32 [B, H, W, C]
+# in 0..1) and uint8 pixel arrays / PIL images. Each direction does as few
+# full passes over the pixels as possible and works on whole batches.
+import warnings
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+def tensor_to_uint8(image_tensor, assume_normalized=False, warn_prefix=None):
+    """
+    Converts an IMAGE tensor ([B, H, W, C] or [H, W, C]) to a uint8 numpy array
+    of the same shape. Scaling happens on the tensor's device before the copy
+    to CPU, so only the 4x smaller uint8 result crosses the device boundary.
+
+    assume_normalized=True skips the range scan and the clamp when the caller
+    guarantees values are already in [0, 1]. Otherwise one aminmax pass decides
+    whether a clamp is needed at all.
+    """
+    tensor = image_tensor.detach()
+    needs_clamp = False
+    if not assume_normalized:
+        low, high = torch.aminmax(tensor)
+        low, high = float(low), float(high)
+        needs_clamp = low < 0.0 or high > 1.0
+        if needs_clamp and warn_prefix:
+            print(f"{warn_prefix} Предупреждение: Диапазон [{low}, {high}] выходит за [0.0, 1.0].")
+
+    scaled = tensor.mul(255.0) # The only full-size float allocation
+    if needs_clamp:
+        scaled.clamp_(0.0, 255.0)
+    # Truncation (not rounding) matches the previous astype(np.uint8) behaviour
+    return scaled.to(torch.uint8).cpu().numpy()
+
+
+def uint8_to_tensor(pixels):
+    """
+    Converts a uint8 array ([H, W, C] or [B, H, W, C]) into a float32 IMAGE
+    tensor with a batch dimension: one float32 allocation, scaled in place.
+    """
+    with warnings.catch_warnings():
+        # Arrays from PIL are read-only; safe here because .to(float32) copies
+        # before anything is written.
+        warnings.simplefilter("ignore", UserWarning)
+        source = torch.from_numpy(pixels)
+    tensor = source.to(torch.float32).div_(255.0)
+    if tensor.dim() == 3:
+        tensor = tensor.unsqueeze(0)
+    return tensor
+
+
+def pil_to_tensor(image, mode="RGB"):
+    """Converts one PIL image into a [1, H, W, C] IMAGE tensor."""
+    if image.mode != mode:
+        image = image.convert(mode)
+    return uint8_to_tensor(np.asarray(image))
+
+
+def pil_images_to_tensor(images, mode="RGB"):
+    """
+    Stacks same-sized PIL images into one [B, H, W, C] IMAGE tensor, filling a
+    preallocated uint8 batch and converting it to float32 once.
+    """
+    first = images[0] if images[0].mode == mode else images[0].convert(mode)
+    pixels = np.empty((len(images),) + np.asarray(first).shape, dtype=np.uint8)
+    for index, image in enumerate(images):
+        pixels[index] = np.asarray(image if image.mode == mode else image.convert(mode))
+    return uint8_to_tensor(pixels)
+
+
+def tensor_to_pil_images(image_tensor, assume_normalized=False):
+    """Converts an IMAGE tensor into a list of PIL images (one per batch item)."""
+    pixels = tensor_to_uint8(image_tensor, assume_normalized=assume_normalized)
+    if pixels.ndim == 3:
+        pixels = pixels[None]
+    images = []
+    for item in pixels:
+        if item.shape[2] == 1:
+            images.append(Image.fromarray(item[:, :, 0], "L"))
+        elif item.shape[2] == 4:
+            images.append(Image.fromarray(item, "RGBA"))
+        else:
+            images.append(Image.fromarray(item, "RGB"))
+    return images
@@ -0,0 +1,91 @@
+# nodes/kv_store.py
+# Small persistent key/value store on SQLite (stdlib) for the caches that must
+# survive a ComfyUI restart: values are JSON, entries expire after a TTL and
+# the least recently used ones are evicted beyond an entry/byte budget.
+import json
+import sqlite3
+import threading
+import time
+
+
+class SQLiteKVStore:
+    """
+    One table in one SQLite file. Safe to share between threads and between
+    processes (WAL mode, busy timeout). ttl=0 disables expiry.
+    """
+    def __init__(self, path, table="entries", max_entries=10000, max_bytes=64 * 2**20, ttl=0):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table!r}")
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            f"created REAL NOT NULL, last_used REAL NOT NULL, size INTEGER NOT NULL)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+
+    def get(self, key):
+        """Returns the stored value or None when missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        encoded = json.dumps(value, ensure_ascii=False)
+        if self.max_bytes and len(encoded) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, last_used, size) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, now, now, len(encoded)))
+            self.stats["stores"] += 1
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self, now):
+        removed = 0
+        if self.ttl:
+            removed += self._conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (now - self.ttl,)).rowcount
+        if self.max_entries:
+            removed += self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)).rowcount
+        if self.max_bytes:
+            total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            while total > self.max_bytes:
+                rows = self._conn.execute(
+                    f"SELECT key, size FROM {self.table} ORDER BY last_used LIMIT 32").fetchall()
+                if not rows:
+                    break
+                self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k, _ in rows])
+                total -= sum(size for _, size in rows)
+                removed += len(rows)
+        self.stats["evictions"] += removed
@@ -0,0 +1,199 @@
+# nodes/launch_await_node.py
+# Split variants of the generate nodes: a "launch" node returns a
+# PIPER_LAUNCH handle as soon as the API accepts the job, and Piper Await
+# Launch resolves it later; the shared background poller watches the launch
+# in between. ComfyUI executes nodes one at a time, so the job only renders
+# in parallel with whatever nodes ComfyUI happens to schedule between the
+# launch and the await node. Piper Await Launch itself blocks the execution
+# thread until the result is ready.
+import json
+
+from .utils import url_to_image_tensor, create_empty_image_tensor, remote_url_available
+from .launch_engine import (PollPolicy, LaunchResult, LaunchHandle, launch_detached, await_launch, attach_launch,
+                            launch_url_for, memo_forget, OUTPUT_EXTRACTORS)
+from .launch_journal import get_launch_journal
+from .request_memo import node_fingerprint
+
+
+def handle_status(handle):
+    if handle.result is not None and not handle.result.ok:
+        return f"Error: {handle.result.message}"
+    if handle.result is not None:
+        return f"Ready: launch {handle.launch_id} ({handle.result.message or 'done'})"
+    return f"Launched: {handle.launch_id}"
+
+
+class PiperLaunchVideo:
+    MODE_LIST = ["preview", "draft", "production"]
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "api_key": ("STRING", {"forceInput": True}),
+                "prompt": ("STRING", {"forceInput": True}),
+                "mode": (s.MODE_LIST, {"default": "preview"}),
+                "poll_interval": ("INT", {"default": 5, "min": 1, "max": 60}),
+            },
+            "optional": {
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
+                # Skip the memoized result and any unfinished earlier launch of the same request
+                "force_new_launch": ("BOOLEAN", {"default": False}),
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        return node_fingerprint("generate-video-v1", kwargs)
+
+    RETURN_TYPES = ("PIPER_LAUNCH", "STRING")
+    RETURN_NAMES = ("launch", "status_text")
+    FUNCTION = "launch_video"
+    CATEGORY = "PiperAPI/Video"
+
+    def launch_video(self, api_key, prompt, mode, poll_interval, seed=0, force_new_launch=False):
+        launch_data = {"inputs": {"prompt": prompt, "mode": mode}}
+        print(f"[PiperLaunchVideo] Launching Piper video generation with data: {launch_data}")
+        handle = launch_detached(launch_url_for("generate-video-v1"), api_key, launch_data, output_kind="video_url",
+                                 policy=PollPolicy(poll_interval=poll_interval, max_wait_time=600),
+                                 log_prefix="[PiperLaunchVideo]", memoize=True, seed=seed,
+                                 force_new=force_new_launch, memo_validate=remote_url_available)
+        return (handle, handle_status(handle))
+
+
+class PiperLaunchImage:
+    MODEL_LIST = [
+        "sdxl-turbo",
+        "sd-3.5",
+        "flux",
+        "flux-pro",
+        "flux-dev",
+        "flux-schnell",
+        "dall-e-3",
+        "midjourney",
+    ]
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "api_key": ("STRING", {"forceInput": True}),
+                "prompt": ("STRING", {"forceInput": True}),
+                "model": (s.MODEL_LIST, ),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
+                "poll_interval": ("INT", {"default": 5, "min": 1, "max": 60}),
+            },
+            "optional": {
+                "force_new_launch": ("BOOLEAN", {"default": False}),
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        return node_fingerprint("generate-image-for-free-v1", kwargs)
+
+    RETURN_TYPES = ("PIPER_LAUNCH", "STRING")
+    RETURN_NAMES = ("launch", "status_text")
+    FUNCTION = "launch_image"
+    CATEGORY = "PiperAPI/Image"
+
+    def launch_image(self, api_key, prompt, model, seed, poll_interval, force_new_launch=False):
+        launch_data = {"inputs": {"prompt": prompt, "model": model}}
+        print(f"[PiperLaunchImage] Launching Piper generation with data: {launch_data}")
+        handle = launch_detached(launch_url_for("generate-image-for-free-v1"), api_key, launch_data,
+                                 output_kind="image_url", policy=PollPolicy(poll_interval=poll_interval),
+                                 log_prefix="[PiperLaunchImage]", memoize=True, seed=seed,
+                                 force_new=force_new_launch)
+        return (handle, handle_status(handle))
+
+
+class PiperAttachLaunch:
+    """
+    Re-attaches to an existing launch by ID, e.g. one that was still running
+    when ComfyUI restarted. With an empty launch_id, status_text lists the
+    unfinished launches from the launch journal.
+    """
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "api_key": ("STRING", {"forceInput": True}),
+                "launch_id": ("STRING", {"default": ""}),
+                "output_kind": (list(OUTPUT_EXTRACTORS), {"default": "video_url"}),
+                "poll_interval": ("INT", {"default": 5, "min": 1, "max": 60}),
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        return float("nan") # The journal and the launch state change outside the graph
+
+    RETURN_TYPES = ("PIPER_LAUNCH", "STRING")
+    RETURN_NAMES = ("launch", "status_text")
+    FUNCTION = "attach"
+    CATEGORY = "PiperAPI"
+
+    def attach(self, api_key, launch_id, output_kind, poll_interval):
+        policy = PollPolicy(poll_interval=poll_interval)
+        launch_id = launch_id.strip()
+        if launch_id:
+            handle = attach_launch(launch_id, api_key, output_kind, policy)
+            journal = get_launch_journal()
+            entry = journal.get(launch_id) if journal is not None else None
+            print(f"[PiperAttachLaunch] Attached to launch {launch_id}")
+            return (handle, json.dumps(entry or {"launch_id": launch_id}, ensure_ascii=False))
+
+        journal = get_launch_journal()
+        unfinished = journal.recent(unfinished_only=True) if journal is not None else []
+        # A handle that resolves to an error, so a connected await node reports it
+        result = LaunchResult(LaunchResult.LAUNCH_FAILED, message="no launch_id given")
+        handle = LaunchHandle(None, api_key, output_kind, policy, result=result)
+        print(f"[PiperAttachLaunch] {len(unfinished)} unfinished launches in the journal")
+        return (handle, json.dumps(unfinished, ensure_ascii=False))
+
+
+class PiperAwaitLaunch:
+    """
+    Resolves a PIPER_LAUNCH handle into its URL (and the image, for image
+    launches). Blocks ComfyUI's execution thread (launch_engine._wait_shared)
+    until the launch finishes or max_wait_time runs out; other branches only
+    overlap with the render if ComfyUI runs them between the launch node and
+    this one.
+    """
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "launch": ("PIPER_LAUNCH",),
+                "max_wait_time": ("INT", {"default": 600, "min": 30, "max": 3600}), # Counted from when this node runs
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "IMAGE", "STRING")
+    RETURN_NAMES = ("url_or_status", "image_output", "status_text")
+    FUNCTION = "await_launch"
+    CATEGORY = "PiperAPI"
+
+    def await_launch(self, launch, max_wait_time):
+        empty_image = create_empty_image_tensor()
+        result = await_launch(launch, max_wait_time=max_wait_time, log_prefix="[PiperAwaitLaunch]")
+
+        if not result.ok:
+            print(f"[PiperAwaitLaunch] Error: Launch failed ({result.message})")
+            if result.status == LaunchResult.API_ERROR:
+                err_msg = f"Error: API processing failed - {json.dumps(result.errors)}"
+            elif result.status == LaunchResult.BAD_OUTPUTS:
+                err_msg = f"Completed (no URL found): {json.dumps(result.outputs)}"
+            else:
+                err_msg = f"Error: {result.message}"
+            return (err_msg, empty_image, err_msg)
+
+        if launch.output_kind != "image_url":
+            return (result.value, empty_image, f"Success: launch {result.launch_id}")
+        image_tensor = url_to_image_tensor(result.value)
+        if image_tensor is None:
+            memo_forget(result)
+            err_msg = f"Completed, but failed to download/process image from {result.value}"
+            print(f"[PiperAwaitLaunch] {err_msg}")
+            return (result.value, empty_image, err_msg)
+        return (result.value, image_tensor, f"Success: Image generated from {result.value}")
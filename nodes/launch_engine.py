@@ -0,0 +1,618 @@
+# nodes/launch_engine.py
+# Shared launch-and-poll engine used by every Piper node that starts a
+# launch and waits for /api/launches/{id}/state to fill in.
+import os
+import random
+import time
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+
+from .utils import post_request, post_request_json, post_request_multipart, get_request, FatalAPIError, RateLimited
+
+try:
+    import comfy.model_management as model_management # Only available inside ComfyUI
+except ImportError:
+    model_management = None
+
+API_BASE_URL = "https://app.piper.my/api"
+STATE_URL_TEMPLATE = API_BASE_URL + "/launches/{}/state"
+CANCEL_URL_TEMPLATE = API_BASE_URL + "/launches/{}/cancel" # Assumed endpoint
+
+# Waits are sliced so a Cancel in ComfyUI is noticed within this many seconds
+INTERRUPT_CHECK_INTERVAL = 0.25
+
+# Set PIPER_SHARED_POLLER=0 to make every node poll from its own thread
+USE_SHARED_POLLER = os.environ.get("PIPER_SHARED_POLLER", "1") != "0"
+
+
+def launch_url_for(endpoint):
+    """Builds the launch URL for an endpoint name like 'generate-video-v1'."""
+    return f"{API_BASE_URL}/{endpoint}/launch"
+
+
+def state_url_for(launch_id):
+    return STATE_URL_TEMPLATE.format(launch_id)
+
+
+def cancel_url_for(launch_id):
+    return CANCEL_URL_TEMPLATE.format(launch_id)
+
+
+# --- Interruption ---
+
+class LaunchInterrupted(getattr(model_management, "InterruptProcessingException", Exception)):
+    """
+    Raised when the user interrupts the queue while a launch is running.
+    Inside ComfyUI it subclasses InterruptProcessingException, so the prompt
+    ends as interrupted rather than failed.
+    """
+
+
+def interrupt_requested():
+    """True when ComfyUI's interrupt flag is set (never outside ComfyUI)."""
+    return model_management is not None and model_management.processing_interrupted()
+
+
+def cancel_launch(launch_id, api_key, timeout=5):
+    """Best-effort server-side cancel of a launch; returns True when the API accepted it."""
+    try:
+        # No rate-limit wait: the interrupt flag is already set, so any wait would abort at once
+        response = post_request_json(cancel_url_for(launch_id), api_key, {}, timeout=timeout, max_wait=0)
+    except RateLimited as e:
+        response = {"error": str(e)}
+    accepted = isinstance(response, dict) and "error" not in response
+    if not accepted:
+        print(f"[PiperLaunch] Could not cancel launch {launch_id}: {response}")
+    return accepted
+
+
+def interrupt_launch(launch_id, api_key, log_prefix="[PiperLaunch]"):
+    """Cancels launch_id on the server (when known) and raises LaunchInterrupted."""
+    if launch_id is not None:
+        print(f"{log_prefix} Interrupted, cancelling launch {launch_id}")
+        cancel_launch(launch_id, api_key)
+    raise LaunchInterrupted(f"launch {launch_id} interrupted" if launch_id else "interrupted before launch")
+
+
+def interruptible_sleep(seconds, launch_id=None, api_key=None, log_prefix="[PiperLaunch]"):
+    """time.sleep in INTERRUPT_CHECK_INTERVAL slices; interrupts via interrupt_launch."""
+    end = time.monotonic() + max(0.0, seconds)
+    while True:
+        if interrupt_requested():
+            interrupt_launch(launch_id, api_key, log_prefix)
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(INTERRUPT_CHECK_INTERVAL, remaining))
+
+
+class Deadline:
+    """
+    One monotonic deadline for a whole launch: the launch request, every state
+    poll and every HTTP timeout are capped by what is left of it.
+    """
+    MIN_REQUEST_TIMEOUT = 0.5 # Seconds, so a nearly expired deadline still gets one short try
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+    def cap(self, timeout):
+        """Returns the HTTP timeout to use so a request cannot outlive the deadline."""
+        return max(self.MIN_REQUEST_TIMEOUT, min(timeout, self.remaining()))
+
+
+class PollPolicy:
+    """
+    Polling schedule: starts at poll_interval and grows by `backoff` per
+    attempt up to max_interval, with +/- `jitter` (fraction) randomization.
+    """
+    def __init__(self, poll_interval=2.0, max_wait_time=300, backoff=1.3, max_interval=None,
+                 jitter=0.2, request_timeout=60):
+        self.poll_interval = max(0.1, float(poll_interval))
+        self.max_wait_time = max_wait_time
+        self.backoff = max(1.0, float(backoff))
+        self.max_interval = float(max_interval) if max_interval else self.poll_interval * 3
+        self.jitter = max(0.0, min(float(jitter), 1.0))
+        self.request_timeout = request_timeout
+
+    def interval(self, attempt):
+        base = min(self.poll_interval * (self.backoff ** attempt), self.max_interval)
+        if self.jitter:
+            base *= 1.0 + random.uniform(-self.jitter, self.jitter)
+        return max(0.05, base)
+
+    def deadline(self):
+        return Deadline(self.max_wait_time)
+
+
+class LaunchResult:
+    """Outcome of a launch: status plus whatever the extractor pulled from outputs."""
+    SUCCESS = "success"
+    LAUNCH_FAILED = "launch_failed"
+    API_ERROR = "api_error"
+    BAD_OUTPUTS = "bad_outputs"
+    TIMEOUT = "timeout"
+    FATAL_ERROR = "fatal_error" # Non-retryable HTTP error (bad key, quota, unknown launch, ...)
+
+    def __init__(self, status, launch_id=None, value=None, outputs=None, errors=None, message=""):
+        self.status = status
+        self.launch_id = launch_id
+        self.value = value
+        self.outputs = outputs
+        self.errors = errors
+        self.message = message
+        self.memo_key = None # Set when the result came from / went into the request memo
+
+    @property
+    def ok(self):
+        return self.status == self.SUCCESS
+
+    def __repr__(self):
+        return f"LaunchResult(status={self.status!r}, launch_id={self.launch_id!r}, message={self.message!r})"
+
+
+# --- Output extractors ---
+# Each takes the non-empty 'outputs' of a finished launch and returns the value
+# the node needs, or raises ValueError when the outputs do not contain it.
+
+def extract_image_url(outputs):
+    image_url = outputs.get("image") if isinstance(outputs, dict) else None
+    if image_url and isinstance(image_url, str):
+        return image_url
+    raise ValueError(f"image URL not found or invalid in outputs: {outputs}")
+
+
+def extract_video_url(outputs):
+    video_url = None
+    if isinstance(outputs, dict):
+        video_url = outputs.get("video") or outputs.get("video_url") or outputs.get("url")
+    if video_url and isinstance(video_url, str):
+        return video_url
+    raise ValueError(f"video URL not found or invalid in outputs: {outputs}")
+
+
+def extract_llm_answer(outputs):
+    answer = None
+    if isinstance(outputs, str):
+        answer = outputs
+    elif isinstance(outputs, dict):
+        answer = outputs.get("answer") or outputs.get("text") or outputs.get("result")
+        if answer is None and len(outputs) == 1:
+            answer = list(outputs.values())[0]
+    if answer is not None and isinstance(answer, str):
+        return answer
+    raise ValueError(f"answer not found or invalid in outputs: {outputs}")
+
+
+def extract_raw_json(outputs):
+    return outputs
+
+
+OUTPUT_EXTRACTORS = {
+    "image_url": extract_image_url,
+    "video_url": extract_video_url,
+    "llm_answer": extract_llm_answer,
+    "raw_json": extract_raw_json,
+}
+
+
+def format_api_errors(errors):
+    if isinstance(errors, list):
+        return ', '.join(map(str, errors))
+    return str(errors)
+
+
+def parse_state(state_response):
+    """
+    Splits a state response into ('errors', errors), ('outputs', outputs) or
+    None while the launch is still running.
+    """
+    if not state_response or not isinstance(state_response, dict):
+        return None
+    errors = state_response.get("errors")
+    if errors:
+        return ("errors", errors)
+    outputs = state_response.get("outputs")
+    if outputs:
+        return ("outputs", outputs)
+    return None
+
+
+def finish_from_state(launch_id, kind, payload, extractor):
+    """Turns a parsed terminal state into a LaunchResult."""
+    if kind == "errors":
+        return LaunchResult(LaunchResult.API_ERROR, launch_id, errors=payload,
+                            message=f"launch {launch_id} failed: {format_api_errors(payload)}")
+    try:
+        value = extractor(payload)
+    except ValueError as e:
+        return LaunchResult(LaunchResult.BAD_OUTPUTS, launch_id, outputs=payload,
+                            message=f"launch {launch_id} completed, but {e}")
+    return LaunchResult(LaunchResult.SUCCESS, launch_id, value=value, outputs=payload)
+
+
+def start_launch(launch_url, api_key, launch_data, deadline=None, request_timeout=60, json_body=False,
+                 multipart_image=None):
+    """
+    Sends the launch request. Returns (launch_id, None) or (None, error_details);
+    raises FatalAPIError when the API rejects the request for good.
+    json_body=True uses post_request_json, which returns the server error body.
+    multipart_image=(field, image_bytes, mime_type) sends the image as a binary
+    multipart part next to the JSON inputs instead of inside them.
+    """
+    timeout = deadline.cap(request_timeout) if deadline else request_timeout
+    max_wait = deadline.remaining() if deadline else None # Do not wait for a rate-limit token past the deadline
+    try:
+        if multipart_image is not None:
+            field, image_bytes, mime_type = multipart_image
+            launch_response = post_request_multipart(launch_url, api_key, multipart_inputs(launch_data, field), None,
+                                                     timeout=timeout, image_field=field, image_bytes=image_bytes,
+                                                     mime_type=mime_type, raise_fatal=True, max_wait=max_wait)
+        else:
+            sender = post_request_json if json_body else post_request
+            launch_response = sender(launch_url, api_key, launch_data, timeout=timeout, raise_fatal=True,
+                                     max_wait=max_wait)
+    except RateLimited as e:
+        return None, str(e)
+    return parse_launch_response(launch_response)
+
+
+def multipart_inputs(launch_data, field):
+    """The JSON 'inputs' part for a multipart launch: everything except the image field."""
+    return {key: value for key, value in launch_data.get("inputs", {}).items() if key != field}
+
+
+def parse_launch_response(launch_response):
+    """Returns (launch_id, None) for a successful launch response, else (None, error_details)."""
+    if launch_response and isinstance(launch_response, dict) and "_id" in launch_response:
+        return launch_response["_id"], None
+    if isinstance(launch_response, dict):
+        return None, launch_response.get("error", launch_response)
+    return None, launch_response or "no response"
+
+
+def fatal_result(launch_id, error):
+    """LaunchResult for a FatalAPIError: stop now and show the HTTP status and body."""
+    where = f" for launch {launch_id}" if launch_id else ""
+    return LaunchResult(LaunchResult.FATAL_ERROR, launch_id, errors={"status": error.status, "body": error.body},
+                        message=f"fatal API error{where}: {error}")
+
+
+def launch_failed_result(error_details):
+    return LaunchResult(LaunchResult.LAUNCH_FAILED, errors=error_details,
+                        message=f"failed to launch or get launch ID (API response: {error_details})")
+
+
+def poll_launch(launch_id, api_key, extractor=extract_raw_json, policy=None, deadline=None, log_prefix="[PiperLaunch]",
+                use_shared_poller=None):
+    """
+    Waits for launch_id until outputs/errors appear or the deadline expires.
+    By default the wait is served by the background StatePoller; pass
+    use_shared_poller=False to poll from the calling thread instead.
+    """
+    policy = policy or PollPolicy()
+    deadline = deadline or policy.deadline()
+    if use_shared_poller is None:
+        use_shared_poller = USE_SHARED_POLLER
+    if use_shared_poller:
+        return _wait_shared(launch_id, api_key, extractor, policy, deadline, log_prefix)
+
+    state_url = state_url_for(launch_id)
+    attempt = 0
+    state_response = {}
+    while True:
+        if deadline.expired():
+            return timeout_result(launch_id, policy)
+
+        try:
+            # A poll right after a failed one is a retry and draws on the shared retry budget
+            state_response = get_request(state_url, api_key, timeout=deadline.cap(policy.request_timeout),
+                                         raise_fatal=True, is_retry=state_response is None,
+                                         max_wait=deadline.remaining())
+        except FatalAPIError as e:
+            return fatal_result(launch_id, e)
+        except RateLimited as e: # The next token is due after the deadline: waiting cannot help
+            print(f"{log_prefix} {e}")
+            return timeout_result(launch_id, policy)
+        parsed = parse_state(state_response)
+        if parsed is not None:
+            return finish_from_state(launch_id, parsed[0], parsed[1], extractor)
+        if state_response is None:
+            print(f"{log_prefix} State check for {launch_id} failed, retrying...")
+
+        interruptible_sleep(min(policy.interval(attempt), deadline.remaining()), launch_id, api_key, log_prefix)
+        attempt += 1
+
+
+def timeout_result(launch_id, policy):
+    return LaunchResult(LaunchResult.TIMEOUT, launch_id,
+                        message=f"timed out after {policy.max_wait_time}s waiting for launch {launch_id}")
+
+
+def _wait_shared(launch_id, api_key, extractor, policy, deadline, log_prefix="[PiperLaunch]", future=None):
+    from .state_poller import get_state_poller # Imported lazily: state_poller imports this module
+
+    poller = get_state_poller()
+    if future is None or not future.done():
+        # Joins a background watch (see launch_detached) as a waiter, or registers anew
+        future = poller.watch(launch_id, api_key, policy, deadline)
+    while True:
+        if interrupt_requested():
+            poller.unwatch(launch_id)
+            interrupt_launch(launch_id, api_key, log_prefix)
+        if deadline.expired():
+            poller.unwatch(launch_id)
+            return timeout_result(launch_id, policy)
+        if future.cancelled(): # Dropped by the poller, e.g. its registration expired
+            future = poller.watch(launch_id, api_key, policy, deadline)
+        try:
+            state_response = future.result(timeout=min(INTERRUPT_CHECK_INTERVAL, deadline.remaining()))
+            break
+        except FutureTimeoutError:
+            continue
+        except CancelledError:
+            continue
+        except FatalAPIError as e:
+            return fatal_result(launch_id, e)
+    kind, payload = parse_state(state_response)
+    return finish_from_state(launch_id, kind, payload, extractor)
+
+
+def run_launch(launch_url, api_key, launch_data, extractor=extract_raw_json, policy=None,
+               log_prefix="[PiperLaunch]", json_body=False, multipart_image=None, memoize=False, seed=None,
+               reattach=None, force_new=False, memo_validate=None):
+    """
+    Launches a job and polls it to completion under one deadline. With
+    memoize=True an identical earlier request (same endpoint, inputs and seed)
+    is answered from the request memo without launching. Every launch is
+    written to the launch journal; with reattach (default: memoize) an
+    unfinished earlier launch of the identical request is polled again
+    instead of starting a new one. force_new=True skips both and launches;
+    the result still refreshes the memo. memo_validate(value) -> bool rejects
+    a memoized value that is no longer usable (e.g. an expired URL).
+    """
+    memo_key = memo_key_for(launch_url, api_key, launch_data, multipart_image, seed) if memoize else None
+    cached = memo_lookup(memo_key, extractor, log_prefix, memo_validate) if not force_new else None
+    if cached is not None:
+        return cached
+    if interrupt_requested():
+        interrupt_launch(None, api_key, log_prefix)
+    policy = policy or PollPolicy()
+    deadline = policy.deadline()
+    journal_key = journal_key_for(launch_url, api_key, launch_data, multipart_image, seed, memo_key)
+    if reattach is None:
+        reattach = memoize
+    resumed_id = journal_reattach(journal_key, log_prefix) if reattach and not force_new else None
+    if resumed_id is not None:
+        result = _poll_journaled(resumed_id, api_key, extractor, policy, deadline, log_prefix)
+        if result.status != LaunchResult.FATAL_ERROR:
+            memo_remember(memo_key, result)
+            return result
+        print(f"{log_prefix} Launch {resumed_id} can no longer be re-attached ({result.message}); launching again.")
+    try:
+        launch_id, error_details = start_launch(launch_url, api_key, launch_data, deadline=deadline,
+                                                request_timeout=policy.request_timeout, json_body=json_body,
+                                                multipart_image=multipart_image)
+    except FatalAPIError as e:
+        return fatal_result(None, e)
+    if launch_id is None:
+        return launch_failed_result(error_details)
+    journal_record(journal_key, launch_url, launch_data, launch_id)
+    result = _poll_journaled(launch_id, api_key, extractor, policy, deadline, log_prefix)
+    memo_remember(memo_key, result)
+    return result
+
+
+def _poll_journaled(launch_id, api_key, extractor, policy, deadline, log_prefix):
+    """poll_launch() that writes the outcome (or the cancel) to the launch journal."""
+    try:
+        result = poll_launch(launch_id, api_key, extractor=extractor, policy=policy, deadline=deadline,
+                             log_prefix=log_prefix)
+    except LaunchInterrupted:
+        journal_finish(launch_id, JOURNAL_CANCELLED)
+        raise
+    journal_finish(launch_id, result.status, result.message)
+    return result
+
+
+# --- Detached launches (launch now, await later) ---
+
+class LaunchHandle:
+    """
+    A launch started by launch_detached(). It is registered with the shared
+    StatePoller right away, so the state is polled in the background while the
+    rest of the graph runs. `result` is set once the outcome is known (launch
+    failure, memo hit or a completed await).
+    """
+    def __init__(self, launch_id, api_key, output_kind, policy, result=None, future=None, memo_key=None):
+        self.launch_id = launch_id
+        self.api_key = api_key
+        self.output_kind = output_kind
+        self.policy = policy
+        self.result = result
+        self.future = future
+        self.memo_key = memo_key
+        self.started_at = time.time()
+
+    def __repr__(self):
+        return f"LaunchHandle(launch_id={self.launch_id!r}, output_kind={self.output_kind!r}, result={self.result!r})"
+
+
+def launch_detached(launch_url, api_key, launch_data, output_kind="raw_json", policy=None,
+                    log_prefix="[PiperLaunch]", json_body=False, multipart_image=None, memoize=False, seed=None,
+                    force_new=False, memo_validate=None):
+    """
+    Sends the launch request and returns a LaunchHandle without waiting for
+    the result; resolve it with await_launch(). output_kind is a key of
+    OUTPUT_EXTRACTORS. memoize, force_new and memo_validate work as in run_launch().
+    """
+    extractor = OUTPUT_EXTRACTORS[output_kind]
+    policy = policy or PollPolicy()
+    memo_key = memo_key_for(launch_url, api_key, launch_data, multipart_image, seed) if memoize else None
+    cached = memo_lookup(memo_key, extractor, log_prefix, memo_validate) if not force_new else None
+    if cached is not None:
+        return LaunchHandle(cached.launch_id, api_key, output_kind, policy, result=cached, memo_key=memo_key)
+    if interrupt_requested():
+        interrupt_launch(None, api_key, log_prefix)
+    journal_key = journal_key_for(launch_url, api_key, launch_data, multipart_image, seed, memo_key)
+    launch_id = journal_reattach(journal_key, log_prefix) if memoize and not force_new else None
+    if launch_id is None:
+        try:
+            launch_id, error_details = start_launch(launch_url, api_key, launch_data, deadline=policy.deadline(),
+                                                    request_timeout=policy.request_timeout, json_body=json_body,
+                                                    multipart_image=multipart_image)
+        except FatalAPIError as e:
+            return LaunchHandle(None, api_key, output_kind, policy, result=fatal_result(None, e))
+        if launch_id is None:
+            return LaunchHandle(None, api_key, output_kind, policy, result=launch_failed_result(error_details))
+        journal_record(journal_key, launch_url, launch_data, launch_id)
+        print(f"{log_prefix} Launched {launch_id}; polling in the background.")
+    return attach_launch(launch_id, api_key, output_kind, policy, memo_key=memo_key)
+
+
+def attach_launch(launch_id, api_key, output_kind="raw_json", policy=None, memo_key=None):
+    """
+    LaunchHandle for an existing launch ID (e.g. one from the launch journal),
+    watched in the background for up to policy.max_wait_time. Attaching to an
+    already watched launch shares its registration instead of adding a waiter.
+    """
+    from .state_poller import get_state_poller
+    policy = policy or PollPolicy()
+    future = get_state_poller().watch(launch_id, api_key, policy, background=True)
+    return LaunchHandle(launch_id, api_key, output_kind, policy, future=future, memo_key=memo_key)
+
+
+def await_launch(handle, max_wait_time=None, log_prefix="[PiperLaunch]"):
+    """
+    Waits for a LaunchHandle (at most max_wait_time seconds from now, default
+    the handle's policy) and returns its LaunchResult. A timed-out handle can
+    be awaited again: its launch is simply watched again.
+    """
+    if handle.result is not None:
+        return handle.result
+    policy = handle.policy
+    deadline = Deadline(max_wait_time if max_wait_time is not None else policy.max_wait_time)
+    future = handle.future
+    handle.future = None # Consumed: _wait_shared joins it as a waiter and unwatches on timeout or interrupt
+    try:
+        result = _wait_shared(handle.launch_id, handle.api_key, OUTPUT_EXTRACTORS[handle.output_kind], policy,
+                              deadline, log_prefix, future=future)
+    except LaunchInterrupted:
+        journal_finish(handle.launch_id, JOURNAL_CANCELLED)
+        raise
+    journal_finish(handle.launch_id, result.status, result.message)
+    if result.status == LaunchResult.TIMEOUT:
+        result.message = f"timed out after {deadline.seconds}s waiting for launch {handle.launch_id}"
+        return result
+    handle.result = result
+    memo_remember(handle.memo_key, result)
+    return result
+
+
+# --- Request memoization (see request_memo.py) ---
+
+def memo_key_for(launch_url, api_key, launch_data, multipart_image=None, seed=None):
+    """Memo key for a launch, or None when the request memo is disabled."""
+    from .request_memo import get_request_memo, launch_memo_key # Lazy: keeps sqlite out of plain imports
+    if get_request_memo() is None:
+        return None
+    return launch_memo_key(launch_url, api_key, launch_data, multipart_image, seed)
+
+
+def memo_lookup(memo_key, extractor, log_prefix="[PiperLaunch]", validate=None):
+    """Returns the memoized LaunchResult for memo_key, or None (also when validate(value) rejects it)."""
+    if memo_key is None:
+        return None
+    from .request_memo import get_request_memo
+    memo = get_request_memo()
+    entry = memo.lookup(memo_key) if memo else None
+    if not entry:
+        return None
+    result = finish_from_state(entry["launch_id"], "outputs", entry["outputs"], extractor)
+    if not result.ok or (validate is not None and not validate(result.value)):
+        print(f"{log_prefix} Memoized result of launch {result.launch_id} is no longer usable; launching again.")
+        memo.forget(memo_key)
+        return None
+    result.message = "memoized"
+    result.memo_key = memo_key
+    print(f"{log_prefix} Reusing result of launch {result.launch_id} for an identical request.")
+    return result
+
+
+def memo_remember(memo_key, result):
+    if memo_key is None or not result.ok:
+        return
+    from .request_memo import get_request_memo
+    memo = get_request_memo()
+    if memo:
+        memo.remember(memo_key, result.launch_id, result.value, result.outputs)
+        result.memo_key = memo_key
+
+
+def memo_forget(result):
+    """Drops a memoized result that turned out unusable (e.g. its image no longer downloads)."""
+    if result is None or result.memo_key is None:
+        return
+    from .request_memo import get_request_memo
+    memo = get_request_memo()
+    if memo:
+        memo.forget(result.memo_key)
+        print(f"[PiperLaunch] Forgot memoized result of launch {result.launch_id}.")
+    result.memo_key = None
+
+
+# --- Launch journal (see launch_journal.py) ---
+
+JOURNAL_CANCELLED = "cancelled"
+
+
+def journal_key_for(launch_url, api_key, launch_data, multipart_image=None, seed=None, memo_key=None):
+    """Request key for the launch journal (the memo key when already computed), or None when disabled."""
+    from .launch_journal import get_launch_journal # Lazy, like the request memo
+    if get_launch_journal() is None:
+        return None
+    if memo_key is not None:
+        return memo_key
+    from .request_memo import launch_memo_key
+    return launch_memo_key(launch_url, api_key, launch_data, multipart_image, seed)
+
+
+def journal_reattach(journal_key, log_prefix="[PiperLaunch]"):
+    """Launch ID of an unfinished journaled launch of the same request, or None."""
+    if journal_key is None:
+        return None
+    from .launch_journal import get_launch_journal
+    launch_id = get_launch_journal().claim_reattach(journal_key)
+    if launch_id is not None:
+        print(f"{log_prefix} Re-attaching to unfinished launch {launch_id} instead of launching again "
+              f"(enable 'force_new_launch' on the node to start a new one).")
+    return launch_id
+
+
+def journal_record(journal_key, launch_url, launch_data, launch_id):
+    if journal_key is None:
+        return
+    from .launch_journal import get_launch_journal
+    try:
+        get_launch_journal().record_launch(journal_key, launch_url, launch_data, launch_id)
+    except Exception as e: # The journal must never fail a launch
+        print(f"[PiperLaunchJournal] Could not record launch {launch_id}: {e}")
+
+
+def journal_finish(launch_id, status, message=""):
+    if launch_id is None:
+        return
+    from .launch_journal import get_launch_journal
+    journal = get_launch_journal()
+    if journal is None:
+        return
+    try:
+        journal.update_status(launch_id, status, message)
+    except Exception as e:
+        print(f"[PiperLaunchJournal] Could not update launch {launch_id}: {e}")
@@ -0,0 +1,163 @@
+# nodes/launch_journal.py
+# Durable journal of every launch (SQLite, stdlib): endpoint, canonical
+# inputs, launch ID and status. When ComfyUI restarts or a node times out the
+# job usually keeps running server-side; an identical re-execution finds the
+# unfinished launch here and re-attaches to /api/launches/{id}/state instead
+# of paying for a second launch.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .cache_paths import cache_dir
+from .request_memo import _canonical
+
+# Maximum age of a launch worth re-attaching to: older unfinished launches are
+# presumed hung and a fresh one is started.
+DEFAULT_REATTACH_WINDOW = float(os.environ.get("PIPER_LAUNCH_JOURNAL_WINDOW", str(6 * 3600)))
+# Re-attaches per launch; after this many a launch that keeps timing out is abandoned
+DEFAULT_MAX_REATTACH = int(os.environ.get("PIPER_LAUNCH_JOURNAL_MAX_REATTACH", "2"))
+# Rows are kept this long for inspection, then pruned on open
+DEFAULT_RETENTION = float(os.environ.get("PIPER_LAUNCH_JOURNAL_RETENTION", str(7 * 24 * 3600)))
+MAX_INLINE_INPUT = 1024 # Longer strings (base64 images, long prompts) are stored as a hash
+
+LAUNCHED = "launched"
+TIMEOUT = "timeout"
+ABANDONED = "abandoned" # Re-attached too often without finishing
+# Statuses whose launch may still finish server-side
+UNFINISHED_STATUSES = (LAUNCHED, TIMEOUT)
+
+
+def journal_inputs(launch_data):
+    """Canonical inputs for the journal, with large values replaced by their hash."""
+    def shrink(value):
+        if isinstance(value, dict):
+            return {k: shrink(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [shrink(v) for v in value]
+        if isinstance(value, str) and len(value) > MAX_INLINE_INPUT:
+            return f"sha256:{hashlib.sha256(value.encode('utf-8')).hexdigest()} ({len(value)} chars)"
+        return value
+    return shrink(_canonical(launch_data))
+
+
+class LaunchJournal:
+    """
+    One row per launch, keyed by launch ID and indexed by request key (the
+    request memo key: endpoint, API key hash, inputs, seed). Safe to share
+    between threads and processes (WAL mode). `reattaches` counts how often a
+    launch was picked up again, so a launch hung server-side is given up on.
+    """
+    def __init__(self, path, reattach_window=DEFAULT_REATTACH_WINDOW, retention=DEFAULT_RETENTION,
+                 max_reattach=DEFAULT_MAX_REATTACH):
+        self.path = path
+        self.reattach_window = reattach_window
+        self.max_reattach = max_reattach
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS launches (launch_id TEXT PRIMARY KEY, request_key TEXT NOT NULL, "
+            "endpoint TEXT NOT NULL, inputs TEXT NOT NULL, status TEXT NOT NULL, message TEXT NOT NULL DEFAULT '', "
+            "created REAL NOT NULL, updated REAL NOT NULL, reattaches INTEGER NOT NULL DEFAULT 0)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(launches)")}
+        if "reattaches" not in columns: # Journal written before the counter existed
+            self._conn.execute("ALTER TABLE launches ADD COLUMN reattaches INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS launches_request_key ON launches (request_key, created)")
+        if retention:
+            self._conn.execute("DELETE FROM launches WHERE created < ?", (time.time() - retention,))
+
+    def record_launch(self, request_key, endpoint, launch_data, launch_id):
+        now = time.time()
+        inputs = json.dumps(journal_inputs(launch_data), ensure_ascii=False, sort_keys=True)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO launches (launch_id, request_key, endpoint, inputs, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", (launch_id, request_key, endpoint, inputs, LAUNCHED, now, now))
+
+    def update_status(self, launch_id, status, message=""):
+        with self._lock:
+            self._conn.execute("UPDATE launches SET status = ?, message = ?, updated = ? WHERE launch_id = ?",
+                               (status, str(message)[:1000], time.time(), launch_id))
+
+    def claim_reattach(self, request_key):
+        """
+        Launch ID of the newest unfinished launch for request_key that is younger
+        than the re-attach window and was re-attached fewer than max_reattach
+        times, or None. Claiming counts as one re-attach.
+        """
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATUSES)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE") # Claim atomically across processes too
+            try:
+                row = self._conn.execute(
+                    f"SELECT launch_id, reattaches FROM launches WHERE request_key = ? AND status IN ({placeholders}) "
+                    f"AND created >= ? ORDER BY created DESC LIMIT 1",
+                    (request_key, *UNFINISHED_STATUSES, time.time() - self.reattach_window)).fetchone()
+                launch_id = row[0] if row else None
+                if row is not None and row[1] >= self.max_reattach:
+                    self._conn.execute("UPDATE launches SET status = ?, updated = ? WHERE launch_id = ?",
+                                       (ABANDONED, time.time(), launch_id))
+                    print(f"[PiperLaunchJournal] Launch {launch_id} did not finish after {row[1]} re-attaches; "
+                          f"starting a new one.")
+                    launch_id = None
+                elif launch_id is not None:
+                    self._conn.execute(
+                        "UPDATE launches SET reattaches = reattaches + 1, updated = ? WHERE launch_id = ?",
+                        (time.time(), launch_id))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return launch_id
+
+    def get(self, launch_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT launch_id, endpoint, inputs, status, message, created, updated, reattaches FROM launches "
+                "WHERE launch_id = ?", (launch_id,)).fetchone()
+        return self._row_dict(row) if row else None
+
+    def recent(self, limit=20, unfinished_only=False):
+        """Newest launches first, as dicts."""
+        query = "SELECT launch_id, endpoint, inputs, status, message, created, updated, reattaches FROM launches"
+        params = []
+        if unfinished_only:
+            query += f" WHERE status IN ({', '.join('?' for _ in UNFINISHED_STATUSES)})"
+            params.extend(UNFINISHED_STATUSES)
+        query += " ORDER BY created DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit)).fetchall()
+        return [self._row_dict(row) for row in rows]
+
+    @staticmethod
+    def _row_dict(row):
+        launch_id, endpoint, inputs, status, message, created, updated, reattaches = row
+        return {"launch_id": launch_id, "endpoint": endpoint, "inputs": json.loads(inputs), "status": status,
+                "message": message, "created": created, "updated": updated, "reattaches": reattaches}
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_launch_journal():
+    """
+    Process-wide LaunchJournal, or None when disabled with
+    PIPER_LAUNCH_JOURNAL=0 or when the database cannot be opened.
+    """
+    global _journal
+    if os.environ.get("PIPER_LAUNCH_JOURNAL", "1") == "0":
+        return None
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                try:
+                    _journal = LaunchJournal(os.path.join(cache_dir("requests"), "journal.sqlite3"))
+                except Exception as e:
+                    print(f"[PiperLaunchJournal] Disabled: {e}")
+                    return None
+    return _journal
@@ -0,0 +1,95 @@
+# nodes/llm_cache.py
+# Persistent answer cache for the LLM nodes: a repeated question to the same
+# endpoint and model is answered from SQLite instead of a launch/poll cycle.
+import os
+import re
+import threading
+import unicodedata
+
+from .cache_paths import cache_dir
+from .kv_store import SQLiteKVStore
+from .launch_engine import LaunchResult
+from .request_memo import canonical_key
+
+DEFAULT_TTL = float(os.environ.get("PIPER_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("PIPER_LLM_CACHE_MAX_ENTRIES", "20000"))
+DEFAULT_MAX_BYTES = int(os.environ.get("PIPER_LLM_CACHE_MAX_BYTES", str(64 * 2**20)))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """NFC form with whitespace runs collapsed and ends trimmed; case is kept (it can change the answer)."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", str(question))).strip()
+
+
+def answer_cache_key(endpoint, model, question):
+    return canonical_key("llm", endpoint, model, normalize_question(question))
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Process-wide SQLiteKVStore of answers, or None when disabled with
+    PIPER_LLM_CACHE=0 or when the database cannot be opened.
+    """
+    global _llm_cache
+    if os.environ.get("PIPER_LLM_CACHE", "1") == "0":
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                try:
+                    _llm_cache = SQLiteKVStore(os.path.join(cache_dir("llm"), "answers.sqlite3"), table="answers",
+                                               max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                                               ttl=DEFAULT_TTL)
+                except Exception as e:
+                    print(f"[PiperLLMCache] Disabled: {e}")
+                    return None
+    return _llm_cache
+
+
+def get_llm_cache_stats():
+    """Hit/miss/store/eviction counters of this process plus the current entry count."""
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "entries": len(cache), **cache.stats}
+
+
+def lookup_answer(endpoint, model, question, log_prefix="[PiperLLMCache]"):
+    """Returns the cached answer as a successful LaunchResult, or None."""
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+    entry = cache.get(answer_cache_key(endpoint, model, question))
+    if entry is None:
+        return None
+    print(f"{log_prefix} Answer served from cache (hits={cache.stats['hits']}, misses={cache.stats['misses']}).")
+    return LaunchResult(LaunchResult.SUCCESS, entry.get("launch_id"), value=entry["answer"], message="cached")
+
+
+def store_answer(endpoint, model, question, result):
+    """Caches the answer of a successful LaunchResult."""
+    cache = get_llm_cache()
+    if cache is not None and result.ok and result.message != "cached":
+        cache.put(answer_cache_key(endpoint, model, question), {"answer": result.value, "launch_id": result.launch_id})
+
+
+def cached_llm_answer(endpoint, model, question, ask, use_cache=True, log_prefix="[PiperLLMCache]"):
+    """
+    Returns the cached answer for (endpoint, model, question) as a successful
+    LaunchResult, or calls ask() -> LaunchResult and caches a successful answer.
+    use_cache=False skips both the lookup and the store.
+    """
+    if use_cache:
+        cached = lookup_answer(endpoint, model, question, log_prefix)
+        if cached is not None:
+            return cached
+    result = ask()
+    if use_cache:
+        store_answer(endpoint, model, question, result)
+    return result
@@ -0,0 +1,267 @@
+# nodes/ranged_download.py
+# Download engine for large files (videos): probes Content-Length and
+# Accept-Ranges, fetches byte ranges over several pooled connections into a
+# preallocated temp file, records per-segment progress in a sidecar manifest
+# so an interrupted download resumes, and renames into place only when done.
+# The temp file and manifest are keyed by URL, so a per-URL lock (threads and,
+# through flock, other ComfyUI processes) serializes downloads of the same URL.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl # POSIX only; without it the lock only covers threads of this process
+except ImportError:
+    fcntl = None
+
+from .cache_paths import cache_dir
+from .utils import get_session
+from .rate_limiter import get_rate_limiter
+
+DEFAULT_CONNECTIONS = int(os.environ.get("PIPER_DOWNLOAD_CONNECTIONS", "4"))
+MIN_SEGMENT_SIZE = 4 * 2**20 # Below this, extra connections cost more than they gain
+CHUNK_SIZE = 1 * 2**20
+MANIFEST_EVERY = 8 * 2**20 # Persist progress after this many bytes per segment
+LOCK_POLL_INTERVAL = 0.25 # Seconds between lock attempts, so waiting stays abortable
+
+
+class DownloadAborted(Exception):
+    """should_abort() returned True; the partial file and manifest are kept for resume."""
+
+
+def probe(url, timeout=30):
+    """
+    Returns (size, accepts_ranges, validator) for url. size is None when the
+    server does not say; validator is the ETag or Last-Modified, used to
+    refuse resuming onto a file that changed.
+    """
+    session = get_session()
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        response.raise_for_status()
+        headers = response.headers
+        size = int(headers["Content-Length"]) if headers.get("Content-Length", "").isdigit() else None
+        accepts_ranges = headers.get("Accept-Ranges", "").lower() == "bytes"
+        validator = headers.get("ETag") or headers.get("Last-Modified")
+        if size and accepts_ranges:
+            return size, True, validator
+    except requests.exceptions.RequestException:
+        size, validator = None, None
+    # Some CDNs do not answer HEAD properly: ask for one byte instead
+    try:
+        with session.get(url, headers={"Range": "bytes=0-0"}, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code == 206 and "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+                validator = response.headers.get("ETag") or response.headers.get("Last-Modified") or validator
+                return int(content_range.rsplit("/", 1)[1]), True, validator
+            length = response.headers.get("Content-Length", "")
+            return (int(length) if length.isdigit() else size), False, validator
+    except requests.exceptions.RequestException:
+        return size, False, validator
+
+
+def partial_paths(url):
+    """Stable temp file and manifest locations for url, so a later run can resume."""
+    name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+    directory = cache_dir("downloads")
+    return os.path.join(directory, f"{name}.part"), os.path.join(directory, f"{name}.part.json")
+
+
+_thread_locks = {} # lock path -> threading.Lock
+_thread_locks_lock = threading.Lock()
+
+
+@contextmanager
+def download_lock(lock_path, should_abort=None):
+    """
+    Exclusive lock for one URL's temp files: a threading.Lock for this process
+    plus flock on lock_path for other processes. Waiting checks should_abort().
+    """
+    def wait(try_acquire):
+        while not try_acquire():
+            if should_abort is not None and should_abort():
+                raise DownloadAborted("download aborted while waiting for another download of the same URL")
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    with _thread_locks_lock:
+        thread_lock = _thread_locks.setdefault(lock_path, threading.Lock())
+    wait(lambda: thread_lock.acquire(blocking=False))
+    try:
+        with open(lock_path, "a+b") as f:
+            if fcntl is not None:
+                def try_flock():
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        return True
+                    except BlockingIOError:
+                        return False
+                wait(try_flock)
+            yield # Closing the file releases the flock
+    finally:
+        thread_lock.release()
+
+
+def _plan_segments(size, connections):
+    count = max(1, min(connections, size // MIN_SEGMENT_SIZE or 1))
+    step = -(-size // count) # Ceiling division
+    return [[start, min(size, start + step) - 1, 0] for start in range(0, size, step)]
+
+
+class _Manifest:
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, url, size, validator):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("url") == url and data.get("size") == size and data.get("validator") == validator:
+                return cls(path, data)
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def progress(self, index, done):
+        with self._lock:
+            self.data["segments"][index][2] = done
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.path)
+
+
+def _preallocate(path, size):
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass # e.g. unsupported filesystem; a sparse file is fine too
+        f.truncate(size)
+
+
+def _fetch_segment(url, part_path, manifest, index, timeout, should_abort):
+    start, end, done = manifest.data["segments"][index]
+    position = start + done
+    if position > end:
+        return
+    get_rate_limiter().acquire(None, url)
+    headers = {"Range": f"bytes={position}-{end}"}
+    with get_session().get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError(f"server ignored the range request (HTTP {response.status_code})")
+        unsaved = 0
+        with open(part_path, "r+b") as f:
+            f.seek(position)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if should_abort is not None and should_abort():
+                    raise DownloadAborted("download aborted")
+                chunk = chunk[:end + 1 - position] # Never write past the segment
+                f.write(chunk)
+                position += len(chunk)
+                unsaved += len(chunk)
+                manifest.progress(index, position - start)
+                if unsaved >= MANIFEST_EVERY:
+                    f.flush()
+                    manifest.save()
+                    unsaved = 0
+                if position > end:
+                    break
+    if position <= end:
+        raise IOError(f"segment {index} ended early at byte {position} of {end}")
+
+
+def _download_single(url, part_path, timeout, should_abort, hasher=None):
+    get_rate_limiter().acquire(None, url)
+    with get_session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if should_abort is not None and should_abort():
+                    raise DownloadAborted("download aborted")
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+
+
+def _download_ranged(url, part_path, manifest_path, size, validator, connections, timeout, should_abort):
+    manifest = _Manifest.load(manifest_path, url, size, validator)
+    if manifest is not None and os.path.exists(part_path) and os.path.getsize(part_path) == size:
+        done = sum(segment[2] for segment in manifest.data["segments"])
+        print(f"[PiperDownload] Resuming {url} at {done}/{size} bytes")
+    else:
+        manifest = _Manifest(manifest_path, {"url": url, "size": size, "validator": validator,
+                                             "segments": _plan_segments(size, connections)})
+        _preallocate(part_path, size)
+        manifest.save()
+
+    segments = range(len(manifest.data["segments"]))
+    try:
+        with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix="PiperDownload") as pool:
+            futures = [pool.submit(_fetch_segment, url, part_path, manifest, index, timeout, should_abort)
+                       for index in segments]
+            for future in futures:
+                future.result()
+    finally:
+        manifest.save() # Keep progress for the next attempt, even on failure
+
+
+def move_into_place(src, dest):
+    """Atomic rename; across filesystems copies to a temp name next to dest first."""
+    try:
+        os.replace(src, dest)
+    except OSError:
+        tmp_path = f"{dest}.tmp"
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+        os.remove(src)
+
+
+def download_file(url, dest_path, connections=DEFAULT_CONNECTIONS, timeout=120, should_abort=None, hasher=None):
+    """
+    Downloads url to dest_path. Ranged and parallel when the server supports
+    it and the file is large enough, resumable through the manifest; a single
+    stream otherwise. dest_path only ever appears complete. hasher, if given,
+    is fed the file contents in order. Returns the number of bytes written.
+    """
+    part_path, manifest_path = partial_paths(url)
+    # Concurrent saves of the same URL would truncate and move each other's temp file
+    with download_lock(f"{part_path}.lock", should_abort):
+        return _download_locked(url, dest_path, part_path, manifest_path, connections, timeout, should_abort, hasher)
+
+
+def _download_locked(url, dest_path, part_path, manifest_path, connections, timeout, should_abort, hasher):
+    size, accepts_ranges, validator = probe(url, timeout=min(timeout, 30))
+    if size and accepts_ranges and (connections > 1 or os.path.exists(manifest_path)):
+        _download_ranged(url, part_path, manifest_path, size, validator, max(1, connections), timeout, should_abort)
+        if hasher is not None:
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+    else:
+        _download_single(url, part_path, timeout, should_abort, hasher)
+    written = os.path.getsize(part_path)
+    if size and written != size:
+        raise IOError(f"downloaded {written} bytes, expected {size}")
+    move_into_place(part_path, dest_path)
+    try:
+        os.remove(manifest_path)
+    except FileNotFoundError:
+        pass
+    return written
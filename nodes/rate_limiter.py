@@ -0,0 +1,173 @@
+# nodes/rate_limiter.py
+# Client-side token buckets keyed by (api_key, endpoint class), so bursts of
+# launches and polls from many nodes stay under the server's quota instead of
+# provoking 429s. Buckets live in memory, or in lock-protected files shared by
+# every ComfyUI process on the machine when PIPER_RATE_LIMIT_DIR is set.
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl # POSIX only; without it the limiter stays per-process
+except ImportError:
+    fcntl = None
+
+ENDPOINT_CLASSES = ("launch", "state", "upload", "download")
+
+# rate (requests per second) and burst per endpoint class; rate 0 = unlimited.
+# Override with e.g. PIPER_RATE_LIMITS="launch=2:5,state=10:20".
+DEFAULT_LIMITS = {"launch": (5.0, 10.0), "state": (20.0, 40.0), "upload": (5.0, 10.0), "download": (0.0, 0.0)}
+MAX_DELAY = 120.0 # Never make a caller wait longer than this for a token
+
+
+def _parse_limits(spec):
+    limits = dict(DEFAULT_LIMITS)
+    for item in (spec or "").split(","):
+        name, _, values = item.strip().partition("=")
+        if name not in limits or not values:
+            continue
+        rate, _, burst = values.partition(":")
+        try:
+            limits[name] = (float(rate), float(burst or rate or 1))
+        except ValueError:
+            print(f"[PiperRateLimit] Ignoring invalid limit '{item}'")
+    return limits
+
+
+def endpoint_class(url):
+    """Maps an API URL to launch / state / upload; anything else is a download."""
+    path = url.split("?", 1)[0].rstrip("/")
+    if path.endswith("/launch"):
+        return "launch"
+    if path.endswith("/state") or path.endswith("/cancel"):
+        return "state"
+    if "/upload" in path:
+        return "upload"
+    return "download"
+
+
+class TokenBucket:
+    """
+    reserve() takes a token and returns how long the caller must wait for it
+    (tokens may go negative, which queues callers fairly). block_for() pushes
+    every reservation past a server-provided Retry-After.
+    """
+    def __init__(self, rate, burst, state_path=None):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.state_path = state_path
+        self._state = {"tokens": self.burst, "updated": time.time(), "blocked_until": 0.0}
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        if self.rate <= 0:
+            return self._update(lambda state, now: max(0.0, state["blocked_until"] - now))
+        return self._update(self._take)
+
+    def give_back(self):
+        """Returns the token of a reservation the caller will not use."""
+        def _give_back(state, now):
+            state["tokens"] = min(self.burst, state["tokens"] + 1.0)
+        if self.rate > 0:
+            self._update(_give_back)
+
+    def block_for(self, seconds):
+        def _block(state, now):
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+        self._update(_block)
+
+    def _take(self, state, now):
+        state["tokens"] = min(self.burst, state["tokens"] + (now - state["updated"]) * self.rate)
+        state["updated"] = now
+        state["tokens"] -= 1.0
+        wait = (-state["tokens"] / self.rate) if state["tokens"] < 0 else 0.0
+        return max(wait, state["blocked_until"] - now)
+
+    def _update(self, change):
+        with self._lock:
+            if self.state_path is None or fcntl is None:
+                return change(self._state, time.time())
+            with open(self.state_path, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "null") or dict(self._state)
+                    except ValueError:
+                        state = dict(self._state)
+                    result = change(state, time.time())
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    return result
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    def __init__(self, limits=None, shared_dir=None):
+        self.limits = limits or dict(DEFAULT_LIMITS)
+        self.shared_dir = shared_dir
+        self.stats = {"reservations": 0, "delayed": 0, "delay_seconds": 0.0, "retry_after": 0, "released": 0}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+            if fcntl is None:
+                print("[PiperRateLimit] File locks are unavailable on this platform; limits are per-process")
+
+    def _bucket(self, api_key, klass):
+        key_hash = hashlib.sha256(str(api_key or "").encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            bucket = self._buckets.get((key_hash, klass))
+            if bucket is None:
+                rate, burst = self.limits.get(klass, (0.0, 0.0))
+                path = os.path.join(self.shared_dir, f"{key_hash}-{klass}.json") if self.shared_dir else None
+                bucket = self._buckets[(key_hash, klass)] = TokenBucket(rate, burst, path)
+            return bucket
+
+    def reserve(self, api_key, url):
+        """Takes a token for (api_key, class of url); returns the seconds to wait before sending."""
+        delay = min(MAX_DELAY, self._bucket(api_key, endpoint_class(url)).reserve())
+        self.stats["reservations"] += 1
+        if delay > 0:
+            self.stats["delayed"] += 1
+            self.stats["delay_seconds"] += delay
+        return delay
+
+    def release(self, api_key, url):
+        """Undoes a reserve() whose request is not sent (the wait was too long for the caller)."""
+        self.stats["released"] += 1
+        self._bucket(api_key, endpoint_class(url)).give_back()
+
+    def retry_after(self, api_key, url, seconds):
+        """Honours a Retry-After from the server for this key and endpoint class."""
+        self.stats["retry_after"] += 1
+        self._bucket(api_key, endpoint_class(url)).block_for(min(MAX_DELAY, seconds))
+
+    def acquire(self, api_key, url):
+        """Blocking reserve(): sleeps until the token is ours."""
+        delay = self.reserve(api_key, url)
+        if delay > 0:
+            time.sleep(delay)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Process-wide RateLimiter configured from PIPER_RATE_LIMITS and, for the
+    cross-process mode, PIPER_RATE_LIMIT_DIR.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(_parse_limits(os.environ.get("PIPER_RATE_LIMITS")),
+                                            os.environ.get("PIPER_RATE_LIMIT_DIR") or None)
+    return _rate_limiter
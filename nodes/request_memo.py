@@ -0,0 +1,121 @@
+# nodes/request_memo.py
+# Request-level memoization: a successful launch is remembered under a key
+# built from the endpoint, the canonicalized inputs and the seed, so an
+# identical re-run returns the stored launch ID and outputs without launching
+# again. The same canonical form backs the nodes' IS_CHANGED fingerprints.
+import hashlib
+import json
+import os
+import threading
+
+from .cache_paths import cache_dir
+from .kv_store import SQLiteKVStore
+
+# Result URLs are not kept forever server-side; 24h matches the upload cache.
+DEFAULT_TTL = float(os.environ.get("PIPER_REQUEST_MEMO_TTL", str(24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("PIPER_REQUEST_MEMO_MAX_ENTRIES", "5000"))
+
+# Node inputs that only affect how we wait, never what the API returns
+NON_SEMANTIC_INPUTS = ("poll_interval", "max_wait_time", "max_concurrency", "transport")
+
+
+def _canonical(value):
+    """Turns node inputs into JSON-serializable data; tensors and bytes become content hashes."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "bytes:" + hashlib.blake2b(value, digest_size=16).hexdigest()
+    if hasattr(value, "detach") and hasattr(value, "shape"): # torch.Tensor
+        from .upload_cache import tensor_content_hash
+        return "tensor:" + tensor_content_hash(value)
+    return repr(value)
+
+
+def canonical_key(*parts):
+    """Stable SHA-256 hex digest of the canonical JSON form of parts."""
+    encoded = json.dumps(_canonical(parts), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def request_fingerprint(endpoint, inputs, ignore=NON_SEMANTIC_INPUTS):
+    """
+    Fingerprint for IS_CHANGED: endpoint plus every semantic node input
+    (seed included). The API key is hashed in, never stored.
+    """
+    return canonical_key(endpoint, {k: v for k, v in inputs.items() if k not in ignore})
+
+
+def node_fingerprint(endpoint, inputs):
+    """
+    IS_CHANGED value shared by the API nodes. ComfyUI re-executes a node only
+    when this value differs from the previous run, so identical inputs (seed
+    included) reuse ComfyUI's cached output without calling the API. The
+    launch itself is memoized separately (launch_memo_key), which is why
+    the same seed and inputs keep returning the earlier result across restarts.
+    Returns NaN, which never equals itself, when the node asks for a fresh
+    run: use_cache=False or force_new_launch=True.
+    """
+    if not inputs.get("use_cache", True) or inputs.get("force_new_launch"):
+        return float("nan")
+    return request_fingerprint(endpoint, inputs)
+
+
+def launch_memo_key(launch_url, api_key, launch_data, multipart_image=None, seed=None):
+    """Memo key of one launch; multipart images are keyed by the hash of their bytes."""
+    image_part = None
+    if multipart_image is not None:
+        field, image_bytes, mime_type = multipart_image
+        image_part = (field, image_bytes, mime_type)
+    return canonical_key(launch_url, hashlib.sha256(str(api_key).encode("utf-8")).hexdigest(),
+                         launch_data, image_part, seed)
+
+
+class RequestMemo:
+    """Stores {launch_id, value, outputs} of successful launches in a SQLiteKVStore."""
+    def __init__(self, store):
+        self.store = store
+
+    @property
+    def stats(self):
+        return self.store.stats
+
+    def lookup(self, key):
+        return self.store.get(key)
+
+    def remember(self, key, launch_id, value, outputs):
+        try:
+            self.store.put(key, {"launch_id": launch_id, "value": value, "outputs": outputs})
+        except (TypeError, ValueError) as e: # Outputs that are not JSON-serializable
+            print(f"[PiperRequestMemo] Not memoizing launch {launch_id}: {e}")
+
+    def forget(self, key):
+        self.store.delete(key)
+
+
+_request_memo = None
+_request_memo_lock = threading.Lock()
+
+
+def get_request_memo():
+    """
+    Process-wide RequestMemo, or None when disabled with PIPER_REQUEST_MEMO=0
+    or when the store cannot be opened.
+    """
+    global _request_memo
+    if os.environ.get("PIPER_REQUEST_MEMO", "1") == "0":
+        return None
+    if _request_memo is None:
+        with _request_memo_lock:
+            if _request_memo is None:
+                try:
+                    path = os.path.join(cache_dir("requests"), "memo.sqlite3")
+                    _request_memo = RequestMemo(SQLiteKVStore(path, table="launches", max_entries=DEFAULT_MAX_ENTRIES,
+                                                              ttl=DEFAULT_TTL))
+                except Exception as e:
+                    print(f"[PiperRequestMemo] Disabled: {e}")
+                    return None
+    return _request_memo
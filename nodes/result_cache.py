@@ -0,0 +1,159 @@
+# nodes/result_cache.py
+# On-disk cache of downloaded result images. Decoded pixels are stored as raw
+# uint8 .npy files named by the content hash of the downloaded bytes, so a hit
+# is a zero-copy np.load(mmap_mode='r') instead of a download plus PNG decode.
+# Different URLs that serve the same bytes share one file.
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from .cache_paths import cache_dir
+
+DEFAULT_MAX_BYTES = int(os.environ.get("PIPER_RESULT_CACHE_MAX_BYTES", str(2 * 2**30)))
+
+
+def _url_key(image_url, max_side):
+    return hashlib.blake2b(f"{image_url}|{max_side or 0}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResultImageCache:
+    """
+    URL -> pixels cache with a byte-budget LRU. The index (url key -> content
+    digest) is a small JSON file; recency is the data file's mtime, refreshed on
+    every hit, so several ComfyUI processes can share one directory.
+    """
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _data_path(self, digest):
+        return os.path.join(self.root, f"{digest}.npy")
+
+    def get(self, image_url, max_side=None):
+        """Returns a read-only memory-mapped uint8 [H, W, C] array, or None."""
+        with self._lock:
+            digest = self._index.get(_url_key(image_url, max_side))
+        if digest is not None:
+            path = self._data_path(digest)
+            try:
+                pixels = np.load(path, mmap_mode="r")
+                os.utime(path)
+                with self._lock:
+                    self.stats["hits"] += 1
+                return pixels
+            except (OSError, ValueError):
+                pass # Evicted by another process or truncated; fall through to a miss
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, image_url, max_side, content_digest, pixels):
+        """Stores pixels for image_url; content_digest identifies the downloaded bytes."""
+        digest = f"{content_digest}_{max_side or 0}"
+        path = self._data_path(digest)
+        if pixels.nbytes > self.max_bytes:
+            return
+        try:
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, np.ascontiguousarray(pixels, dtype=np.uint8))
+                os.replace(tmp_path, path)
+            else:
+                os.utime(path)
+            with self._lock:
+                self._index[_url_key(image_url, max_side)] = digest
+                self.stats["stores"] += 1
+            self._evict()
+            self._save_index()
+        except OSError as e:
+            print(f"[PiperResultCache] Could not store result image: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
+        for name in os.listdir(self.root):
+            if name.endswith(".npy"):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+        self._save_index()
+
+    def _evict(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        files.sort() # Least recently used first
+        removed = set()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed.add(os.path.basename(path)[:-len(".npy")])
+        with self._lock:
+            for key in [k for k, d in self._index.items() if d in removed]:
+                del self._index[key]
+            self.stats["evictions"] += len(removed)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with self._lock:
+            # Merge entries written by other processes since our last load
+            stored = self._load_index()
+            stored.update(self._index)
+            stored = {k: d for k, d in stored.items() if os.path.exists(self._data_path(d))}
+            self._index = stored
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(stored, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                print(f"[PiperResultCache] Could not persist index: {e}")
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Process-wide ResultImageCache, or None when disabled with
+    PIPER_RESULT_CACHE=0 or when the cache directory cannot be created.
+    """
+    global _result_cache
+    if os.environ.get("PIPER_RESULT_CACHE", "1") == "0":
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                try:
+                    _result_cache = ResultImageCache(cache_dir("results"))
+                except OSError as e:
+                    print(f"[PiperResultCache] Disabled: {e}")
+                    return None
+    return _result_cache
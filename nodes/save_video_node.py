@@ -3,6 +3,10 @@ import os
 import requests
 import folder_paths # Use ComfyUI's path handling
 
+from .ranged_download import download_file, DownloadAborted, DEFAULT_CONNECTIONS
+from .video_store import get_video_store
+from .launch_engine import interrupt_requested, LaunchInterrupted
+
 class PiperSaveVideo:
     def __init__(self):
         # Get the default ComfyUI output directory
@@ -19,6 +23,8 @@ class PiperSaveVideo:
             "optional": {
                  # Allow specifying a custom output directory relative to ComfyUI root
                  "output_dir": ("STRING", {"default": "", "multiline": False}),
+                 # Parallel ranged connections (1 = single stream); unfinished downloads resume on the next run
+                 "connections": ("INT", {"default": DEFAULT_CONNECTIONS, "min": 1, "max": 16}),
             },
             "hidden": {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"}, # Standard hidden inputs
         }
@@ -41,7 +47,7 @@ class PiperSaveVideo:
         return sanitized[:max_len] if len(sanitized) > max_len else sanitized
 
 
-    def save_video(self, video_url, filename_prefix, output_dir="", prompt=None, extra_pnginfo=None):
+    def save_video(self, video_url, filename_prefix, output_dir="", connections=DEFAULT_CONNECTIONS, prompt=None, extra_pnginfo=None):
         # --- Determine Output Path ---
         # Use custom dir if provided, otherwise default ComfyUI output
         target_output_dir = self.output_dir
@@ -95,13 +101,22 @@ class PiperSaveVideo:
         try:
             print(f"Attempting to download video from: {video_url}")
             print(f"Attempting to save video to: {full_filepath}")
-            response = requests.get(video_url, stream=True, timeout=120) # Longer timeout for video
-            response.raise_for_status()
-            with open(full_filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192 * 16): # Larger chunk size for video
-                    f.write(chunk)
-            print(f"Video successfully downloaded and saved: {full_filepath}")
+            # Ranged, resumable download into a temp file, renamed into place when complete.
+            # With the video store a URL saved before is linked from the store instead.
+            store = get_video_store()
+            reused = False
+            if store is not None:
+                size, reused = store.fetch(video_url, full_filepath, connections=connections, timeout=120,
+                                           should_abort=interrupt_requested)
+            else:
+                size = download_file(video_url, full_filepath, connections=connections, timeout=120, # Longer timeout for video
+                                     should_abort=interrupt_requested)
+            source = "linked from the video store" if reused else "downloaded"
+            print(f"Video successfully {source} and saved: {full_filepath} ({size} bytes)")
             saved = True
+        except DownloadAborted:
+            print("Video download interrupted; it will resume on the next run.")
+            raise LaunchInterrupted("Video download interrupted")
         except requests.exceptions.RequestException as e:
             print(f"Error downloading video: {e}")
         except Exception as e:
@@ -0,0 +1,177 @@
+# nodes/state_poller.py
+# One background thread that polls every in-flight launch on a shared
+# schedule over the pooled session and wakes waiting nodes through futures.
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+
+from .utils import get_request, RateLimited
+from .launch_engine import PollPolicy, parse_state, state_url_for
+
+
+def _settle(future, result=None, exception=None):
+    # The future may have been cancelled by unwatch() while the poll was in flight
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class _WatchedLaunch:
+    def __init__(self, launch_id, api_key, policy, deadline, waiters):
+        self.launch_id = launch_id
+        self.api_key = api_key
+        self.policy = policy
+        self.deadline = deadline # Latest deadline of the waiters and background watches; polling stops after it
+        self.future = Future()
+        self.waiters = waiters
+        self.attempt = 0
+        self.next_due = time.monotonic() + policy.interval(0)
+        self.in_flight = False
+        self.last_failed = False # Next poll counts against the retry budget
+
+
+class StatePoller:
+    """
+    Registry of in-flight launch IDs. watch() returns a Future that resolves
+    with the first state response whose 'outputs' or 'errors' are filled in.
+    Due launches are polled together each tick on a small worker pool.
+    Every registration has a deadline: once it passes the launch is dropped
+    and its Future cancelled, so a handle nobody awaits is not polled forever.
+    """
+    IDLE_WAIT = 1.0 # Seconds the thread sleeps with nothing registered
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._executor = None
+        self.stats = {"polls": 0, "resolved": 0, "expired": 0}
+
+    def watch(self, launch_id, api_key, policy=None, deadline=None, background=False):
+        """
+        Registers launch_id (or joins an existing registration) and returns its
+        Future. deadline defaults to the policy's max_wait_time; polls are capped
+        by the latest deadline registered. A waiter must unwatch() when it stops
+        waiting. background=True (detached handles) adds no waiter and only
+        extends the deadline, so re-registering the same launch never leaks.
+        """
+        policy = policy or PollPolicy()
+        deadline = deadline or policy.deadline()
+        waiters = 0 if background else 1
+        with self._lock:
+            entry = self._entries.get(launch_id)
+            if entry is not None:
+                entry.waiters += waiters
+                self._extend(entry, deadline)
+                return entry.future
+            entry = _WatchedLaunch(launch_id, api_key, policy, deadline, waiters)
+            self._entries[launch_id] = entry
+            self._ensure_thread()
+        self._wakeup.set()
+        return entry.future
+
+    @staticmethod
+    def _extend(entry, deadline):
+        if deadline is not None and (entry.deadline is None or deadline.expires_at > entry.deadline.expires_at):
+            entry.deadline = deadline
+
+    def unwatch(self, launch_id):
+        """Drops one waiter; the launch stops being polled once nobody waits for it."""
+        with self._lock:
+            entry = self._entries.get(launch_id)
+            if entry is None:
+                return
+            entry.waiters -= 1
+            if entry.waiters <= 0:
+                del self._entries[launch_id]
+                entry.future.cancel()
+
+    def _expire(self):
+        """Drops registrations past their deadline (called under the lock)."""
+        for launch_id, entry in list(self._entries.items()):
+            if entry.deadline.expired() and not entry.in_flight:
+                del self._entries[launch_id]
+                entry.future.cancel()
+                self.stats["expired"] += 1
+                print(f"[PiperStatePoller] Stopped watching launch {launch_id}: nobody awaited it in time")
+
+    def in_flight(self):
+        with self._lock:
+            return list(self._entries)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="PiperStatePoll")
+            self._thread = threading.Thread(target=self._run, name="PiperStatePoller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            with self._lock:
+                self._expire()
+                due = [e for e in self._entries.values() if e.next_due <= now and not e.in_flight]
+                for entry in due:
+                    entry.in_flight = True
+                upcoming = [e.next_due for e in self._entries.values() if not e.in_flight]
+            for entry in due:
+                self._executor.submit(self._poll_one, entry)
+
+            wait = (min(upcoming) - time.monotonic()) if upcoming else self.IDLE_WAIT
+            self._wakeup.wait(timeout=max(0.01, min(wait, self.IDLE_WAIT)))
+
+    def _poll_one(self, entry):
+        try:
+            # A poll must not outlive the waiters' deadline
+            timeout = entry.deadline.cap(entry.policy.request_timeout)
+            # Fatal statuses raise and fail the future, so waiters stop at once.
+            # max_wait=0: a rate-limited key reschedules its own poll instead of
+            # sleeping on a worker shared with every other launch.
+            try:
+                state_response = get_request(state_url_for(entry.launch_id), entry.api_key, timeout=timeout,
+                                             raise_fatal=True, is_retry=entry.last_failed, max_wait=0)
+            except RateLimited as e:
+                entry.next_due = time.monotonic() + e.retry_after
+                return
+            entry.last_failed = state_response is None
+            resolved = parse_state(state_response) is not None
+            with self._lock: # Polls run concurrently on the worker pool
+                self.stats["polls"] += 1
+                if resolved:
+                    self.stats["resolved"] += 1
+                    if self._entries.get(entry.launch_id) is entry:
+                        del self._entries[entry.launch_id]
+            if resolved:
+                _settle(entry.future, result=state_response)
+                return
+            entry.attempt += 1
+            entry.next_due = time.monotonic() + entry.policy.interval(entry.attempt)
+        except Exception as e:
+            with self._lock:
+                self._entries.pop(entry.launch_id, None)
+            _settle(entry.future, exception=e)
+        finally:
+            entry.in_flight = False
+            self._wakeup.set()
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_state_poller():
+    """Returns the process-wide StatePoller."""
+    global _poller
+    if _poller is None:
+        with _poller_lock:
+            if _poller is None:
+                _poller = StatePoller()
+    return _poller
@@ -0,0 +1,134 @@
+# nodes/upload_cache.py
+# Content-addressed cache for prepared input images: maps a hash of the input
+# tensor to the already uploaded URL or the already encoded payload, so
+# repeated runs with the same reference image skip encoding and upload.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Server-side retention of uploaded files is not documented; 24h is a
+# conservative default. Override with PIPER_UPLOAD_CACHE_TTL (seconds).
+DEFAULT_TTL = float(os.environ.get("PIPER_UPLOAD_CACHE_TTL", str(24 * 3600)))
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 256 * 2**20 # Budget for in-memory encoded payloads
+
+
+def tensor_content_hash(image_tensor):
+    """BLAKE2b digest of the tensor's pixels, shape and dtype."""
+    array = np.ascontiguousarray(image_tensor.detach().cpu().numpy())
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{array.shape}|{array.dtype}".encode("utf-8"))
+    digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+def _payload_size(value):
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_payload_size(v) for v in value if v is not None)
+    return 0
+
+
+class UploadCache:
+    """
+    LRU cache with a TTL and a byte budget. Entries whose key starts with
+    'url:' are small and are also persisted to persist_path when it is set.
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, persist_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self._entries = OrderedDict() # key -> (value, created_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        if persist_path:
+            self._load()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value, created_at=None):
+        size = _payload_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, created_at or time.time(), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+        if key.startswith("url:"):
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self._save()
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _load(self):
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, (value, created_at) in stored.items():
+            if now - created_at <= self.ttl:
+                self._entries[key] = (value, created_at, _payload_size(value))
+                self._bytes += _payload_size(value)
+
+    def _save(self):
+        if not self.persist_path:
+            return
+        with self._lock:
+            stored = {k: [v[0], v[1]] for k, v in self._entries.items() if k.startswith("url:")}
+        tmp_path = f"{self.persist_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            print(f"[PiperUploadCache] Could not persist upload cache: {e}")
+
+
+_upload_cache = None
+_upload_cache_lock = threading.Lock()
+
+
+def get_upload_cache():
+    """
+    Process-wide UploadCache. Uploaded URLs are persisted to disk when
+    PIPER_UPLOAD_CACHE_FILE is set.
+    """
+    global _upload_cache
+    if _upload_cache is None:
+        with _upload_cache_lock:
+            if _upload_cache is None:
+                _upload_cache = UploadCache(persist_path=os.environ.get("PIPER_UPLOAD_CACHE_FILE") or None)
+    return _upload_cache
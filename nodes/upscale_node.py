@@ -1,14 +1,15 @@
-import time
 import traceback # Оставляем для вывода критических ошибок
 
 # Импортируем необходимые функции из utils
 from .utils import (
-    get_request,
-    post_request_json,
     url_to_image_tensor,
     create_empty_image_tensor,
-    tensor_to_base64_data_uri
+    prepare_image_transport,
+    TRANSPORT_MODES,
 )
+from .image_encoder import IMAGE_FORMAT_LIST # Политики кодирования
+from .batch_runner import DEFAULT_MAX_CONCURRENCY, is_image_batch, run_image_batch, collect_image_batch
+from .launch_engine import PollPolicy, LaunchResult, run_launch, extract_image_url, format_api_errors
 
 class PiperUpscaleImage:
     UPSCALE_FACTORS = [2, 3, 4]
@@ -25,7 +26,12 @@ class PiperUpscaleImage:
                 "image": ("IMAGE",),
                 "upscaling_factor": (factor_strings, {"default": "2"}),
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
-                "image_format": (["PNG", "JPEG"], {"default": "PNG"})
+                "image_format": (IMAGE_FORMAT_LIST, {"default": "PNG"})
+            },
+            "optional": {
+                "max_concurrency": ("INT", {"default": DEFAULT_MAX_CONCURRENCY, "min": 1, "max": 32}), # Для батчей изображений
+                "transport": (TRANSPORT_MODES, {"default": "base64"}), # Как передавать изображение в API
+                "max_output_side": ("INT", {"default": 0, "min": 0, "max": 16384}), # 0 = полный размер результата
             }
         }
 
@@ -35,13 +41,12 @@ class PiperUpscaleImage:
     CATEGORY = "PiperAPI/Image"
 
     # Убираем poll_interval и max_wait_time из параметров функции
-    def upscale_image(self, api_key, image, upscaling_factor, seed, image_format):
+    def upscale_image(self, api_key, image, upscaling_factor, seed, image_format, max_concurrency=DEFAULT_MAX_CONCURRENCY, transport="base64", max_output_side=0):
         # Используем константы
         poll_interval = self.DEFAULT_POLL_INTERVAL
         max_wait_time = self.DEFAULT_MAX_WAIT_TIME
 
         launch_url = "https://app.piper.my/api/upscale-image-v1/launch"
-        state_url_template = "https://app.piper.my/api/launches/{}/state"
         empty_image = create_empty_image_tensor()
         status_text = "Ошибка: Неизвестный сбой." # Стандартное сообщение об ошибке
 
@@ -53,116 +58,79 @@ class PiperUpscaleImage:
              print(f"[PiperUpscale] {err_msg}")
              return (err_msg, empty_image)
 
-        # 2. Конвертация в Base64
+        # Батч изображений: каждое изображение запускается отдельной задачей параллельно
+        if is_image_batch(image):
+            items = run_image_batch(
+                api_key, launch_url, image,
+                encode=lambda img: prepare_image_transport(img, api_key, transport=transport, image_format=image_format),
+                image_field="image",
+                build_launch_data=lambda uri: {"inputs": {"image": uri, "upscalingResize": upscale_value}},
+                policy=PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time),
+                max_concurrency=max_concurrency,
+                max_side=max_output_side or None,
+            )
+            return collect_image_batch(items, "[PiperUpscale]")
+
+        # 2. Подготовка изображения (Base64, multipart или загрузка)
         try:
-            base64_data_uri = tensor_to_base64_data_uri(image, image_format=image_format)
-            if not base64_data_uri:
-                err_msg = "Критическая ошибка: Не удалось конвертировать изображение в Base64."
-                # Предполагаем, что tensor_to_base64_data_uri уже вывел детали ошибки
+            prepared = prepare_image_transport(image, api_key, transport=transport, image_format=image_format)
+            if not prepared:
+                err_msg = f"Критическая ошибка: Не удалось подготовить изображение для отправки (transport={transport})."
                 print(f"[PiperUpscale] {err_msg}")
                 return (err_msg, empty_image)
         except Exception as e:
-            print(f"[PiperUpscale] Критическая ошибка при конвертации в Base64:")
+            print(f"[PiperUpscale] Критическая ошибка при подготовке изображения:")
             traceback.print_exc()
-            err_msg = f"Критическая ошибка подготовки Base64: {e}"
+            err_msg = f"Критическая ошибка подготовки изображения: {e}"
             return (err_msg, empty_image)
+        image_value, multipart_part = prepared # image_value = None для multipart
+        multipart_image = ("image", *multipart_part) if multipart_part else None
 
         # 3. Запуск задачи
         json_input_data = {
             "inputs": {
-                "image": base64_data_uri,
+                "image": image_value,
                 "upscalingResize": upscale_value
             }
         }
 
-        try:
-            # print("[PiperUpscale] Отправка запроса на запуск...") # Убрано
-            launch_response = post_request_json(launch_url, api_key, json_input_data)
-        except Exception as e:
-             print(f"[PiperUpscale] Критическая ошибка сети при запуске задачи:")
-             traceback.print_exc()
-             err_msg = f"Критическая ошибка сети (запуск): {e}"
-             return (err_msg, empty_image)
-
-        # 4. Проверка ответа на запуск
-        if not launch_response or not isinstance(launch_response, dict) or "_id" not in launch_response:
-            api_error_details = "Неизвестно"
-            if launch_response and isinstance(launch_response, dict):
-                 api_error_details = launch_response.get('error', launch_response) # Пытаемся получить детали
-            elif launch_response:
-                 api_error_details = str(launch_response) # Если ответ не словарь
+        # Запуск и опрос через общий движок
+        policy = PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time)
+        result = run_launch(launch_url, api_key, json_input_data, extractor=extract_image_url,
+                            policy=policy, log_prefix="[PiperUpscale]", json_body=True,
+                            multipart_image=multipart_image)
 
-            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {api_error_details}"
+        if result.status == LaunchResult.FATAL_ERROR: # 401/402/404 и т.п.: повтор не поможет
+            err_msg = f"Критическая ошибка API: {result.message}"
+            print(f"[PiperUpscale] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.LAUNCH_FAILED:
+            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {result.errors}"
+            print(f"[PiperUpscale] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.TIMEOUT:
+            err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {result.launch_id}"
+            print(f"[PiperUpscale] {err_msg}")
+            return (err_msg, empty_image)
+        if result.status == LaunchResult.API_ERROR:
+            err_msg = f"Критическая ошибка API: Задача {result.launch_id} не удалась. Детали: {format_api_errors(result.errors)}"
+            print(f"[PiperUpscale] {err_msg}")
+            return (err_msg, empty_image)
+        if not result.ok:
+            err_msg = f"Критическая ошибка: В результатах задачи {result.launch_id} отсутствует или некорректен URL изображения. Ответ: {result.outputs}"
             print(f"[PiperUpscale] {err_msg}")
             return (err_msg, empty_image)
 
-        launch_id = launch_response["_id"]
-        state_url = state_url_template.format(launch_id)
-        # print(f"[PiperUpscale] Задача запущена. ID: {launch_id}. Опрос...") # Убрано
-
-        # 5. Опрос состояния
-        start_time = time.time()
-        while True:
-            current_time = time.time()
-            # Проверка таймаута
-            if current_time - start_time > max_wait_time:
-                err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {launch_id}"
-                print(f"[PiperUpscale] {err_msg}")
-                return (err_msg, empty_image)
-
-            # Запрос состояния
-            try:
-                state_response = get_request(state_url, api_key)
-            except Exception as e:
-                 # Ошибка сети при опросе - не обязательно критическая, можем повторить
-                 print(f"[PiperUpscale] Ошибка сети при опросе {launch_id} (повтор через {poll_interval} сек): {e}")
-                 # traceback.print_exc() # Можно раскомментировать для детальной отладки сети
-                 time.sleep(poll_interval)
-                 continue # Повторяем попытку
-
-            # Анализ ответа
-            if not state_response or not isinstance(state_response, dict):
-                # Некорректный ответ - повторяем
-                print(f"[PiperUpscale] Предупреждение: Некорректный ответ о состоянии {launch_id} (повтор через {poll_interval} сек).")
-                time.sleep(poll_interval)
-                continue
-
-            # Проверка на ошибки API
-            errors = state_response.get("errors")
-            if errors:
-                if isinstance(errors, list) and len(errors) > 0: error_details = ', '.join(map(str, errors))
-                elif isinstance(errors, str): error_details = errors
-                else: error_details = str(errors)
-                err_msg = f"Критическая ошибка API: Задача {launch_id} не удалась. Детали: {error_details}"
-                print(f"[PiperUpscale] {err_msg}")
-                return (err_msg, empty_image)
-
-            # Проверка на успешный результат
-            outputs = state_response.get("outputs")
-            if outputs and isinstance(outputs, dict):
-                 output_image_url = outputs.get("image")
-                 if output_image_url and isinstance(output_image_url, str):
-                     # print(f"[PiperUpscale] Результат найден для {launch_id}. Загрузка...") # Убрано
-                     try:
-                         output_image_tensor = url_to_image_tensor(output_image_url)
-                         status_text = f"Успех: Изображение обработано задачей {launch_id}."
-                         #print(f"[PiperUpscale] {status_text}") # Выводим сообщение об успехе
-                         return (status_text, output_image_tensor)
-                     except Exception as e:
-                         print(f"[PiperUpscale] Критическая ошибка обработки результирующего изображения ({launch_id}):")
-                         traceback.print_exc()
-                         err_msg = f"Критическая ошибка обработки результата: {e}"
-                         return (err_msg, empty_image)
-                 # else: # Если outputs есть, но URL еще нет - просто продолжаем опрос
-                     # print(f"[PiperUpscale] Задача {launch_id} в процессе...") # Убрано
-
-            # Если нет ни ошибки, ни результата - пауза перед следующим опросом
-            # else:
-                 # print(f"[PiperUpscale] Задача {launch_id} в процессе...") # Убрано
-
-            time.sleep(poll_interval)
-
-        # Сюда код не должен дойти при нормальной работе
-        # err_msg = f"Критическая ошибка: Цикл опроса неожиданно завершился для {launch_id}."
-        # print(f"[PiperUpscale] {err_msg}")
-        # return (err_msg, empty_image)
\ No newline at end of file
+        output_image_url = result.value
+        try:
+            output_image_tensor = url_to_image_tensor(output_image_url, max_side=max_output_side or None)
+            if output_image_tensor is None: # Проверка, если url_to_image_tensor вернул None
+                raise ValueError("Не удалось загрузить/обработать изображение по URL")
+            status_text = f"Успех: Изображение обработано задачей {result.launch_id}."
+            #print(f"[PiperUpscale] {status_text}") # Выводим сообщение об успехе
+            return (status_text, output_image_tensor)
+        except Exception as e:
+            print(f"[PiperUpscale] Критическая ошибка обработки результирующего изображения ({result.launch_id}, URL: {output_image_url}):")
+            traceback.print_exc()
+            err_msg = f"Критическая ошибка обработки результата: {e}"
+            return (err_msg, empty_image)
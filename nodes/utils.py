@@ -2,31 +2,284 @@
 import requests
 import json
 import io
+import os
+import threading
+import time
 import torch
-import numpy as np
-from PIL import Image
+from PIL import Image, ImageFile
 import base64
+import hashlib
+import traceback
+import numpy as np
+from .image_convert import tensor_to_uint8, uint8_to_tensor, pil_to_tensor, tensor_to_pil_images
+from .result_cache import get_result_cache
+from .circuit_breaker import breaker_for, endpoint_key, get_retry_budget
+from .rate_limiter import get_rate_limiter
+from .image_encoder import get_encoder_policy
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# --- Shared HTTP Session ---
+# One process-wide requests.Session so launches, state polls and downloads
+# reuse keep-alive connections to app.piper.my instead of a new TCP+TLS
+# handshake per call. Pool size can be overridden with PIPER_HTTP_MAX_CONNECTIONS.
+DEFAULT_MAX_CONNECTIONS = int(os.environ.get("PIPER_HTTP_MAX_CONNECTIONS", "16"))
+DEFAULT_POOL_HOSTS = 4 # app.piper.my + CDN hosts for results
+
+_session = None
+_session_lock = threading.Lock()
+_session_config = {"max_connections": DEFAULT_MAX_CONNECTIONS, "pool_hosts": DEFAULT_POOL_HOSTS}
+
+_http_stats_lock = threading.Lock()
+_http_stats = {"requests": 0, "new_connections": 0}
+
+def _count_stat(name, amount=1):
+    with _http_stats_lock:
+        _http_stats[name] = _http_stats.get(name, 0) + amount
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count_stat("new_connections")
+        return super()._new_conn()
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count_stat("new_connections")
+        return super()._new_conn()
+
+class _PiperHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools count every freshly opened connection."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+def _count_response(response, *args, **kwargs):
+    _count_stat("requests")
+
+def _build_session(max_connections, pool_hosts):
+    session = requests.Session()
+    # pool_block=False: bursts above max_connections still go through, the
+    # extra connections are simply not kept alive afterwards.
+    adapter = _PiperHTTPAdapter(pool_connections=pool_hosts, pool_maxsize=max_connections, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(_count_response)
+    return session
+
+def get_session():
+    """Returns the process-wide pooled session used by every Piper helper."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(_session_config["max_connections"], _session_config["pool_hosts"])
+    return _session
+
+def configure_http_session(max_connections=None, pool_hosts=None):
+    """
+    Changes pool sizing for the shared session. The current session is closed
+    and a new one is built lazily on the next request.
+    """
+    global _session
+    with _session_lock:
+        if max_connections is not None:
+            _session_config["max_connections"] = max(1, int(max_connections))
+        if pool_hosts is not None:
+            _session_config["pool_hosts"] = max(1, int(pool_hosts))
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+def get_http_stats():
+    """
+    Returns connection reuse counters for the shared session:
+    requests, new_connections, reused_connections and reuse_ratio.
+    The same counters for the aiohttp connector are under "async".
+    """
+    from .async_utils import get_async_http_stats # Imported lazily: async_utils imports utils
+    with _http_stats_lock:
+        stats = dict(_http_stats)
+    reused = max(0, stats["requests"] - stats["new_connections"])
+    stats["reused_connections"] = reused
+    stats["reuse_ratio"] = (reused / stats["requests"]) if stats["requests"] else 0.0
+    stats["async"] = get_async_http_stats()
+    return stats
+
+def reset_http_stats():
+    from .async_utils import reset_async_http_stats
+    with _http_stats_lock:
+        for key in _http_stats:
+            _http_stats[key] = 0
+    reset_async_http_stats()
+
+# --- Error taxonomy ---
+# Responses that will not change on retry (bad key, no quota, unknown launch,
+# invalid input) are fatal; timeouts, connection errors, 408/425/429 and 5xx
+# are retryable.
+FATAL_STATUS_CODES = frozenset({400, 401, 402, 403, 404, 405, 410, 413, 415, 422})
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429})
+
+class PiperAPIError(Exception):
+    """An HTTP call to the Piper API failed; status/body are set when the server answered."""
+    retryable = True
+
+    def __init__(self, message, status=None, body=None, url=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+        self.url = url
+        self.retry_after = retry_after # Seconds from a Retry-After header, if any
+
+    def __str__(self):
+        if self.status is None:
+            return super().__str__()
+        body = (self.body or "").strip()
+        if len(body) > 500:
+            body = body[:500] + "..."
+        return f"HTTP {self.status} from {self.url}: {body or 'No content'}"
+
+class RetryableAPIError(PiperAPIError):
+    """Transient failure: the same request may succeed later."""
+    retryable = True
+
+class FatalAPIError(PiperAPIError):
+    """Permanent failure: retrying or polling further cannot succeed."""
+    retryable = False
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None # HTTP-date form is not worth parsing here
+
+def api_error_for_status(status, body, url, retry_after=None):
+    """Builds the PiperAPIError subclass matching an HTTP error status."""
+    fatal = status in FATAL_STATUS_CODES or (400 <= status < 500 and status not in RETRYABLE_STATUS_CODES)
+    error_class = FatalAPIError if fatal else RetryableAPIError
+    return error_class(f"HTTP {status}", status=status, body=body, url=url,
+                       retry_after=_parse_retry_after(retry_after))
+
+def classify_request_error(error, url):
+    """Turns a requests exception into a RetryableAPIError or FatalAPIError."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            body = response.text
+        except Exception:
+            body = None
+        return api_error_for_status(response.status_code, body, url, response.headers.get("Retry-After"))
+    return RetryableAPIError(f"Request to {url} failed: {error}", url=url)
+
+class CircuitOpenError(RetryableAPIError):
+    """Rejected locally: the endpoint's circuit breaker is open."""
+
+class RetryBudgetExhausted(RetryableAPIError):
+    """Rejected locally: the process-wide retry budget is spent."""
+
+class RateLimited(RetryableAPIError):
+    """Rejected locally: the rate-limit token is not due within max_wait; retry_after holds the delay."""
+
+def admit_request(url, is_retry=False, api_key=None, wait=True, max_wait=None):
+    """
+    Gate in front of every API call. A retry (the previous attempt for the same
+    purpose failed) must spend a token of the shared retry budget; any call is
+    rejected while the endpoint's circuit breaker is open (one probe passes
+    once it turns half-open). Raises CircuitOpenError / RetryBudgetExhausted.
+    Admitted calls then take a rate-limiter token for (api_key, endpoint class).
+    A token due later than max_wait seconds (e.g. what is left of a launch
+    deadline) is given back and RateLimited is raised. Otherwise wait=True
+    waits for it (interruptibly), and wait=False returns the delay in seconds
+    for the caller to wait (async code).
+    """
+    budget = get_retry_budget()
+    if is_retry:
+        if not budget.try_spend():
+            raise RetryBudgetExhausted(f"Retry budget exhausted, skipping {url}", url=url)
+    else:
+        budget.record_request()
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for {endpoint_key(url)}, request not sent", url=url)
+    limiter = get_rate_limiter()
+    delay = limiter.reserve(api_key, url)
+    if delay > 0 and max_wait is not None and delay > max_wait:
+        limiter.release(api_key, url)
+        breaker.release_probe()
+        raise RateLimited(f"Rate limit for {endpoint_key(url)}: next request allowed in {delay:.1f}s", url=url,
+                          retry_after=delay)
+    if delay > 0 and wait:
+        from .launch_engine import interruptible_sleep # Imported lazily: launch_engine imports this module
+        try:
+            interruptible_sleep(delay)
+        except BaseException:
+            breaker.release_probe()
+            raise
+        return 0.0
+    return delay
+
+def record_outcome(url, error=None, api_key=None):
+    """
+    Feeds the endpoint's breaker (timeouts, connection errors, 408 and 5xx count
+    as failures) and pushes the rate limiter back on Retry-After / 429.
+    """
+    if error is not None and (error.retry_after or error.status == 429):
+        get_rate_limiter().retry_after(api_key, url, error.retry_after or 1.0)
+    breaker = breaker_for(url)
+    if error is None or (error.status is not None and error.status < 500 and error.status != 408):
+        breaker.record_success() # The server answered; client errors say nothing about its health
+    else:
+        breaker.record_failure()
+
+def abandon_request(url):
+    """
+    For admitted requests that end with neither a response nor a network error
+    (task cancelled): frees a half-open breaker probe without counting a failure.
+    """
+    breaker_for(url).release_probe()
+
+def _failed_request(error, url, raise_fatal, api_key=None):
+    """Shared failure path of the request helpers: raise fatal errors when asked, else None."""
+    api_error = classify_request_error(error, url)
+    record_outcome(url, api_error, api_key)
+    if raise_fatal and not api_error.retryable:
+        raise api_error from error
+    return api_error
 
 # Helper function to make POST requests
-def post_request(url, api_key, data):
+def post_request(url, api_key, data, timeout=60, raise_fatal=False, max_wait=None):
+    """
+    Returns the JSON response or None; with raise_fatal a fatal HTTP status raises FatalAPIError.
+    With max_wait a rate-limit wait longer than that raises RateLimited (see admit_request).
+    """
     headers = {
         'content-Type': 'application/json',
         'api-token': api_key
     }
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=60)
+        admit_request(url, api_key=api_key, max_wait=max_wait)
+        response = get_session().post(url, headers=headers, json=data, timeout=timeout)
         response.raise_for_status()
+        record_outcome(url)
         return response.json()
-    except requests.exceptions.Timeout:
+    except RateLimited:
+        if max_wait is not None:
+            raise
+        return None
+    except RetryableAPIError: # Rejected by the circuit breaker
+        return None
+    except requests.exceptions.Timeout as e:
+        _failed_request(e, url, raise_fatal, api_key)
         return None
     except requests.exceptions.RequestException as e:
-        if e.response is not None:
-            pass
+        _failed_request(e, url, raise_fatal, api_key)
         return None
     except json.JSONDecodeError:
         return None
 
-def post_request_json(url, api_key, json_data):
+def post_request_json(url, api_key, json_data, timeout=60, raise_fatal=False, max_wait=None):
     """
     Отправляет POST-запрос с данными JSON и API-ключом в заголовке.
 
@@ -34,6 +287,9 @@ def post_request_json(url, api_key, json_data):
         url (str): URL для POST-запроса.
         api_key (str): Ваш API-ключ.
         json_data (dict): Словарь Python для отправки в теле запроса как JSON.
+        timeout (float): Таймаут запроса в секундах.
+        raise_fatal (bool): Бросать FatalAPIError для неисправимых ошибок (401, 402, 404, ...).
+        max_wait (float): Если токен rate limiter'а освободится позже - бросить RateLimited (см. admit_request).
 
     Returns:
         dict or None: Ответ сервера в виде словаря Python или None в случае ошибки.
@@ -42,14 +298,27 @@ def post_request_json(url, api_key, json_data):
         'api-token': api_key,
         'content-type': 'application/json' # Указываем, что отправляем JSON
     }
+    try:
+        # Отказ сразу, если circuit breaker открыт; ограничение частоты.
+        # Вне основного try: его общий except Exception не должен глотать прерывание ожидания
+        admit_request(url, api_key=api_key, max_wait=max_wait)
+    except RateLimited:
+        if max_wait is not None:
+            raise
+        return {"error": "rate limited"}
+    except RetryableAPIError as e:
+        print(f"[Utils] {e}")
+        return {"error": str(e)}
     try:
         # Сериализуем словарь Python в строку JSON
         data_payload = json.dumps(json_data)
-        response = requests.post(url, headers=headers, data=data_payload, timeout=60) # timeout - время ожидания ответа
+        response = get_session().post(url, headers=headers, data=data_payload, timeout=timeout) # timeout - время ожидания ответа
         response.raise_for_status() # Проверяем на HTTP-ошибки (4xx, 5xx)
+        record_outcome(url)
         return response.json() # Возвращаем ответ сервера как словарь
     except requests.exceptions.RequestException as e:
         print(f"[Utils] Ошибка POST JSON запроса к {url}: {e}")
+        _failed_request(e, url, raise_fatal, api_key)
         # Попытаемся извлечь текст ответа, если он есть, для диагностики
         error_content = None
         if hasattr(e, 'response') and e.response is not None:
@@ -71,173 +340,367 @@ def post_request_json(url, api_key, json_data):
         return {"error": f"Unexpected error: {e}"}
 
 # Helper function to make GET requests
-def get_request(url, api_key):
+def get_request(url, api_key, timeout=60, raise_fatal=False, is_retry=False, max_wait=None):
+    """
+    Returns the JSON response or None; with raise_fatal a fatal HTTP status raises FatalAPIError.
+    is_retry=True marks a repeat after a failed attempt: it is only sent if the retry budget allows.
+    With max_wait a rate-limit wait longer than that raises RateLimited (see admit_request).
+    """
     headers = {
         'api-token': api_key
     }
     try:
-        response = requests.get(url, headers=headers, timeout=60)
+        admit_request(url, is_retry, api_key=api_key, max_wait=max_wait)
+        response = get_session().get(url, headers=headers, timeout=timeout)
         response.raise_for_status()
+        record_outcome(url)
         return response.json()
-    except requests.exceptions.Timeout:
+    except RateLimited:
+        if max_wait is not None:
+            raise
+        return None
+    except RetryableAPIError: # Rejected by the circuit breaker or the retry budget
+        return None
+    except requests.exceptions.Timeout as e:
+        _failed_request(e, url, raise_fatal, api_key)
         return None
     except requests.exceptions.RequestException as e:
-        if e.response is not None:
-            pass
+        _failed_request(e, url, raise_fatal, api_key)
         return None
     except json.JSONDecodeError:
         return None
 
 # --- Image Helper Functions ---
 
+UPLOAD_URL = "https://app.piper.my/api/upload-file-v1" # Assumed endpoint
+
+# Download guards: responses above these limits are rejected while streaming
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+MAX_DOWNLOAD_BYTES = int(os.environ.get("PIPER_MAX_DOWNLOAD_BYTES", str(512 * 2**20)))
+MAX_DOWNLOAD_PIXELS = int(os.environ.get("PIPER_MAX_DOWNLOAD_PIXELS", str(16384 * 16384)))
+
+class DownloadLimitError(ValueError):
+    """Raised when a downloaded image exceeds the byte or pixel limit."""
+
 # Function to download and convert image URL to ComfyUI IMAGE tensor
-def url_to_image_tensor(image_url):
+def url_to_image_tensor(image_url, timeout=60, max_bytes=None, max_pixels=None, max_side=None, use_cache=True):
+    """
+    Streams an image from image_url and decodes it into a [1, H, W, 3] tensor.
+    max_bytes/max_pixels default to MAX_DOWNLOAD_BYTES/MAX_DOWNLOAD_PIXELS (0 disables).
+    max_side asks for a reduced-resolution decode (JPEG draft / Image.reduce).
+    With use_cache the decoded pixels are served from / stored in the on-disk
+    result cache (see result_cache.py).
+    Returns None on any failure.
+    """
+    cache = get_result_cache() if use_cache else None
     try:
-        response = requests.get(image_url, timeout=60)
-        response.raise_for_status()
-        img_data = response.content
-        i = Image.open(io.BytesIO(img_data))
-        i = i.convert("RGB")
-        image = np.array(i).astype(np.float32) / 255.0
-        tensor = torch.from_numpy(image)[None,]
-        return tensor
+        if cache is not None:
+            pixels = cache.get(image_url, max_side)
+            if pixels is not None:
+                return uint8_to_tensor(pixels)
+        hasher = hashlib.blake2b(digest_size=16) if cache is not None else None
+        image = download_image(image_url, timeout=timeout, max_bytes=max_bytes, max_pixels=max_pixels,
+                               max_side=max_side, hasher=hasher)
+        with image:
+            return decoded_image_to_tensor(image, image_url, max_side, cache, hasher)
+    except DownloadLimitError as e:
+        print(f"[PiperUtils] Download of {image_url} rejected: {e}")
+        return None
     except requests.exceptions.RequestException as e:
         return None
     except Exception as e:
         return None
 
+def decoded_image_to_tensor(image, image_url, max_side, cache=None, hasher=None):
+    """Converts a downloaded PIL image to a tensor, storing its pixels in cache when given."""
+    if cache is None or hasher is None:
+        return pil_to_tensor(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    pixels = np.asarray(image)
+    cache.put(image_url, max_side, hasher.hexdigest(), pixels)
+    return uint8_to_tensor(pixels)
+
+class ImageDownload:
+    """
+    Consumes a downloaded image chunk by chunk: chunks are fed straight into
+    Pillow's incremental parser, so the max_bytes and max_pixels guards trip
+    before the whole body is in memory. With max_side the bytes are collected
+    instead so the decoder can be told to reduce while decoding.
+    hasher (e.g. hashlib.blake2b()) is updated with every chunk.
+    Shared by download_image and async_utils.async_url_to_image_tensor.
+    """
+    def __init__(self, max_bytes=None, max_pixels=None, max_side=None, hasher=None):
+        self.max_bytes = MAX_DOWNLOAD_BYTES if max_bytes is None else max_bytes
+        self.max_pixels = MAX_DOWNLOAD_PIXELS if max_pixels is None else max_pixels
+        self.max_side = max_side
+        self.hasher = hasher
+        self.parser = None if max_side else ImageFile.Parser()
+        self.buffer = bytearray() if max_side else None
+        self.received = 0
+
+    def check_declared(self, declared):
+        """Rejects a response by its Content-Length before any byte is read."""
+        if self.max_bytes and (declared or 0) > self.max_bytes:
+            raise DownloadLimitError(f"Content-Length {declared} exceeds {self.max_bytes} bytes")
+
+    def feed(self, chunk):
+        """Raises DownloadLimitError when a limit is exceeded."""
+        self.received += len(chunk)
+        if self.max_bytes and self.received > self.max_bytes:
+            raise DownloadLimitError(f"response exceeds {self.max_bytes} bytes")
+        if self.hasher is not None:
+            self.hasher.update(chunk)
+        if self.parser is None:
+            self.buffer += chunk
+            return
+        self.parser.feed(chunk)
+        if self.parser.image is not None:
+            _check_pixels(self.parser.image.size, self.max_pixels)
+
+    def close(self):
+        """Returns the decoded (or, with max_side, lazily opened and reduced) PIL image."""
+        if self.parser is not None:
+            return self.parser.close()
+        return open_image_bytes(bytes(self.buffer), max_pixels=self.max_pixels, max_side=self.max_side)
+
+def download_image(image_url, timeout=60, max_bytes=None, max_pixels=None, max_side=None, hasher=None):
+    """
+    Downloads and decodes an image without buffering the whole response first
+    (see ImageDownload). Raises DownloadLimitError when a limit is exceeded.
+    """
+    download = ImageDownload(max_bytes=max_bytes, max_pixels=max_pixels, max_side=max_side, hasher=hasher)
+    get_rate_limiter().acquire(None, image_url) # Download class; unlimited unless configured
+    with get_session().get(image_url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        download.check_declared(int(response.headers.get("Content-Length") or 0))
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            download.feed(chunk)
+    return download.close()
+
+def open_image_bytes(img_data, max_pixels=None, max_side=None):
+    """Opens encoded bytes lazily, checks the pixel limit from the header and applies max_side."""
+    max_pixels = MAX_DOWNLOAD_PIXELS if max_pixels is None else max_pixels
+    image = Image.open(io.BytesIO(img_data))
+    _check_pixels(image.size, max_pixels)
+    return reduce_image_for_target(image, max_side)
+
+def _check_pixels(size, max_pixels):
+    if max_pixels and size[0] * size[1] > max_pixels:
+        raise DownloadLimitError(f"image {size[0]}x{size[1]} exceeds {max_pixels} pixels")
+
+def reduce_image_for_target(image, max_side):
+    """
+    Lowers the decode resolution of a not-yet-loaded image so its longer side
+    stays >= max_side: JPEG uses DCT scaling via draft(), other formats an
+    integer-factor reduce().
+    """
+    if not max_side or max(image.size) <= max_side:
+        return image
+    scale = max_side / max(image.size)
+    if image.format == "JPEG":
+        image.draft("RGB", (max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+    factor = max(image.size) // max_side
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image
+
+def image_bytes_to_tensor(img_data, max_pixels=None, max_side=None):
+    """Decodes encoded image bytes into a [1, H, W, 3] float32 IMAGE tensor."""
+    with open_image_bytes(img_data, max_pixels=max_pixels, max_side=max_side) as i:
+        return pil_to_tensor(i)
+
+def split_image_batch(image_tensor):
+    """Splits a [B, H, W, C] IMAGE tensor into a list of [1, H, W, C] tensors."""
+    if image_tensor is None:
+        return []
+    if image_tensor.dim() == 3:
+        return [image_tensor[None,]]
+    return [image_tensor[i:i + 1] for i in range(image_tensor.shape[0])]
+
+def stack_image_tensors(tensors):
+    """
+    Concatenates [B, H, W, C] IMAGE tensors into one batch. Images whose size
+    differs from the first one are bilinearly resized to match it.
+    """
+    if not tensors:
+        return None
+    height, width = tensors[0].shape[1], tensors[0].shape[2]
+    resized = []
+    for tensor in tensors:
+        if tensor.shape[1] != height or tensor.shape[2] != width:
+            tensor = torch.nn.functional.interpolate(
+                tensor.permute(0, 3, 1, 2), size=(height, width), mode="bilinear", align_corners=False
+            ).permute(0, 2, 3, 1)
+        resized.append(tensor)
+    return torch.cat(resized, dim=0)
+
 # Function to create a dummy/empty tensor
 def create_empty_image_tensor(width=64, height=64):
-    image = np.zeros((height, width, 3), dtype=np.float32)
-    tensor = torch.from_numpy(image)[None,]
-    return tensor
+    return torch.zeros((1, height, width, 3), dtype=torch.float32)
 
 # --- New Function: Upload Image Tensor ---
 def tensor_to_pil(tensor):
     """Converts a ComfyUI IMAGE tensor to a PIL Image list."""
     if tensor is None:
         return []
-    # Remove batch dimension, scale from 0-1 to 0-255, convert to numpy uint8
-    images = tensor.cpu().numpy().squeeze(0) * 255.0
-    images = np.clip(images, 0, 255).astype(np.uint8)
-    # Convert to PIL Images
-    pil_images = [Image.fromarray(img) for img in images]
-    return pil_images
+    # One PIL image per batch item (see image_convert.py)
+    return tensor_to_pil_images(tensor)
 
-def upload_image_and_get_url(image_tensor, api_key):
-    """
-    Converts the first image from a tensor batch to PNG bytes,
-    uploads it to the assumed Piper upload endpoint, and returns the public URL.
-    Returns None if upload fails.
-    """
-    upload_url = "https://app.piper.my/api/upload-file-v1" # Assumed endpoint
+def tensor_to_png_bytes(image_tensor):
+    """Encodes the first image of a tensor batch as PNG bytes. Returns None for an empty input."""
     pil_images = tensor_to_pil(image_tensor)
-
     if not pil_images:
         return None
+    with io.BytesIO() as byte_buffer:
+        pil_images[0].save(byte_buffer, format="PNG")
+        return byte_buffer.getvalue()
 
-    # Use the first image from the batch
-    image_pil = pil_images[0]
+def encode_upload_file(image_tensor, image_format='PNG'):
+    """
+    Encodes the first image of a tensor batch with the image_format policy.
+    Returns (filename, image_bytes, mime_type) for a multipart file part, or None.
+    """
+    if image_tensor is None or image_tensor.shape[0] == 0:
+        return None
+    if image_tensor.dim() == 4:
+        image_tensor = image_tensor[:1]
+    encoded = tensor_to_image_bytes(image_tensor, image_format=image_format)
+    if encoded is None:
+        return None
+    image_bytes, mime_type = encoded
+    return f"image.{mime_type.split('/')[-1]}", image_bytes, mime_type
 
-    # Convert PIL image to PNG bytes in memory
-    with io.BytesIO() as byte_buffer:
-        image_pil.save(byte_buffer, format="PNG")
-        image_bytes = byte_buffer.getvalue()
+def upload_image_and_get_url(image_tensor, api_key, timeout=60, raise_fatal=False, image_format='PNG'):
+    """
+    Encodes the first image from a tensor batch with the image_format policy,
+    uploads it to the assumed Piper upload endpoint, and returns the public URL.
+    Goes through the same breaker / rate-limit gate as the other helpers.
+    Returns None if upload fails; with raise_fatal a fatal HTTP status raises FatalAPIError.
+    """
+    upload_file = encode_upload_file(image_tensor, image_format)
+    if upload_file is None:
+        return None
 
     # Prepare headers and files for upload
     headers = {'api-token': api_key}
     # Assuming the API expects the file part named 'file'
-    files = {'file': ('image.png', image_bytes, 'image/png')}
+    files = {'file': upload_file}
 
     try:
-        response = requests.post(upload_url, headers=headers, files=files, timeout=60)
+        admit_request(UPLOAD_URL, api_key=api_key)
+        response = get_session().post(UPLOAD_URL, headers=headers, files=files, timeout=timeout)
         response.raise_for_status()
-        response_json = response.json()
-        uploaded_url = response_json.get("url")
-        if uploaded_url:
-            return uploaded_url
-        else:
-            return None
-    except requests.exceptions.Timeout:
-        return None
-    except requests.exceptions.RequestException as e:
-        if e.response is not None:
-            pass
+        record_outcome(UPLOAD_URL)
+        uploaded_url = response.json().get("url")
+        if not uploaded_url:
+            print(f"[Utils] Upload response from {UPLOAD_URL} has no 'url'")
+        return uploaded_url or None
+    except RetryableAPIError as e: # Rejected by the circuit breaker
+        print(f"[Utils] {e}")
         return None
-    except json.JSONDecodeError:
+    except (ValueError, AttributeError) as e: # Body is not a JSON object (checked first: requests' JSONDecodeError is also a RequestException)
+        print(f"[Utils] Invalid upload response from {UPLOAD_URL}: {e}")
         return None
-    except Exception as e:
+    except requests.exceptions.RequestException as e:
+        print(f"[Utils] Image upload to {UPLOAD_URL} failed: {e}")
+        _failed_request(e, UPLOAD_URL, raise_fatal, api_key)
         return None
 
+def remote_url_available(url, timeout=10):
+    """
+    Cheap HEAD check that a result URL still serves content; used to re-validate
+    memoized URLs before reusing them. Unknown (network error) counts as available.
+    """
+    try:
+        get_rate_limiter().acquire(None, url)
+        response = get_session().head(url, timeout=timeout, allow_redirects=True)
+    except requests.exceptions.RequestException as e:
+        print(f"[Utils] Could not check {url}: {e}")
+        return True
+    return response.status_code not in (403, 404, 410)
+
 # --- New Helper: Multipart POST Request ---
-def post_request_multipart(url, api_key, json_data, image_tensor):
+def post_request_multipart(url, api_key, json_data, image_tensor, timeout=120, image_field='image',
+                           image_bytes=None, mime_type='image/png', raise_fatal=False, max_wait=None):
     """
-    Sends a multipart/form-data request with a JSON 'inputs' part and an 'image' file part.
+    Sends a multipart/form-data request with a JSON 'inputs' part and an image file part
+    named image_field. Pass image_bytes to send already encoded data instead of image_tensor.
+    With raise_fatal a fatal HTTP status raises FatalAPIError; with max_wait a rate-limit
+    wait longer than that raises RateLimited (see admit_request).
     """
     headers = {'api-token': api_key}
     # No 'Content-Type' header here, requests library handles it for multipart
 
-    pil_images = tensor_to_pil(image_tensor)
-    if not pil_images:
+    if image_bytes is None:
+        image_bytes = tensor_to_png_bytes(image_tensor) # Use the first image
+        mime_type = 'image/png'
+    if image_bytes is None:
         return None
-    image_pil = pil_images[0] # Use the first image
-
-    # Convert PIL image to PNG bytes
-    with io.BytesIO() as byte_buffer:
-        image_pil.save(byte_buffer, format="PNG")
-        image_bytes = byte_buffer.getvalue()
+    extension = mime_type.split('/')[-1]
 
     # Prepare the multipart data
     # 'inputs' part containing the JSON data as a string
     # 'image' part containing the image file data
     files = {
         'inputs': (None, json.dumps(json_data), 'application/json'),
-        'image': ('image.png', image_bytes, 'image/png')
+        image_field: (f'image.{extension}', image_bytes, mime_type)
     }
 
     try:
-        response = requests.post(url, headers=headers, files=files, timeout=120) # Increased timeout
+        # Outside the main try: its catch-all must not swallow an interrupted wait
+        admit_request(url, api_key=api_key, max_wait=max_wait)
+    except RateLimited:
+        if max_wait is not None:
+            raise
+        return None
+    except RetryableAPIError: # Rejected by the circuit breaker
+        return None
+    try:
+        response = get_session().post(url, headers=headers, files=files, timeout=timeout) # Increased timeout
         response.raise_for_status()
+        record_outcome(url)
         # Assume response is still JSON like other launch endpoints
         return response.json()
-    except requests.exceptions.Timeout:
+    except requests.exceptions.Timeout as e:
+        _failed_request(e, url, raise_fatal, api_key)
         return None
     except requests.exceptions.RequestException as e:
-        if e.response is not None:
-            pass
+        _failed_request(e, url, raise_fatal, api_key)
         return None
     except json.JSONDecodeError:
         return None
     except Exception as e:
         return None 
 
-def tensor_to_base64_data_uri(image_tensor, image_format='PNG'):
+def tensor_to_image_bytes(image_tensor, image_format='PNG', assume_normalized=False):
     """
-    Конвертирует тензор изображения ComfyUI в строку Data URI (Base64).
+    Кодирует тензор изображения ComfyUI (B=1) в байты согласно политике кодирования.
 
     Args:
         image_tensor (torch.Tensor): Входной тензор (ожидается формат B, H, W, C, где B=1).
-        image_format (str): Формат изображения ('PNG' или 'JPEG'). PNG рекомендуется для качества.
+        image_format (str): Имя политики из IMAGE_FORMAT_LIST ('PNG', 'PNG_FAST', 'WEBP_LOSSLESS', 'JPEG', ...).
+        assume_normalized (bool): Значения уже в [0, 1] - пропустить проверку диапазона.
 
     Returns:
-        str or None: Строка Data URI (например, "data:image/png;base64,...") или None в случае ошибки.
+        tuple or None: (image_bytes, mime_type) или None в случае ошибки.
     """
+    # Убедимся, что политика кодирования известна
+    policy = get_encoder_policy(image_format)
+    if policy is None:
+        print(f"[PiperUtils] Ошибка: Неподдерживаемый формат '{image_format}'. Используется PNG.")
+        policy = get_encoder_policy('PNG')
+
     # 1. Конвертация Тензора в PIL Изображение (аналогично save_tensor_to_temp_file)
     try:
         if image_tensor.dim() == 4 and image_tensor.shape[0] == 1:
             image_tensor = image_tensor.squeeze(0)
         elif image_tensor.dim() != 3:
-            print(f"[PiperUtils] Ошибка B64: Неожиданная размерность тензора: {image_tensor.shape}")
+            print(f"[PiperUtils] Ошибка кодирования: Неожиданная размерность тензора: {image_tensor.shape}")
             return None
 
-        image_tensor_cpu = image_tensor.cpu()
-        image_np = image_tensor_cpu.numpy()
-
-        if image_np.min() < 0.0 or image_np.max() > 1.0:
-             print(f"[PiperUtils] B64 Предупреждение: Диапазон [{image_np.min()}, {image_np.max()}] выходит за [0.0, 1.0].")
-             image_np = np.clip(image_np, 0.0, 1.0)
-
-        image_np = (image_np * 255).astype(np.uint8)
+        # Масштабирование и приведение к uint8 за минимум проходов (см. image_convert.py)
+        image_np = tensor_to_uint8(image_tensor, assume_normalized=assume_normalized, warn_prefix="[PiperUtils]")
 
         if image_np.shape[2] == 1:
             image_pil = Image.fromarray(image_np.squeeze(2), 'L')
@@ -246,40 +709,45 @@ def tensor_to_base64_data_uri(image_tensor, image_format='PNG'):
         elif image_np.shape[2] == 4:
              image_pil = Image.fromarray(image_np, 'RGBA')
              # Если выбран JPEG, конвертируем в RGB, так как JPEG не поддерживает альфа-канал
-             if image_format.upper() == 'JPEG':
-                 print("[PiperUtils] B64 Предупреждение: RGBA конвертировано в RGB для сохранения в JPEG.")
+             if not policy.supports_alpha:
+                 print("[PiperUtils] Предупреждение: RGBA конвертировано в RGB для сохранения в JPEG.")
                  image_pil = image_pil.convert('RGB')
         else:
-            print(f"[PiperUtils] Ошибка B64: Неподдерживаемое кол-во каналов: {image_np.shape[2]}")
+            print(f"[PiperUtils] Ошибка кодирования: Неподдерживаемое кол-во каналов: {image_np.shape[2]}")
             return None
     except Exception as e:
-        print(f"[PiperUtils] Ошибка B64 при конвертации тензора в PIL: {e}")
+        print(f"[PiperUtils] Ошибка при конвертации тензора в PIL: {e}")
         traceback.print_exc()
         return None
 
-    # 2. Сохранение PIL Изображения в байты в памяти
+    # 2. Сохранение PIL Изображения в байты в памяти (с учетом времени кодирования)
     try:
-        buffer = io.BytesIO()
-        # Убедимся, что формат поддерживается PIL
-        valid_format = image_format.upper()
-        if valid_format not in ['PNG', 'JPEG']:
-            print(f"[PiperUtils] B64 Ошибка: Неподдерживаемый формат '{image_format}'. Используется PNG.")
-            valid_format = 'PNG'
-
-        # Качество для JPEG (опционально)
-        save_kwargs = {}
-        if valid_format == 'JPEG':
-            save_kwargs['quality'] = 95 # Можно настроить качество
-
-        image_pil.save(buffer, format=valid_format, **save_kwargs)
-        image_bytes = buffer.getvalue()
-        buffer.close()
+        image_bytes = policy.encode(image_pil)
     except Exception as e:
-        print(f"[PiperUtils] Ошибка B64 при сохранении PIL в байты (формат {valid_format}): {e}")
+        print(f"[PiperUtils] Ошибка при сохранении PIL в байты (политика {policy.name}): {e}")
         traceback.print_exc()
         return None
 
-    # 3. Кодирование байтов в Base64
+    return image_bytes, policy.mime_type # image/png, image/webp или image/jpeg
+
+def tensor_to_base64_data_uri(image_tensor, image_format='PNG'):
+    """
+    Конвертирует тензор изображения ComfyUI в строку Data URI (Base64).
+
+    Args:
+        image_tensor (torch.Tensor): Входной тензор (ожидается формат B, H, W, C, где B=1).
+        image_format (str): Формат изображения ('PNG' или 'JPEG'). PNG рекомендуется для качества.
+
+    Returns:
+        str or None: Строка Data URI (например, "data:image/png;base64,...") или None в случае ошибки.
+    """
+    # 1. Кодирование тензора в байты изображения
+    encoded = tensor_to_image_bytes(image_tensor, image_format=image_format)
+    if encoded is None:
+        return None
+    image_bytes, mime_type = encoded
+
+    # 2. Кодирование байтов в Base64
     try:
         base64_bytes = base64.b64encode(image_bytes)
         base64_string = base64_bytes.decode('utf-8') # Преобразуем байты base64 в строку
@@ -288,9 +756,53 @@ def tensor_to_base64_data_uri(image_tensor, image_format='PNG'):
         traceback.print_exc()
         return None
 
-    # 4. Формирование строки Data URI
-    mime_type = f"image/{valid_format.lower()}" # image/png или image/jpeg
+    # 3. Формирование строки Data URI
     data_uri = f"data:{mime_type};base64,{base64_string}"
 
     #print(f"[PiperUtils] Тензор успешно конвертирован в Data URI (формат: {valid_format}, длина строки: {len(data_uri)})")
-    return data_uri
\ No newline at end of file
+    return data_uri
+
+# --- Image transport for launch payloads ---
+# base64:    image embedded in the JSON body as a data URI (original behaviour)
+# multipart: image bytes sent as a binary file part next to the JSON 'inputs' part
+# upload:    image uploaded first, the JSON body carries only the file URL
+TRANSPORT_MODES = ["base64", "multipart", "upload"]
+
+def prepare_image_transport(image_tensor, api_key, transport="base64", image_format="PNG", use_cache=True):
+    """
+    Prepares one image for a launch request.
+    Returns (inline_value, multipart_part): inline_value goes into the JSON
+    inputs (data URI or uploaded URL); multipart_part is (image_bytes, mime_type)
+    for the multipart transport. Returns None if encoding/upload fails.
+    With use_cache, identical input tensors reuse the previous upload URL or
+    encoded payload (see upload_cache.py).
+    """
+    if not use_cache:
+        return _prepare_image_transport(image_tensor, api_key, transport, image_format)
+    from .upload_cache import get_upload_cache, tensor_content_hash # Imported lazily to keep utils light
+
+    cache = get_upload_cache()
+    content_hash = tensor_content_hash(image_tensor)
+    if transport == "upload":
+        # Uploaded files belong to the account that uploaded them: key URLs by API key too
+        key_hash = hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:16]
+        cache_key = f"url:{key_hash}:{image_format.upper()}:{content_hash}"
+    else:
+        cache_key = f"payload:{transport}:{image_format.upper()}:{content_hash}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return tuple(cached)
+    prepared = _prepare_image_transport(image_tensor, api_key, transport, image_format)
+    if prepared is not None:
+        cache.put(cache_key, prepared)
+    return prepared
+
+def _prepare_image_transport(image_tensor, api_key, transport, image_format):
+    if transport == "multipart":
+        encoded = tensor_to_image_bytes(image_tensor, image_format=image_format)
+        return (None, encoded) if encoded is not None else None
+    if transport == "upload":
+        uploaded_url = upload_image_and_get_url(image_tensor, api_key, image_format=image_format)
+        return (uploaded_url, None) if uploaded_url else None
+    data_uri = tensor_to_base64_data_uri(image_tensor, image_format=image_format)
+    return (data_uri, None) if data_uri else None
@@ -0,0 +1,78 @@
+# nodes/video_frames_node.py
+import traceback
+
+import torch
+
+from .utils import create_empty_image_tensor
+from .frame_store import get_frame_store, decoder_name, DecoderUnavailable
+from .video_store import get_video_store
+from .launch_engine import interrupt_requested, LaunchInterrupted
+
+
+class PiperVideoToFrames:
+    """
+    Turns a video URL (e.g. from Piper Generate Video) into an IMAGE batch.
+    Frames are decoded one at a time into a memory-mapped store, so the batch
+    is never held in RAM as a separate decoded copy.
+    """
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "video_url": ("STRING", {"forceInput": True}),
+                "frame_stride": ("INT", {"default": 1, "min": 1, "max": 1000}), # Keep every N-th frame
+                "max_frames": ("INT", {"default": 0, "min": 0, "max": 100000}), # 0 = all frames
+            },
+            "optional": {
+                "start_frame": ("INT", {"default": 0, "min": 0, "max": 1000000}),
+                # 0 on one side keeps the aspect ratio, 0 on both keeps the original size
+                "resize_width": ("INT", {"default": 0, "min": 0, "max": 8192}),
+                "resize_height": ("INT", {"default": 0, "min": 0, "max": 8192}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "INT", "FLOAT", "STRING")
+    RETURN_NAMES = ("frames", "frame_count", "fps", "status_text")
+    FUNCTION = "video_to_frames"
+    CATEGORY = "PiperAPI/Video"
+
+    def video_to_frames(self, video_url, frame_stride, max_frames, start_frame=0, resize_width=0, resize_height=0):
+        empty_image = create_empty_image_tensor()
+        if not video_url or not video_url.startswith(("http://", "https://")):
+            err_msg = f"Error: Not a video URL: {video_url}"
+            print(f"[PiperVideoToFrames] {err_msg}")
+            return (empty_image, 0, 0.0, err_msg)
+
+        store = get_frame_store()
+        key = store.key_for(video_url, stride=frame_stride, start=start_frame, max_frames=max_frames,
+                            width=resize_width, height=resize_height)
+        cached = store.get(key)
+        try:
+            if cached is not None:
+                frames, fps = cached
+                print(f"[PiperVideoToFrames] Reusing {len(frames)} decoded frames of {video_url}")
+            else:
+                # A video already saved by Piper Save Video is decoded from disk; otherwise stream the URL
+                video_store = get_video_store()
+                local_path = video_store.lookup(video_url) if video_store is not None else None
+                source = local_path or video_url
+                print(f"[PiperVideoToFrames] Decoding {source} with {decoder_name()}")
+                frames, fps = store.decode(key, source, stride=frame_stride, start_frame=start_frame,
+                                           max_frames=max_frames, resize_width=resize_width,
+                                           resize_height=resize_height, should_abort=interrupt_requested)
+        except InterruptedError:
+            raise LaunchInterrupted("Video decoding interrupted")
+        except DecoderUnavailable as e:
+            err_msg = f"Error: {e}"
+            print(f"[PiperVideoToFrames] {err_msg}")
+            return (empty_image, 0, 0.0, err_msg)
+        except Exception as e:
+            err_msg = f"Error: Could not decode video: {e}"
+            print(f"[PiperVideoToFrames] {err_msg}")
+            traceback.print_exc()
+            return (empty_image, 0, 0.0, err_msg)
+
+        # Shares memory with the copy-on-write mapping: pages load on access, writes stay private
+        image_tensor = torch.from_numpy(frames)
+        status_text = f"Decoded {image_tensor.shape[0]} frames ({image_tensor.shape[2]}x{image_tensor.shape[1]}, {fps:.2f} fps)"
+        return (image_tensor, int(image_tensor.shape[0]), float(fps), status_text)
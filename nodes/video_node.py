@@ -1,9 +1,10 @@
 # nodes/video_node.py
-import time
 import json
 
-# Import helpers from utils.py within the same directory
-from .utils import post_request, get_request
+# Shared launch/poll engine
+from .launch_engine import PollPolicy, LaunchResult, run_launch, launch_url_for, extract_video_url
+from .utils import remote_url_available
+from .request_memo import node_fingerprint
 
 class PiperGenerateVideo:
     # Define modes for the dropdown
@@ -18,20 +19,26 @@ class PiperGenerateVideo:
                 "mode": (s.MODE_LIST, {"default": "preview"}), # Mode dropdown
                 "poll_interval": ("INT", {"default": 5, "min": 1, "max": 60}), # Polling might take longer for video
                 "max_wait_time": ("INT", {"default": 600, "min": 30, "max": 3600}), # Video can take time
+            },
+            "optional": {
+                # Part of the request memo key: change it to get a new video for the same inputs
+                "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
+                # Skip the memoized result and any unfinished earlier launch of the same request
+                "force_new_launch": ("BOOLEAN", {"default": False}),
             }
         }
 
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        return node_fingerprint("generate-video-v1", kwargs)
+
     # Output will be the video URL or status message
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("video_url_or_status",)
     FUNCTION = "generate_video"
     CATEGORY = "PiperAPI/Video" # Assign to the Video category
 
-    def generate_video(self, api_key, prompt, mode, poll_interval, max_wait_time):
-        launch_url = "https://app.piper.my/api/generate-video-v1/launch"
-        state_url_template = "https://app.piper.my/api/launches/{}/state"
-        default_error_result = json.dumps({"error": "Processing failed before completion"})
-
+    def generate_video(self, api_key, prompt, mode, poll_interval, max_wait_time, seed=0, force_new_launch=False):
         # 1. Launch video generation
         launch_data = {
             "inputs": {
@@ -40,57 +47,23 @@ class PiperGenerateVideo:
             }
         }
         print(f"Launching Piper video generation with data: {launch_data}")
-        launch_response = post_request(launch_url, api_key, launch_data)
-
-        if not launch_response or "_id" not in launch_response:
-            err_msg = "Error: Failed to launch video generation or get launch ID."
-            print(err_msg)
-            return (err_msg,) # Return error message
-
-        launch_id = launch_response["_id"]
-        state_url = state_url_template.format(launch_id)
-
-        # 2. Poll based on 'outputs' and 'errors' fields
-        start_time = time.time()
-        while True:
-            current_time = time.time()
-            if current_time - start_time > max_wait_time:
-                err_msg = f"Error: Timed out waiting for video generation {launch_id}"
-                print(err_msg)
-                return (err_msg,)
-
-            state_response = get_request(state_url, api_key)
-
-            if not state_response:
-                print(f"Retrying state check in {poll_interval}s...")
-                time.sleep(poll_interval)
-                continue
-
-            # Check for errors first
-            errors = state_response.get("errors")
-            if errors and isinstance(errors, list) and len(errors) > 0:
-                err_msg = f"Error: Video generation failed (API Errors: {errors})"
-                print(err_msg)
-                print(f"Full state response: {state_response}")
-                # Return the errors list as JSON string within the status message
-                return (f"Error: API processing failed - {json.dumps(errors)}",)
 
-            # Check if outputs are populated
-            outputs = state_response.get("outputs")
-            if outputs and isinstance(outputs, dict) and len(outputs) > 0:
-                 # --- Try to extract video URL from outputs ---
-                 # Guessing the key might be 'video', 'video_url', or 'url'
-                 video_url = outputs.get("video") or outputs.get("video_url") or outputs.get("url")
+        # 2. Launch and poll through the shared engine
+        policy = PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time)
+        result = run_launch(launch_url_for("generate-video-v1"), api_key, launch_data,
+                            extractor=extract_video_url, policy=policy, log_prefix="[PiperGenerateVideo]",
+                            memoize=True, seed=seed, force_new=force_new_launch,
+                            memo_validate=remote_url_available) # Memoized URLs may have expired
 
-                 if video_url and isinstance(video_url, str):
-                     # Success! Return the video URL
-                     return (video_url,)
-                 else:
-                     # URL not found or invalid in outputs
-                     err_msg = f"Completed, but video URL not found or invalid in outputs: {outputs}"
-                     print(err_msg)
-                     # Return the outputs dict as string for debugging
-                     return (f"Completed (no URL found): {json.dumps(outputs)}",)
+        if result.ok:
+            # Success! Return the video URL
+            return (result.value,)
 
-            # If no errors and outputs are empty, assume it's still running
-            time.sleep(poll_interval) 
\ No newline at end of file
+        print(f"Error: Video generation failed ({result.message})")
+        if result.status == LaunchResult.API_ERROR:
+            # Return the errors list as JSON string within the status message
+            return (f"Error: API processing failed - {json.dumps(result.errors)}",)
+        if result.status == LaunchResult.BAD_OUTPUTS:
+            # Return the outputs dict as string for debugging
+            return (f"Completed (no URL found): {json.dumps(result.outputs)}",)
+        return (f"Error: {result.message}",)
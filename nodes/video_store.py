@@ -0,0 +1,164 @@
+# nodes/video_store.py
+# Content-addressed store for downloaded videos: each file is kept once under
+# its SHA-256 (computed while downloading), an index maps URLs to digests, and
+# saves into the output folder become reflinks or hardlinks instead of new
+# downloads. The store is trimmed to a byte budget, oldest use first.
+import glob
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+from .cache_paths import cache_dir
+from .kv_store import SQLiteKVStore
+from .ranged_download import download_file, DEFAULT_CONNECTIONS
+
+DEFAULT_MAX_BYTES = int(os.environ.get("PIPER_VIDEO_STORE_MAX_BYTES", str(10 * 2**30)))
+
+try:
+    import fcntl
+    FICLONE = 0x40049409 # Linux ioctl: share extents copy-on-write (btrfs, xfs, ...)
+except ImportError: # Windows
+    fcntl = None
+
+
+def _reflink(src, dest):
+    if fcntl is None:
+        raise OSError("reflink is not available on this platform")
+    with open(src, "rb") as source, open(dest, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dest)
+            raise
+
+
+def link_into(src, dest):
+    """
+    Places a copy of src at dest: reflink if the filesystem supports it (safe to
+    edit afterwards), hardlink otherwise, plain copy as the last resort.
+    Returns the method used. dest appears atomically.
+    """
+    tmp_path = f"{dest}.{uuid.uuid4().hex[:8]}.tmp"
+    for method, place in (("reflink", _reflink), ("hardlink", os.link), ("copy", shutil.copyfile)):
+        try:
+            place(src, tmp_path)
+        except OSError:
+            continue
+        os.replace(tmp_path, dest)
+        return method
+    raise OSError(f"could not place {src} at {dest}")
+
+
+class VideoStore:
+    """
+    objects/<sha256><ext> files plus an SQLite index url -> {"digest", "ext", "size"}.
+    Object mtimes are refreshed on every hit and drive eviction.
+    """
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index = SQLiteKVStore(os.path.join(root, "index.sqlite3"), table="videos", max_entries=100000)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def object_path(self, digest, ext):
+        return os.path.join(self.objects_dir, f"{digest}{ext}")
+
+    def lookup(self, url):
+        """Path of the stored object for url, or None."""
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        path = self.object_path(entry["digest"], entry.get("ext", ""))
+        try:
+            os.utime(path)
+        except OSError: # Evicted, or removed by hand
+            self.index.delete(url)
+            return None
+        return path
+
+    def fetch(self, url, dest_path, connections=DEFAULT_CONNECTIONS, timeout=120, should_abort=None):
+        """
+        Makes dest_path hold the content of url, downloading only when the store
+        does not have it yet. Returns (size, reused).
+        """
+        ext = os.path.splitext(dest_path)[1]
+        path = self.lookup(url)
+        if path is not None:
+            method = link_into(path, dest_path)
+            self.stats["hits"] += 1
+            print(f"[PiperVideoStore] Reused stored copy of {url} ({method})")
+            return os.path.getsize(dest_path), True
+
+        self.stats["misses"] += 1
+        hasher = hashlib.sha256()
+        tmp_path = os.path.join(self.objects_dir, f"incoming-{uuid.uuid4().hex}{ext}")
+        size = download_file(url, tmp_path, connections=connections, timeout=timeout,
+                             should_abort=should_abort, hasher=hasher)
+        digest = hasher.hexdigest()
+        path = self.object_path(digest, ext)
+        with self._lock:
+            if os.path.exists(path): # Same bytes under another URL
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+        self.index.put(url, {"digest": digest, "ext": ext, "size": size})
+        link_into(path, dest_path)
+        self._evict(keep=path)
+        return size, False
+
+    def total_bytes(self):
+        return sum(os.path.getsize(p) for p in glob.glob(os.path.join(self.objects_dir, "*")))
+
+    def _evict(self, keep=None):
+        entries = []
+        for path in glob.glob(os.path.join(self.objects_dir, "*")):
+            if os.path.basename(path).startswith("incoming-"):
+                continue # A download in progress
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # Saved outputs that hardlink this object keep their data
+                os.remove(path)
+                total -= size
+                self.stats["evictions"] += 1
+            except OSError:
+                pass # Stale index entries are dropped on the next lookup
+
+
+_video_store = None
+_video_store_lock = threading.Lock()
+
+
+def get_video_store():
+    """
+    Process-wide VideoStore, or None when disabled with PIPER_VIDEO_STORE=0 or
+    when it cannot be created. PIPER_VIDEO_STORE_MAX_BYTES sets the budget.
+    """
+    global _video_store
+    if os.environ.get("PIPER_VIDEO_STORE", "1") == "0":
+        return None
+    if _video_store is None:
+        with _video_store_lock:
+            if _video_store is None:
+                try:
+                    _video_store = VideoStore(cache_dir("videos"))
+                except Exception as e:
+                    print(f"[PiperVideoStore] Disabled: {e}")
+                    return None
+    return _video_store
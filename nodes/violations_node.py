@@ -1,18 +1,16 @@
 # nodes/violations_node.py
-import time
 import json # Для форматирования выходной строки
-import torch
 import traceback # Для вывода критических ошибок
 
 # Импортируем нужные хелперы из utils.py
 from .utils import (
-    # post_request, # Используем post_request_json для ясности
-    post_request_json,
-    get_request,
-    tensor_to_base64_data_uri, # Наш конвертер
-    create_empty_image_tensor # Хотя не используется для вывода, может понадобиться для utils
+    prepare_image_transport, # Base64 / multipart / загрузка
+    TRANSPORT_MODES,
     # upload_image_and_get_url # Больше не нужен
 )
+from .image_encoder import IMAGE_FORMAT_LIST # Политики кодирования
+from .batch_runner import DEFAULT_MAX_CONCURRENCY, is_image_batch, run_image_batch
+from .launch_engine import PollPolicy, LaunchResult, run_launch, extract_raw_json
 
 class PiperViolationsDetector:
     # Определяем проверки по умолчанию
@@ -29,7 +27,11 @@ class PiperViolationsDetector:
                 "image": ("IMAGE",),
                 "checks": ("STRING", {"multiline": False, "default": s.DEFAULT_CHECKS}),
                 # Убрали poll_interval и max_wait_time
-                "image_format": (["PNG", "JPEG"], {"default": "PNG"}) # Формат для Base64
+                "image_format": (IMAGE_FORMAT_LIST, {"default": "PNG"}) # Формат для Base64
+            },
+            "optional": {
+                "max_concurrency": ("INT", {"default": DEFAULT_MAX_CONCURRENCY, "min": 1, "max": 32}), # Для батчей изображений
+                "transport": (TRANSPORT_MODES, {"default": "base64"}), # Как передавать изображение в API
             }
             # seed здесь не нужен, т.к. детектор не генеративный
         }
@@ -46,117 +48,102 @@ class PiperViolationsDetector:
         # Убираем пустые строки после разделения
         return [check.strip() for check in checks_string.split(',') if check.strip()]
 
+    def batch_item_result(self, item):
+        """Результат одного изображения батча в том же формате, что и для одиночного изображения."""
+        result = item.result
+        if result.ok:
+            return {"index": item.index, "outputs": result.value}
+        if result.status == LaunchResult.API_ERROR:
+            errors = result.errors if isinstance(result.errors, list) else [str(result.errors)]
+            return {"index": item.index, "error": "API processing failed", "details": errors}
+        return {"index": item.index, "error": result.message}
+
     # Убираем poll_interval, max_wait_time из аргументов, добавляем image_format
-    def detect_violations(self, api_key, image, checks, image_format):
+    def detect_violations(self, api_key, image, checks, image_format, max_concurrency=DEFAULT_MAX_CONCURRENCY, transport="base64"):
         # Используем константы
         poll_interval = self.DEFAULT_POLL_INTERVAL
         max_wait_time = self.DEFAULT_MAX_WAIT_TIME
 
         launch_url = "https://app.piper.my/api/violations-detector-v1/launch"
-        state_url_template = "https://app.piper.my/api/launches/{}/state"
         # Стандартный результат ошибки в формате JSON
         default_error_result_json = json.dumps({"error": "Обработка прервана до завершения"})
 
-        # 1. Конвертация изображения в Base64
-        try:
-            base64_image_uri = tensor_to_base64_data_uri(image, image_format=image_format)
-            if not base64_image_uri:
-                err_msg = "Критическая ошибка: Не удалось конвертировать изображение в Base64."
-                print(f"[PiperViolations] {err_msg}")
-                return (json.dumps({"error": err_msg}),) # Возвращаем ошибку в JSON
-        except Exception as e:
-            print(f"[PiperViolations] Критическая ошибка при конвертации в Base64:")
-            traceback.print_exc()
-            err_msg = f"Критическая ошибка подготовки Base64: {e}"
-            return (json.dumps({"error": err_msg}),)
-
-        # 2. Парсинг проверок
+        # 1. Парсинг проверок
         checks_list = self.parse_checks(checks)
         if not checks_list:
              # Если пользователь ничего не ввел или ввел некорректно, используем дефолтные
              print(f"[PiperViolations] Предупреждение: Не указаны валидные проверки, используются стандартные: {self.DEFAULT_CHECKS}")
              checks_list = self.parse_checks(self.DEFAULT_CHECKS)
 
+        # Батч изображений: каждое изображение проверяется отдельной задачей параллельно
+        if is_image_batch(image):
+            items = run_image_batch(
+                api_key, launch_url, image,
+                encode=lambda img: prepare_image_transport(img, api_key, transport=transport, image_format=image_format),
+                image_field="image",
+                build_launch_data=lambda uri: {"inputs": {"image": uri, "checks": checks_list}},
+                extractor=extract_raw_json,
+                policy=PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time),
+                max_concurrency=max_concurrency,
+            )
+            return (json.dumps([self.batch_item_result(item) for item in items], indent=2),)
+
+        # 2. Подготовка изображения (Base64, multipart или загрузка)
+        try:
+            prepared = prepare_image_transport(image, api_key, transport=transport, image_format=image_format)
+            if not prepared:
+                err_msg = f"Критическая ошибка: Не удалось подготовить изображение для отправки (transport={transport})."
+                print(f"[PiperViolations] {err_msg}")
+                return (json.dumps({"error": err_msg}),)
+        except Exception as e:
+            print(f"[PiperViolations] Критическая ошибка при подготовке изображения:")
+            traceback.print_exc()
+            err_msg = f"Критическая ошибка подготовки изображения: {e}"
+            return (json.dumps({"error": err_msg}),)
+        image_value, multipart_part = prepared # image_value = None для multipart
+        multipart_image = ("image", *multipart_part) if multipart_part else None
+
         # 3. Запуск задачи
         launch_data = {
             "inputs": {
-                "image": base64_image_uri, # Используем Base64
+                "image": image_value, # Data URI или URL загруженного файла
                 "checks": checks_list
             }
         }
 
-        try:
-            # print("[PiperViolations] Отправка запроса на запуск...") # Убрано
-            # Используем post_request_json
-            launch_response = post_request_json(launch_url, api_key, launch_data)
-        except Exception as e:
-             print(f"[PiperViolations] Критическая ошибка сети при запуске задачи:")
-             traceback.print_exc()
-             err_msg = f"Критическая ошибка сети (запуск): {e}"
-             return (json.dumps({"error": err_msg}),)
-
-        # 4. Проверка ответа на запуск
-        if not launch_response or not isinstance(launch_response, dict) or "_id" not in launch_response:
-            api_error_details = "Неизвестно"
-            if launch_response and isinstance(launch_response, dict): api_error_details = launch_response.get('error', launch_response)
-            elif launch_response: api_error_details = str(launch_response)
+        # Запуск и опрос через общий движок
+        policy = PollPolicy(poll_interval=poll_interval, max_wait_time=max_wait_time)
+        result = run_launch(launch_url, api_key, launch_data, extractor=extract_raw_json,
+                            policy=policy, log_prefix="[PiperViolations]", json_body=True,
+                            multipart_image=multipart_image)
 
-            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {api_error_details}"
+        if result.status == LaunchResult.FATAL_ERROR: # 401/402/404 и т.п.: повтор не поможет
+            err_msg = f"Критическая ошибка API: {result.message}"
             print(f"[PiperViolations] {err_msg}")
-            return (json.dumps({"error": err_msg, "details": api_error_details}),)
-
-        launch_id = launch_response["_id"]
-        state_url = state_url_template.format(launch_id)
-        # print(f"[PiperViolations] Задача запущена. ID: {launch_id}. Опрос...") # Убрано
-
-        # 5. Опрос состояния
-        start_time = time.time()
-        while True:
-            current_time = time.time()
-            if current_time - start_time > max_wait_time:
-                err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {launch_id}"
-                print(f"[PiperViolations] {err_msg}")
-                return (json.dumps({"error": err_msg}),)
-
-            try:
-                state_response = get_request(state_url, api_key)
-            except Exception as e:
-                 print(f"[PiperViolations] Ошибка сети при опросе {launch_id} (повтор через {poll_interval} сек): {e}")
-                 time.sleep(poll_interval)
-                 continue
-
-            if not state_response or not isinstance(state_response, dict):
-                print(f"[PiperViolations] Предупреждение: Некорректный ответ о состоянии {launch_id} (повтор через {poll_interval} сек).")
-                time.sleep(poll_interval)
-                continue
-
-            errors = state_response.get("errors")
-            if errors:
-                if isinstance(errors, list) and len(errors) > 0: error_details = errors # Возвращаем весь список ошибок
-                elif isinstance(errors, str): error_details = [errors] # Оборачиваем строку в список
-                else: error_details = [str(errors)] # На всякий случай
-                err_msg = f"Критическая ошибка API: Задача {launch_id} не удалась."
-                print(f"[PiperViolations] {err_msg} Детали: {error_details}")
-                return (json.dumps({"error": "API processing failed", "details": error_details}),)
-
-            outputs = state_response.get("outputs")
-            if outputs and isinstance(outputs, dict) and len(outputs) > 0:
-                 # Форматируем успешный результат в JSON
-                 try:
-                    result_json = json.dumps(outputs, indent=2)
-                    print(f"[PiperViolations] Успех: Детекция завершена для задачи {launch_id}.") # Выводим сообщение об успехе
-                    return (result_json,)
-                 except Exception as e:
-                    print(f"[PiperViolations] Критическая ошибка форматирования результата {launch_id}:")
-                    traceback.print_exc()
-                    err_msg = f"Критическая ошибка форматирования результата: {e}"
-                    # Возвращаем исходный словарь outputs, если не удалось сериализовать
-                    return (json.dumps({"warning": err_msg, "raw_outputs": outputs}),)
-
-            # Если нет ни ошибок, ни outputs - ждем дальше
-            time.sleep(poll_interval)
-
-        # Сюда код не должен дойти
-        # err_msg = f"Критическая ошибка: Цикл опроса неожиданно завершился для {launch_id}."
-        # print(f"[PiperViolations] {err_msg}")
-        # return (default_error_result_json,)
\ No newline at end of file
+            return (json.dumps({"error": err_msg, "details": result.errors}),)
+        if result.status == LaunchResult.LAUNCH_FAILED:
+            err_msg = f"Критическая ошибка: Не удалось запустить задачу или получить ID. Ответ API: {result.errors}"
+            print(f"[PiperViolations] {err_msg}")
+            return (json.dumps({"error": err_msg, "details": result.errors}),)
+        if result.status == LaunchResult.TIMEOUT:
+            err_msg = f"Критическая ошибка: Таймаут ({max_wait_time} сек) ожидания задачи {result.launch_id}"
+            print(f"[PiperViolations] {err_msg}")
+            return (json.dumps({"error": err_msg}),)
+        if result.status == LaunchResult.API_ERROR:
+            errors = result.errors
+            error_details = errors if isinstance(errors, list) else [str(errors)] # Всегда возвращаем список
+            print(f"[PiperViolations] Критическая ошибка API: Задача {result.launch_id} не удалась. Детали: {error_details}")
+            return (json.dumps({"error": "API processing failed", "details": error_details}),)
+
+        outputs = result.value
+        # Форматируем успешный результат в JSON
+        try:
+            result_json = json.dumps(outputs, indent=2)
+            print(f"[PiperViolations] Успех: Детекция завершена для задачи {result.launch_id}.") # Выводим сообщение об успехе
+            return (result_json,)
+        except Exception as e:
+            print(f"[PiperViolations] Критическая ошибка форматирования результата {result.launch_id}:")
+            traceback.print_exc()
+            err_msg = f"Критическая ошибка форматирования результата: {e}"
+            # Возвращаем исходный словарь outputs, если не удалось сериализовать
+            return (json.dumps({"warning": err_msg, "raw_outputs": outputs}),)
@@ -18,6 +18,8 @@ from .nodes.violations_node import PiperViolationsDetector
 from .nodes.video_node import PiperGenerateVideo
 from .nodes.dress_node import PiperDressFactory
 from .nodes.save_video_node import PiperSaveVideo
+from .nodes.video_frames_node import PiperVideoToFrames
+from .nodes.launch_await_node import PiperLaunchVideo, PiperLaunchImage, PiperAttachLaunch, PiperAwaitLaunch
 from .nodes.deepseek_node import PiperAskDeepseek
 from .nodes.llm_question_node import PiperLLMQuestion
 from .nodes.face_to_image_node import PiperFaceToImage
@@ -38,6 +40,11 @@ NODE_CLASS_MAPPINGS = {
     "PiperGenerateVideo": PiperGenerateVideo,
     "PiperDressFactory": PiperDressFactory,
     "PiperSaveVideo": PiperSaveVideo,
+    "PiperVideoToFrames": PiperVideoToFrames,
+    "PiperLaunchVideo": PiperLaunchVideo,
+    "PiperLaunchImage": PiperLaunchImage,
+    "PiperAttachLaunch": PiperAttachLaunch,
+    "PiperAwaitLaunch": PiperAwaitLaunch,
     "PiperAskDeepseek": PiperAskDeepseek,
     "PiperLLMQuestion": PiperLLMQuestion,
     "PiperFaceToImage": PiperFaceToImage,
@@ -56,6 +63,11 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "PiperGenerateVideo": "Piper Generate Video (PiperAPI)",
     "PiperDressFactory": "Piper Dress Factory (PiperAPI)",
     "PiperSaveVideo": "Piper Save Video (PiperAPI)",
+    "PiperVideoToFrames": "Piper Video To Frames (PiperAPI)",
+    "PiperLaunchVideo": "Piper Launch Video (PiperAPI)",
+    "PiperLaunchImage": "Piper Launch Image (PiperAPI)",
+    "PiperAttachLaunch": "Piper Attach Launch (PiperAPI)",
+    "PiperAwaitLaunch": "Piper Await Launch (PiperAPI)",
     "PiperAskDeepseek": "Piper Ask Deepseek (PiperAPI)",
     "PiperLLMQuestion": "Piper LLM Question (PiperAPI)",
     "PiperFaceToImage": "Piper Face To Image (PiperAPI)",
@@ -0,0 +1,104 @@
+# tests/conftest.py
+# Shared fixtures: every on-disk cache lives in a per-test temporary
+# directory, process-wide singletons are reset between tests, and `fake_api`
+# mounts a scripted requests adapter on the shared session (no network).
+import json
+import re
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("PIPER_CACHE_DIR", str(tmp_path / "cache"))
+    yield tmp_path / "cache"
+
+
+@pytest.fixture(autouse=True)
+def fresh_singletons(monkeypatch):
+    from nodes import circuit_breaker, rate_limiter, request_memo, launch_journal, upload_cache
+    circuit_breaker.reset_resilience()
+    monkeypatch.setattr(rate_limiter, "_rate_limiter", None)
+    monkeypatch.setattr(request_memo, "_request_memo", None)
+    monkeypatch.setattr(launch_journal, "_journal", None)
+    monkeypatch.setattr(upload_cache, "_upload_cache", None)
+    yield
+    circuit_breaker.reset_resilience()
+
+
+class FakeAPI(BaseAdapter):
+    """
+    Answers requests from a route table: {(METHOD, url_suffix): handler}, where
+    handler(request) returns (status, body[, headers]). Every request is logged.
+    """
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+        self.calls = []
+
+    def route(self, method, suffix, handler):
+        self.routes[(method, suffix)] = handler
+
+    def serve_file(self, url, data, ranges=True):
+        """
+        Routes url like a CDN (HEAD plus GET, honouring Range when ranges=True).
+        Returns the list of requested (start, end) ranges, None for whole-file GETs.
+        """
+        requested = []
+
+        def head(request):
+            headers = {"Content-Length": str(len(data))}
+            if ranges:
+                headers["Accept-Ranges"] = "bytes"
+            return 200, b"", headers
+
+        def get(request):
+            match = re.match(r"bytes=(\d+)-(\d+)", request.headers.get("Range", ""))
+            if not ranges or match is None:
+                requested.append(None)
+                return 200, data, {"Content-Length": str(len(data))}
+            start, end = int(match.group(1)), int(match.group(2))
+            requested.append((start, end))
+            return 206, data[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(data)}"}
+
+        self.route("HEAD", url, head)
+        self.route("GET", url, get)
+        return requested
+
+    def count(self, method, suffix):
+        return sum(1 for m, url in self.calls if m == method and url.endswith(suffix))
+
+    def send(self, request, **kwargs):
+        self.calls.append((request.method, request.url))
+        for (method, suffix), handler in self.routes.items():
+            if request.method == method and request.url.endswith(suffix):
+                status, body, *rest = handler(request)
+                return self._response(request, status, body, rest[0] if rest else {})
+        return self._response(request, 404, {"error": "no route"}, {})
+
+    @staticmethod
+    def _response(request, status, body, headers):
+        response = requests.Response()
+        response.status_code = status
+        response._content = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        response._content_consumed = True # iter_content() then streams from _content
+        response.headers.update(headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_api():
+    from nodes.utils import get_session
+    session = get_session()
+    adapter = FakeAPI()
+    previous = session.adapters.get("https://")
+    session.mount("https://", adapter)
+    yield adapter
+    session.mount("https://", previous)
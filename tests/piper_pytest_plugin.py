@@ -0,0 +1,15 @@
+# tests/piper_pytest_plugin.py
+# The package root is a ComfyUI custom node whose __init__.py needs ComfyUI
+# (folder_paths). Collect it as a plain directory, not a Package, so pytest
+# does not import that __init__.py and tests can import `nodes` on their own.
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pytest_collect_directory(path, parent):
+    if str(path) == ROOT:
+        return pytest.Dir.from_parent(parent, path=path)
+    return None
@@ -0,0 +1,94 @@
+# tests/test_async_utils.py
+import asyncio
+
+import pytest
+
+from nodes import async_utils
+from nodes.async_utils import run_async, race_launches
+from nodes.launch_engine import LaunchResult
+from nodes.utils import get_http_stats
+
+
+async def _current_loop():
+    return asyncio.get_running_loop()
+
+
+def test_run_async_reuses_one_background_loop():
+    first = run_async(_current_loop())
+    assert run_async(_current_loop()) is first
+    assert first.is_running()
+
+
+def test_run_async_propagates_errors():
+    async def fail():
+        raise ValueError("boom")
+    with pytest.raises(ValueError):
+        run_async(fail())
+
+
+def test_run_async_works_inside_a_running_loop():
+    async def caller():
+        return run_async(asyncio.sleep(0, result="done"))
+    assert asyncio.run(caller()) == "done"
+
+
+def test_run_async_rejects_reentry_from_the_loop():
+    async def nested():
+        return run_async(asyncio.sleep(0))
+    with pytest.raises(RuntimeError):
+        run_async(nested())
+
+
+def test_http_stats_include_async_connector():
+    stats = get_http_stats()
+    assert set(stats["async"]) == {"requests", "new_connections", "reused_connections", "reuse_ratio"}
+
+
+@pytest.fixture
+def scripted_launches(monkeypatch):
+    """Replaces async_run_launch: each launch sleeps `delay`, then returns `status`."""
+    events = []
+
+    async def fake_run_launch(name, delay, status=LaunchResult.SUCCESS):
+        events.append(("start", name))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            events.append(("cancelled", name))
+            raise
+        events.append(("done", name))
+        return LaunchResult(status, launch_id=name)
+
+    monkeypatch.setattr(async_utils, "async_run_launch", fake_run_launch)
+    return events
+
+
+def test_race_first_success_wins_and_cancels_the_rest(scripted_launches):
+    launches = [{"name": "slow", "delay": 5}, {"name": "fast", "delay": 0.05}, {"name": "slower", "delay": 10}]
+    winner, results, latencies = asyncio.run(race_launches(launches))
+    assert winner == 1 and results[1].launch_id == "fast"
+    assert results[0] is None and results[2] is None
+    assert latencies[1] < 1 and latencies[0] is None
+    assert sorted(e for e in scripted_launches if e[0] == "cancelled") == [("cancelled", "slow"), ("cancelled", "slower")]
+
+
+def test_race_failure_starts_the_next_launch_without_waiting(scripted_launches):
+    launches = [{"name": "broken", "delay": 0, "status": LaunchResult.API_ERROR}, {"name": "backup", "delay": 0}]
+    winner, results, _ = asyncio.run(race_launches(launches, stagger=30))
+    assert winner == 1
+    assert results[0].status == LaunchResult.API_ERROR
+    assert ("cancelled", "backup") not in scripted_launches
+
+
+def test_race_stagger_skips_later_launches_after_an_early_win(scripted_launches):
+    launches = [{"name": "first", "delay": 0.05}, {"name": "second", "delay": 0}]
+    winner, results, latencies = asyncio.run(race_launches(launches, stagger=5))
+    assert winner == 0 and results[1] is None and latencies[1] is None
+    assert ("start", "second") not in scripted_launches
+
+
+def test_race_all_failed_has_no_winner(scripted_launches):
+    launches = [{"name": n, "delay": 0, "status": LaunchResult.TIMEOUT} for n in ("a", "b")]
+    winner, results, _ = asyncio.run(race_launches(launches))
+    assert winner is None
+    assert [r.status for r in results] == [LaunchResult.TIMEOUT] * 2
@@ -0,0 +1,34 @@
+# tests/test_batch_runner.py
+import torch
+
+from nodes import batch_runner
+from nodes.batch_runner import BatchItem, collect_image_batch, run_image_batch
+from nodes.launch_engine import LaunchResult, extract_raw_json
+
+
+def test_failed_items_keep_their_place_as_placeholders():
+    ok = LaunchResult(LaunchResult.SUCCESS)
+    items = [
+        BatchItem(0, ok, torch.full((1, 8, 6, 3), 0.5)),
+        BatchItem(1, LaunchResult(LaunchResult.TIMEOUT, message="launch 7 timed out")),
+        BatchItem(2, ok, torch.ones(1, 8, 6, 3)),
+    ]
+    status_text, images = collect_image_batch(items, "[Test]")
+    assert images.shape == (3, 8, 6, 3)
+    assert torch.all(images[0] == 0.5) and torch.all(images[1] == 0) and torch.all(images[2] == 1)
+    assert "2/3" in status_text and "[1]" in status_text and "launch 7 timed out" in status_text
+
+
+def test_batch_launches_are_memoized_with_the_seed(monkeypatch):
+    sent = []
+
+    async def fake_gather(launches, concurrency):
+        sent.extend(launches)
+        return [LaunchResult(LaunchResult.SUCCESS, value={"i": n}) for n in range(len(launches))]
+
+    monkeypatch.setattr(batch_runner, "gather_launches", fake_gather)
+    items = run_image_batch("key", "https://api/launch", torch.zeros(2, 4, 4, 3), encode=lambda image: ("uri", None),
+                            build_launch_data=lambda uri: {"inputs": {"image": uri}}, extractor=extract_raw_json,
+                            memoize=True, seed=5)
+    assert [item.result.value for item in items] == [{"i": 0}, {"i": 1}]
+    assert [(launch["memoize"], launch["seed"]) for launch in sent] == [(True, 5), (True, 5)]
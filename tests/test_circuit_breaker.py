@@ -0,0 +1,93 @@
+# tests/test_circuit_breaker.py
+import time
+
+from nodes.circuit_breaker import CircuitBreaker, RetryBudget, endpoint_key
+
+
+def open_breaker(**kwargs):
+    breaker = CircuitBreaker("test", failure_threshold=2, **kwargs)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_endpoint_key_collapses_ids():
+    assert endpoint_key("https://app.piper.my/api/launches/65f0c2a1b3/state") == "app.piper.my/api/launches/*/state"
+    assert endpoint_key("https://app.piper.my/api/launches/123/state") == "app.piper.my/api/launches/*/state"
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_probe():
+    breaker = open_breaker(reset_timeout=0)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow() # Probe still in flight
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = open_breaker(reset_timeout=0)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker = open_breaker(reset_timeout=0)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_released_probe_lets_next_request_probe():
+    breaker = open_breaker(reset_timeout=0)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_lost_probe_expires():
+    breaker = open_breaker(reset_timeout=0, probe_timeout=0.05)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_abandon_request_releases_probe():
+    from nodes.circuit_breaker import breaker_for, reset_resilience
+    from nodes.utils import abandon_request
+    reset_resilience()
+    url = "https://example.invalid/api/launches/0123456789abcdef/state"
+    breaker = breaker_for(url)
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.allow()
+    abandon_request(url)
+    assert breaker.allow()
+    reset_resilience()
+
+
+def test_retry_budget_spends_and_refills():
+    budget = RetryBudget(ratio=1.0, min_per_second=0.0, window=10.0)
+    budget.tokens = 0.0
+    assert not budget.try_spend()
+    budget.record_request()
+    assert budget.try_spend()
+    assert budget.stats["exhausted"] == 1
@@ -0,0 +1,60 @@
+# tests/test_frame_store.py
+import numpy as np
+import pytest
+
+from nodes import frame_store
+from nodes.frame_store import FrameStore, DecoderUnavailable, target_size
+
+
+def fake_frames(count=6, height=4, width=5, fps=24.0):
+    """Stands in for PyAV/OpenCV: frame i is filled with the value i * 10."""
+    def frames(source, resize_width=0, resize_height=0):
+        yield fps
+        for i in range(count):
+            yield lambda i=i: np.full((height, width, 3), i * 10, dtype=np.uint8)
+    return frames
+
+
+def test_decode_round_trips_through_the_memmap(tmp_path, monkeypatch):
+    monkeypatch.setattr(frame_store, "iter_frames", fake_frames())
+    store = FrameStore(str(tmp_path))
+    key = store.key_for("https://cdn/v.mp4", stride=2)
+    frames, fps = store.decode(key, "https://cdn/v.mp4", stride=2, start_frame=1)
+    assert fps == 24.0 and frames.shape == (3, 4, 5, 3) and frames.dtype == np.float32
+    assert [round(float(frame[0, 0, 0]) * 255) for frame in frames] == [10, 30, 50]
+
+    reopened, fps = FrameStore(str(tmp_path)).get(key)
+    assert isinstance(reopened, np.memmap)
+    np.testing.assert_array_equal(reopened, frames)
+    reopened[0] = 0 # Copy-on-write: the stored file is not modified
+    np.testing.assert_array_equal(store.get(key)[0], frames)
+
+
+def test_max_frames_and_unknown_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(frame_store, "iter_frames", fake_frames())
+    store = FrameStore(str(tmp_path))
+    frames, _ = store.decode("k", "src", max_frames=2)
+    assert frames.shape[0] == 2
+    assert store.get("missing") is None and store.stats["misses"] == 1
+
+
+def test_eviction_keeps_the_newest(tmp_path, monkeypatch):
+    monkeypatch.setattr(frame_store, "iter_frames", fake_frames())
+    frame_bytes = 6 * 4 * 5 * 3 * 4
+    store = FrameStore(str(tmp_path), max_bytes=frame_bytes)
+    store.decode("old", "src")
+    store.decode("new", "src")
+    assert store.get("old") is None and store.get("new") is not None
+
+
+def test_target_size_keeps_aspect_ratio():
+    assert target_size(640, 360, resize_width=320) == (320, 180)
+    assert target_size(640, 360, resize_height=180) == (320, 180)
+    assert target_size(640, 360) == (640, 360)
+
+
+def test_no_decoder_installed(monkeypatch):
+    monkeypatch.setattr(frame_store, "av", None)
+    monkeypatch.setattr(frame_store, "cv2", None)
+    with pytest.raises(DecoderUnavailable):
+        frame_store.iter_frames("src")
@@ -0,0 +1,63 @@
+# tests/test_image_convert.py
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from nodes.image_convert import (
+    tensor_to_uint8, uint8_to_tensor, pil_to_tensor, pil_images_to_tensor, tensor_to_pil_images,
+)
+
+
+# --- Previous conversions (as they were in nodes/utils.py) ---
+
+def legacy_encode(image_np):
+    if image_np.min() < 0.0 or image_np.max() > 1.0:
+        image_np = np.clip(image_np, 0.0, 1.0)
+    return (image_np * 255).astype(np.uint8)
+
+
+def legacy_decode(image):
+    image = np.array(image.convert("RGB")).astype(np.float32) / 255.0
+    return torch.from_numpy(image)[None,]
+
+
+@pytest.fixture
+def batch():
+    generator = torch.Generator().manual_seed(0)
+    images = torch.rand(3, 17, 23, 3, generator=generator)
+    images[0, 0, :4] = torch.tensor([0.0, 1.0, 0.5, 254.5 / 255.0]).unsqueeze(1)
+    return images
+
+
+@pytest.mark.parametrize("assume_normalized", [False, True])
+def test_encode_matches_legacy(batch, assume_normalized):
+    pixels = tensor_to_uint8(batch, assume_normalized=assume_normalized)
+    assert pixels.dtype == np.uint8 and pixels.shape == tuple(batch.shape)
+    np.testing.assert_array_equal(pixels, legacy_encode(batch.numpy()))
+
+
+def test_encode_clamps_like_legacy(batch):
+    out_of_range = batch * 1.6 - 0.3
+    np.testing.assert_array_equal(tensor_to_uint8(out_of_range), legacy_encode(out_of_range.numpy()))
+
+
+def test_decode_matches_legacy(batch):
+    images = tensor_to_pil_images(batch)
+    assert [image.mode for image in images] == ["RGB"] * 3
+    for image in images:
+        assert torch.equal(pil_to_tensor(image), legacy_decode(image))
+    stacked = pil_images_to_tensor(images)
+    assert stacked.dtype == torch.float32
+    assert torch.equal(stacked, torch.cat([legacy_decode(image) for image in images]))
+
+
+def test_decode_converts_mode():
+    image = Image.fromarray(np.arange(48, dtype=np.uint8).reshape(4, 4, 3), "RGB").convert("RGBA")
+    assert torch.equal(pil_to_tensor(image), legacy_decode(image))
+    assert uint8_to_tensor(np.zeros((2, 4, 4, 3), dtype=np.uint8)).shape == (2, 4, 4, 3)
+
+
+def test_round_trip_is_exact():
+    pixels = np.arange(256 * 3, dtype=np.uint16).astype(np.uint8).reshape(1, 16, 16, 3)
+    np.testing.assert_array_equal(tensor_to_uint8(uint8_to_tensor(pixels)), pixels)
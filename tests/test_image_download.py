@@ -0,0 +1,50 @@
+# tests/test_image_download.py
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from nodes.utils import ImageDownload, DownloadLimitError, url_to_image_tensor
+
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((height, width, 3), 200, dtype=np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_pixel_guard_trips_on_the_header_chunk():
+    data = _png(64, 64)
+    download = ImageDownload(max_pixels=32 * 32)
+    with pytest.raises(DownloadLimitError):
+        download.feed(data[:64]) # PNG header with the image size, no pixel data yet
+    assert download.received == 64
+
+
+def test_byte_guard_trips_before_the_body_is_complete():
+    data = _png(64, 64)
+    download = ImageDownload(max_bytes=len(data) - 1)
+    download.check_declared(None) # Unknown length passes
+    with pytest.raises(DownloadLimitError):
+        download.check_declared(len(data))
+    download.feed(data[:100])
+    with pytest.raises(DownloadLimitError):
+        download.feed(data[100:])
+
+
+@pytest.mark.parametrize("max_side", [None, 16])
+def test_chunked_feed_decodes_the_image(max_side):
+    data = _png(64, 48)
+    download = ImageDownload(max_side=max_side)
+    for start in range(0, len(data), 50):
+        download.feed(data[start:start + 50])
+    with download.close() as image:
+        assert max(image.size) == (64 if max_side is None else 16)
+        assert image.convert("RGB").getpixel((0, 0)) == (200, 200, 200)
+
+
+def test_url_download_rejects_oversized_images(fake_api):
+    fake_api.route("GET", "/big.png", lambda request: (200, _png(64, 64), {"Content-Type": "image/png"}))
+    assert url_to_image_tensor("https://cdn.example/big.png", max_pixels=32 * 32, use_cache=False) is None
+    assert url_to_image_tensor("https://cdn.example/big.png", use_cache=False).shape == (1, 64, 64, 3)
@@ -0,0 +1,99 @@
+# tests/test_launch_journal.py
+import itertools
+
+from nodes.launch_engine import PollPolicy, LaunchResult, run_launch, launch_url_for, extract_video_url
+from nodes.launch_journal import LaunchJournal, journal_inputs, get_launch_journal
+
+
+def test_journal_round_trip(tmp_path):
+    journal = LaunchJournal(str(tmp_path / "journal.sqlite3"))
+    journal.record_launch("key", "https://x/launch", {"inputs": {"prompt": "a", "image": "x" * 5000}}, "L1")
+    entry = journal.get("L1")
+    assert entry["status"] == "launched"
+    assert entry["inputs"]["inputs"]["prompt"] == "a"
+    assert entry["inputs"]["inputs"]["image"].startswith("sha256:")
+    journal.update_status("L1", "success", "done")
+    assert journal.get("L1")["status"] == "success"
+    assert journal.recent(unfinished_only=True) == []
+
+
+def test_claim_reattach_limits(tmp_path):
+    journal = LaunchJournal(str(tmp_path / "journal.sqlite3"), max_reattach=2)
+    journal.record_launch("key", "https://x/launch", {}, "L1")
+    journal.update_status("L1", "timeout")
+    assert journal.claim_reattach("key") == "L1"
+    assert journal.claim_reattach("key") == "L1"
+    assert journal.claim_reattach("key") is None # Given up on
+    assert journal.get("L1")["status"] == "abandoned"
+    assert journal.claim_reattach("other") is None
+
+
+def test_claim_reattach_respects_window(tmp_path):
+    journal = LaunchJournal(str(tmp_path / "journal.sqlite3"), reattach_window=0)
+    journal.record_launch("key", "https://x/launch", {}, "L1")
+    assert journal.claim_reattach("key") is None
+
+
+def test_finished_launches_are_not_reattached(tmp_path):
+    journal = LaunchJournal(str(tmp_path / "journal.sqlite3"))
+    journal.record_launch("key", "https://x/launch", {}, "L1")
+    journal.update_status("L1", "api_error")
+    assert journal.claim_reattach("key") is None
+
+
+def test_journal_inputs_hash_long_strings():
+    shrunk = journal_inputs({"inputs": {"image": "y" * 2000, "n": 1}})
+    assert shrunk["inputs"]["n"] == 1
+    assert "(2000 chars)" in shrunk["inputs"]["image"]
+
+
+def _hung_api(fake_api):
+    ids = (f"L{i}" for i in itertools.count(1))
+    fake_api.route("POST", "/generate-video-v1/launch", lambda request: (200, {"_id": next(ids)}))
+    fake_api.route("GET", "/state", lambda request: (200, {"outputs": None, "errors": None}))
+
+
+def _run(force_new=False):
+    return run_launch(launch_url_for("generate-video-v1"), "key", {"inputs": {"prompt": "p", "mode": "preview"}},
+                      extractor=extract_video_url, policy=PollPolicy(poll_interval=0.05, max_wait_time=0.3, jitter=0),
+                      memoize=True, force_new=force_new)
+
+
+def test_hung_launch_is_reattached_then_abandoned(fake_api):
+    _hung_api(fake_api)
+    launch_suffix = "/generate-video-v1/launch"
+    statuses = [_run().status for _ in range(4)]
+    assert statuses == [LaunchResult.TIMEOUT] * 4
+    # Run 1 launches, runs 2-3 re-attach (max 2), run 4 gives up and launches again
+    assert fake_api.count("POST", launch_suffix) == 2
+    assert get_launch_journal().get("L1")["status"] == "abandoned"
+
+
+def test_force_new_skips_reattach(fake_api):
+    _hung_api(fake_api)
+    _run()
+    _run(force_new=True)
+    assert fake_api.count("POST", "/generate-video-v1/launch") == 2
+
+
+def test_reattach_returns_result_without_relaunch(fake_api):
+    state = {"outputs": None, "errors": None}
+    fake_api.route("POST", "/generate-video-v1/launch", lambda request: (200, {"_id": "L1"}))
+    fake_api.route("GET", "/state", lambda request: (200, state))
+    assert _run().status == LaunchResult.TIMEOUT
+    state["outputs"] = {"video": "https://cdn/v.mp4"}
+    result = _run()
+    assert result.ok and result.value == "https://cdn/v.mp4" and result.launch_id == "L1"
+    assert fake_api.count("POST", "/generate-video-v1/launch") == 1
+    assert get_launch_journal().get("L1")["status"] == "success"
+
+
+def test_unknown_launch_falls_back_to_new_launch(fake_api):
+    ids = iter(["L1", "L2"])
+    fake_api.route("POST", "/generate-video-v1/launch", lambda request: (200, {"_id": next(ids)}))
+    fake_api.route("GET", "/L1/state", lambda request: (200, {}))
+    assert _run().status == LaunchResult.TIMEOUT
+    fake_api.route("GET", "/L1/state", lambda request: (404, {"error": "unknown launch"}))
+    fake_api.route("GET", "/L2/state", lambda request: (200, {"outputs": {"video": "https://cdn/2.mp4"}}))
+    result = _run()
+    assert result.ok and result.launch_id == "L2"
@@ -0,0 +1,90 @@
+# tests/test_ranged_download.py
+import os
+import threading
+import time
+
+import pytest
+
+from nodes import ranged_download
+from nodes.ranged_download import download_file, partial_paths, DownloadAborted
+
+URL = "https://cdn.test/video.mp4"
+DATA = bytes(range(256)) * 256 # 64 KiB
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    monkeypatch.setattr(ranged_download, "MIN_SEGMENT_SIZE", 8 * 1024)
+    monkeypatch.setattr(ranged_download, "CHUNK_SIZE", 1024)
+    monkeypatch.setattr(ranged_download, "MANIFEST_EVERY", 1024)
+
+
+def serve(fake_api, data=DATA, ranges=True):
+    return fake_api.serve_file(URL, data, ranges)
+
+
+def slow_chunks():
+    time.sleep(0.005) # should_abort() runs per chunk: stretches each download so they overlap
+    return False
+
+
+def test_concurrent_downloads_of_one_url_do_not_clobber(fake_api, tmp_path, small_segments):
+    serve(fake_api, ranges=False)
+    errors = []
+
+    def save(name):
+        try:
+            download_file(URL, str(tmp_path / name), connections=1, should_abort=slow_chunks)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(f"{i}.mp4",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    for i in range(3):
+        assert (tmp_path / f"{i}.mp4").read_bytes() == DATA
+
+
+def test_waiting_for_the_lock_is_abortable(tmp_path):
+    part_path, _ = partial_paths(URL)
+    with ranged_download.download_lock(f"{part_path}.lock"):
+        with pytest.raises(DownloadAborted):
+            download_file(URL, str(tmp_path / "x.mp4"), should_abort=lambda: True)
+
+
+def test_ranged_download_uses_parallel_segments(fake_api, tmp_path, small_segments):
+    requested = serve(fake_api)
+    dest = tmp_path / "v.mp4"
+    assert download_file(URL, str(dest), connections=4) == len(DATA)
+    assert dest.read_bytes() == DATA
+    segments = sorted(r for r in requested if r != (0, 0)) # (0, 0) would be the probe
+    assert len(segments) == 4 and segments[0][0] == 0 and segments[-1][1] == len(DATA) - 1
+    assert not any(os.path.exists(path) for path in partial_paths(URL))
+
+
+def test_falls_back_to_single_stream_without_ranges(fake_api, tmp_path, small_segments):
+    requested = serve(fake_api, ranges=False)
+    dest = tmp_path / "v.mp4"
+    assert download_file(URL, str(dest), connections=4) == len(DATA)
+    assert dest.read_bytes() == DATA
+    assert requested[-1] is None # Whole file in one request
+
+
+def test_interrupted_download_resumes(fake_api, tmp_path, small_segments):
+    requested = serve(fake_api)
+    dest = tmp_path / "v.mp4"
+    calls = iter(range(1000))
+    with pytest.raises(DownloadAborted):
+        download_file(URL, str(dest), connections=4, should_abort=lambda: next(calls) >= 12)
+    assert not dest.exists()
+    part_path, manifest_path = partial_paths(URL)
+    assert os.path.exists(part_path) and os.path.exists(manifest_path)
+
+    requested.clear()
+    assert download_file(URL, str(dest), connections=4) == len(DATA)
+    assert dest.read_bytes() == DATA
+    resumed = sum(end - start + 1 for start, end in (r for r in requested if r and r != (0, 0)))
+    assert resumed < len(DATA) # Only the missing ranges were fetched again
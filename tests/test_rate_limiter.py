@@ -0,0 +1,96 @@
+# tests/test_rate_limiter.py
+import time
+
+import pytest
+import torch
+
+from nodes.launch_engine import PollPolicy, LaunchResult, poll_launch, state_url_for
+from nodes.rate_limiter import TokenBucket, RateLimiter, endpoint_class, _parse_limits
+from nodes.utils import UPLOAD_URL, RateLimited, admit_request, upload_image_and_get_url
+
+STATE_URL = state_url_for("L1")
+
+
+def test_endpoint_classes():
+    assert endpoint_class("https://app.piper.my/api/generate-video-v1/launch") == "launch"
+    assert endpoint_class("https://app.piper.my/api/launches/abc/state") == "state"
+    assert endpoint_class("https://app.piper.my/api/launches/abc/cancel") == "state"
+    assert endpoint_class("https://app.piper.my/api/upload-file-v1") == "upload"
+    assert endpoint_class("https://cdn.example.com/x.png") == "download"
+
+
+def test_parse_limits_overrides_and_ignores_garbage():
+    limits = _parse_limits("launch=2:5,state=x,bogus=1:1")
+    assert limits["launch"] == (2.0, 5.0)
+    assert limits["state"] == (20.0, 40.0)
+    assert "bogus" not in limits
+
+
+def test_bucket_burst_then_waits():
+    bucket = TokenBucket(rate=10.0, burst=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    delay = bucket.reserve()
+    assert 0.05 < delay <= 0.1
+
+
+def test_unlimited_bucket_still_honours_block():
+    bucket = TokenBucket(rate=0.0, burst=0.0)
+    assert bucket.reserve() == 0.0
+    bucket.block_for(5)
+    assert 4.5 < bucket.reserve() <= 5.0
+
+
+def test_shared_state_file_is_used_by_every_bucket(tmp_path):
+    first = TokenBucket(rate=1.0, burst=1, state_path=str(tmp_path / "bucket.json"))
+    second = TokenBucket(rate=1.0, burst=1, state_path=str(tmp_path / "bucket.json"))
+    assert first.reserve() == 0.0
+    assert second.reserve() > 0.5 # The token was taken through the file
+
+
+def test_limiter_keys_by_api_key():
+    limiter = RateLimiter({"launch": (1.0, 1.0), "state": (0, 0), "upload": (0, 0), "download": (0, 0)})
+    url = "https://app.piper.my/api/x/launch"
+    assert limiter.reserve("key-a", url) == 0.0
+    assert limiter.reserve("key-b", url) == 0.0
+    assert limiter.reserve("key-a", url) > 0.0
+
+
+def test_upload_honours_retry_after(fake_api):
+    fake_api.route("POST", "/upload-file-v1", lambda request: (429, {"error": "slow down"}, {"Retry-After": "7"}))
+    assert upload_image_and_get_url(torch.zeros(1, 4, 4, 3), "key") is None
+    from nodes.rate_limiter import get_rate_limiter
+    limiter = get_rate_limiter()
+    assert limiter.stats["retry_after"] == 1
+    assert limiter.reserve("key", UPLOAD_URL) > 6.0
+
+
+def test_upload_feeds_breaker(fake_api):
+    from nodes.circuit_breaker import breaker_for
+    fake_api.route("POST", "/upload-file-v1", lambda request: (503, {"error": "down"}))
+    breaker = breaker_for(UPLOAD_URL)
+    for _ in range(breaker.failure_threshold):
+        upload_image_and_get_url(torch.zeros(1, 4, 4, 3), "key")
+    assert breaker.state == breaker.OPEN
+    calls = len(fake_api.calls)
+    assert upload_image_and_get_url(torch.zeros(1, 4, 4, 3), "key") is None
+    assert len(fake_api.calls) == calls # Rejected locally
+
+
+def test_rate_limit_wait_respects_the_deadline(fake_api):
+    fake_api.route("GET", "/L1/state", lambda request: (429, {"error": "slow down"}, {"Retry-After": "20"}))
+    started = time.monotonic()
+    result = poll_launch("L1", "key", policy=PollPolicy(poll_interval=0.1, max_wait_time=3, jitter=0),
+                         use_shared_poller=False)
+    assert result.status == LaunchResult.TIMEOUT
+    assert time.monotonic() - started < 3
+    assert fake_api.count("GET", "/L1/state") == 1 # The second poll was never sent
+
+
+def test_admit_request_gives_back_rejected_tokens():
+    from nodes.rate_limiter import get_rate_limiter
+    get_rate_limiter().retry_after("key", STATE_URL, 30)
+    with pytest.raises(RateLimited) as error:
+        admit_request(STATE_URL, api_key="key", max_wait=1)
+    assert error.value.retry_after > 29
+    assert get_rate_limiter().stats["released"] == 1
@@ -0,0 +1,94 @@
+# tests/test_request_memo.py
+from nodes.kv_store import SQLiteKVStore
+from nodes.launch_engine import PollPolicy, run_launch, launch_url_for, extract_video_url, memo_forget
+from nodes.request_memo import canonical_key, request_fingerprint, node_fingerprint, launch_memo_key, get_request_memo
+from nodes.utils import remote_url_available
+
+
+def test_canonical_key_is_order_independent():
+    assert canonical_key({"a": 1, "b": 2}) == canonical_key({"b": 2, "a": 1})
+    assert canonical_key({"a": 1}) != canonical_key({"a": 2})
+
+
+def test_fingerprint_ignores_non_semantic_inputs():
+    base = {"prompt": "p", "seed": 1, "poll_interval": 5}
+    assert request_fingerprint("e", base) == request_fingerprint("e", dict(base, poll_interval=9))
+    assert request_fingerprint("e", base) != request_fingerprint("e", dict(base, seed=2))
+
+
+def test_node_fingerprint_forces_rerun_on_request():
+    inputs = {"prompt": "a", "seed": 1}
+    assert node_fingerprint("x", inputs) == node_fingerprint("x", dict(inputs))
+    assert node_fingerprint("x", inputs) != node_fingerprint("x", {**inputs, "seed": 2})
+    for override in ({"use_cache": False}, {"force_new_launch": True}):
+        value = node_fingerprint("x", {**inputs, **override})
+        assert value != value # NaN never matches the previous run
+
+
+def test_memo_key_depends_on_api_key_and_seed():
+    data = {"inputs": {"prompt": "p"}}
+    assert launch_memo_key("u", "k1", data) != launch_memo_key("u", "k2", data)
+    assert launch_memo_key("u", "k1", data, seed=1) != launch_memo_key("u", "k1", data, seed=2)
+
+
+def test_memo_round_trip_survives_reopen():
+    memo = get_request_memo()
+    memo.remember("key", "L1", "https://cdn/x", {"video": "https://cdn/x"})
+    path = memo.store.path
+    reopened = SQLiteKVStore(path, table="launches")
+    assert reopened.get("key")["launch_id"] == "L1"
+    memo.forget("key")
+    assert memo.lookup("key") is None
+
+
+def test_kv_store_evicts_and_expires(tmp_path):
+    store = SQLiteKVStore(str(tmp_path / "kv.sqlite3"), max_entries=2)
+    for i in range(3):
+        store.put(f"k{i}", i)
+    assert len(store) == 2 and store.get("k0") is None
+    expiring = SQLiteKVStore(str(tmp_path / "ttl.sqlite3"), ttl=-1)
+    expiring.put("k", 1)
+    assert expiring.get("k") is None
+
+
+def _run_video(seed=0, validate=None):
+    return run_launch(launch_url_for("generate-video-v1"), "key", {"inputs": {"prompt": "p", "mode": "preview"}},
+                      extractor=extract_video_url, policy=PollPolicy(poll_interval=0.05, max_wait_time=1, jitter=0),
+                      memoize=True, seed=seed, memo_validate=validate)
+
+
+def _video_api(fake_api):
+    ids = iter(["L1", "L2", "L3"])
+    fake_api.route("POST", "/generate-video-v1/launch", lambda request: (200, {"_id": next(ids)}))
+    # Each launch renders https://cdn/<launch id>.mp4
+    state = lambda request: (200, {"outputs": {"video": f"https://cdn/{request.url.split('/')[-2]}.mp4"}})
+    fake_api.route("GET", "/state", state)
+
+
+def test_memoized_result_is_reused_per_seed(fake_api):
+    _video_api(fake_api)
+    first = _run_video()
+    again = _run_video()
+    assert again.message == "memoized" and again.value == first.value
+    assert _run_video(seed=1).launch_id == "L2"
+    assert fake_api.count("POST", "/generate-video-v1/launch") == 2
+
+
+def test_rejected_memoized_url_is_forgotten(fake_api):
+    _video_api(fake_api)
+    assert _run_video().launch_id == "L1"
+    assert _run_video(validate=lambda url: False).launch_id == "L2"
+    assert _run_video().launch_id == "L2" # The fresh result replaced the stale one
+
+
+def test_memo_forget_drops_result(fake_api):
+    _video_api(fake_api)
+    memo_forget(_run_video())
+    assert _run_video().launch_id == "L2"
+
+
+def test_remote_url_available(fake_api):
+    fake_api.route("HEAD", "cdn.test/gone.mp4", lambda request: (404, {}))
+    fake_api.route("HEAD", "cdn.test/ok.mp4", lambda request: (200, {}))
+    assert not remote_url_available("https://cdn.test/gone.mp4")
+    assert remote_url_available("https://cdn.test/ok.mp4")
@@ -0,0 +1,51 @@
+# tests/test_result_cache.py
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from nodes import result_cache
+from nodes.result_cache import ResultImageCache
+from nodes.utils import url_to_image_tensor
+
+
+def png_bytes(width=8, height=6):
+    pixels = np.arange(width * height * 3, dtype=np.uint8).reshape(height, width, 3)
+    with io.BytesIO() as buffer:
+        Image.fromarray(pixels, "RGB").save(buffer, format="PNG")
+        return buffer.getvalue(), pixels
+
+
+@pytest.fixture(autouse=True)
+def fresh_result_cache(monkeypatch):
+    monkeypatch.setattr(result_cache, "_result_cache", None)
+
+
+def test_cache_hit_makes_no_second_request(fake_api):
+    data, pixels = png_bytes()
+    fake_api.route("GET", "/a.png", lambda request: (200, data, {"Content-Type": "image/png"}))
+    first = url_to_image_tensor("https://cdn.test/a.png")
+    second = url_to_image_tensor("https://cdn.test/a.png")
+    assert fake_api.count("GET", "/a.png") == 1
+    assert first.shape == second.shape == (1, 6, 8, 3)
+    np.testing.assert_array_equal((second[0].numpy() * 255).round().astype(np.uint8), pixels)
+    assert result_cache.get_result_cache().stats["hits"] == 1
+
+
+def test_use_cache_false_always_downloads(fake_api):
+    data, _ = png_bytes()
+    fake_api.route("GET", "/a.png", lambda request: (200, data))
+    url_to_image_tensor("https://cdn.test/a.png", use_cache=False)
+    url_to_image_tensor("https://cdn.test/a.png", use_cache=False)
+    assert fake_api.count("GET", "/a.png") == 2
+
+
+def test_identical_bytes_share_one_file(tmp_path):
+    cache = ResultImageCache(str(tmp_path))
+    pixels = np.zeros((2, 2, 3), dtype=np.uint8)
+    cache.put("https://cdn/a.png", None, "digest", pixels)
+    cache.put("https://cdn/b.png", None, "digest", pixels)
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    assert cache.get("https://cdn/b.png") is not None
+    assert cache.get("https://cdn/b.png", max_side=64) is None # Reduced decodes are keyed separately
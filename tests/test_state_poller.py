@@ -0,0 +1,82 @@
+# tests/test_state_poller.py
+import time
+
+from nodes import state_poller
+from nodes.launch_engine import Deadline, PollPolicy, state_url_for, attach_launch, await_launch
+from nodes.state_poller import StatePoller
+from nodes.utils import get_request as real_get_request
+
+
+def _recording_get(monkeypatch, responses):
+    timeouts = []
+
+    def get_request(url, api_key, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        return responses.pop(0) if responses else {"outputs": None}
+
+    monkeypatch.setattr(state_poller, "get_request", get_request)
+    return timeouts
+
+
+def test_poll_timeout_is_capped_by_deadline(monkeypatch):
+    timeouts = _recording_get(monkeypatch, [{"outputs": {"image": "https://cdn/x.png"}}])
+    poller = StatePoller(max_workers=1)
+    policy = PollPolicy(poll_interval=0.1, jitter=0, request_timeout=60)
+    future = poller.watch("L1", "key", policy, deadline=Deadline(5))
+    assert future.result(timeout=5) == {"outputs": {"image": "https://cdn/x.png"}}
+    assert 0 < timeouts[0] <= 5
+    assert poller.stats == {"polls": 1, "resolved": 1, "expired": 0}
+
+
+def test_background_watch_is_capped_by_policy_wait(monkeypatch):
+    timeouts = _recording_get(monkeypatch, [{"outputs": None}, {"outputs": {"video": "https://cdn/v.mp4"}}])
+    poller = StatePoller(max_workers=1)
+    policy = PollPolicy(poll_interval=0.1, jitter=0, request_timeout=60, max_wait_time=3)
+    future = poller.watch("L1", "key", policy, background=True)
+    future.result(timeout=5)
+    assert timeouts and all(timeout <= 3 for timeout in timeouts)
+    assert poller.in_flight() == []
+
+
+def test_unawaited_background_watch_expires(monkeypatch):
+    _recording_get(monkeypatch, [])
+    poller = StatePoller(max_workers=1)
+    policy = PollPolicy(poll_interval=0.1, jitter=0, max_wait_time=0.3)
+    future = poller.watch("L1", "key", policy, background=True)
+    # Re-attaching (Piper Attach Launch re-runs every queue) shares the registration
+    assert poller.watch("L1", "key", policy, background=True) is future
+    assert poller._entries["L1"].waiters == 0
+    time.sleep(1.5)
+    assert future.cancelled()
+    assert poller.in_flight() == [] and poller.stats["expired"] == 1
+
+
+def test_rate_limited_poll_is_rescheduled_not_slept(monkeypatch):
+    from nodes.rate_limiter import get_rate_limiter
+    get_rate_limiter().retry_after("slow-key", state_url_for("L1"), 30)
+    calls = []
+
+    def get_request(*args, **kwargs):
+        calls.append(kwargs)
+        return real_get_request(*args, **kwargs)
+
+    monkeypatch.setattr(state_poller, "get_request", get_request)
+    poller = StatePoller(max_workers=1)
+    poller.watch("L1", "slow-key", PollPolicy(poll_interval=0.1, jitter=0))
+    time.sleep(0.5)
+    entry = poller._entries["L1"]
+    assert calls and calls[0]["max_wait"] == 0
+    assert entry.next_due - time.monotonic() > 20 # Pushed back by the Retry-After, worker released
+    assert not entry.in_flight
+    poller.unwatch("L1")
+
+
+def test_await_after_background_watch_expired(fake_api):
+    state = {"outputs": None}
+    fake_api.route("GET", "/L9/state", lambda request: (200, state))
+    handle = attach_launch("L9", "key", "video_url", PollPolicy(poll_interval=0.1, jitter=0, max_wait_time=0.3))
+    time.sleep(1.5)
+    assert handle.future.cancelled()
+    state["outputs"] = {"video": "https://cdn/v.mp4"}
+    result = await_launch(handle, max_wait_time=5)
+    assert result.ok and result.value == "https://cdn/v.mp4"
@@ -0,0 +1,51 @@
+# tests/test_upload_cache.py
+import torch
+
+from nodes.upload_cache import UploadCache, tensor_content_hash
+from nodes.utils import upload_image_and_get_url, prepare_image_transport
+
+
+def test_content_hash_follows_pixels():
+    image = torch.zeros(1, 4, 4, 3)
+    assert tensor_content_hash(image) == tensor_content_hash(image.clone())
+    assert tensor_content_hash(image) != tensor_content_hash(image + 0.5)
+
+
+def test_cache_expires_and_persists_urls(tmp_path):
+    path = str(tmp_path / "uploads.json")
+    cache = UploadCache(ttl=60, persist_path=path)
+    cache.put("url:k:PNG:h", ("https://cdn/x.png", None))
+    cache.put("payload:base64:PNG:h", ("data:image/png;base64,AA", None))
+    reopened = UploadCache(ttl=60, persist_path=path)
+    assert tuple(reopened.get("url:k:PNG:h")) == ("https://cdn/x.png", None)
+    assert reopened.get("payload:base64:PNG:h") is None # Payloads stay in memory
+    assert UploadCache(ttl=0, persist_path=path).get("url:k:PNG:h") is None
+
+
+def test_upload_returns_url(fake_api):
+    fake_api.route("POST", "/upload-file-v1", lambda request: (200, {"url": "https://cdn/x.png"}))
+    assert upload_image_and_get_url(torch.zeros(1, 4, 4, 3), "key") == "https://cdn/x.png"
+
+
+def test_upload_uses_image_format(fake_api):
+    sent = []
+
+    def upload(request):
+        sent.append(request.body)
+        return 200, {"url": "https://cdn/x.jpg"}
+
+    fake_api.route("POST", "/upload-file-v1", upload)
+    assert upload_image_and_get_url(torch.zeros(2, 4, 4, 3), "key", image_format="JPEG") == "https://cdn/x.jpg"
+    body = sent[0]
+    assert b'filename="image.jpeg"' in body and b"Content-Type: image/jpeg" in body
+
+
+def test_upload_cache_is_keyed_by_api_key(fake_api):
+    urls = iter(["https://cdn/a.png", "https://cdn/b.png"])
+    fake_api.route("POST", "/upload-file-v1", lambda request: (200, {"url": next(urls)}))
+    image = torch.zeros(1, 4, 4, 3)
+    assert prepare_image_transport(image, "key-a", transport="upload") == ("https://cdn/a.png", None)
+    assert prepare_image_transport(image, "key-a", transport="upload") == ("https://cdn/a.png", None)
+    # Another account must not receive a URL uploaded with key-a
+    assert prepare_image_transport(image, "key-b", transport="upload") == ("https://cdn/b.png", None)
+    assert fake_api.count("POST", "/upload-file-v1") == 2
@@ -0,0 +1,55 @@
+# tests/test_video_store.py
+import os
+import shutil
+
+from nodes import video_store
+from nodes.video_store import VideoStore, link_into
+
+URL = "https://cdn.test/clip.mp4"
+DATA = b"video-bytes" * 1000
+
+
+def test_second_fetch_reuses_the_stored_copy(fake_api, tmp_path):
+    requested = fake_api.serve_file(URL, DATA, ranges=False)
+    store = VideoStore(str(tmp_path / "store"))
+    assert store.fetch(URL, str(tmp_path / "a.mp4"), connections=1) == (len(DATA), False)
+    downloads = len(requested)
+    assert store.fetch(URL, str(tmp_path / "b.mp4"), connections=1) == (len(DATA), True)
+    assert len(requested) == downloads # No second download
+    assert (tmp_path / "b.mp4").read_bytes() == DATA
+    assert store.stats["hits"] == 1 and store.stats["misses"] == 1
+
+
+def test_link_into_falls_back_from_reflink_to_hardlink_to_copy(tmp_path, monkeypatch):
+    src = tmp_path / "src.mp4"
+    src.write_bytes(DATA)
+
+    def unsupported(*args):
+        raise OSError("not supported")
+
+    monkeypatch.setattr(video_store, "_reflink", unsupported)
+    assert link_into(str(src), str(tmp_path / "hard.mp4")) == "hardlink"
+    assert os.stat(tmp_path / "hard.mp4").st_ino == os.stat(src).st_ino
+
+    monkeypatch.setattr(os, "link", unsupported)
+    assert link_into(str(src), str(tmp_path / "copy.mp4")) == "copy"
+    assert (tmp_path / "copy.mp4").read_bytes() == DATA
+    assert os.stat(tmp_path / "copy.mp4").st_ino != os.stat(src).st_ino
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_link_into_prefers_reflink(tmp_path, monkeypatch):
+    src = tmp_path / "src.mp4"
+    src.write_bytes(DATA)
+    monkeypatch.setattr(video_store, "_reflink", shutil.copyfile) # Stands in for FICLONE
+    assert link_into(str(src), str(tmp_path / "dest.mp4")) == "reflink"
+
+
+def test_evicted_object_is_downloaded_again(fake_api, tmp_path):
+    requested = fake_api.serve_file(URL, DATA, ranges=False)
+    store = VideoStore(str(tmp_path / "store"))
+    store.fetch(URL, str(tmp_path / "a.mp4"), connections=1)
+    os.remove(store.lookup(URL))
+    downloads = len(requested)
+    assert store.fetch(URL, str(tmp_path / "b.mp4"), connections=1) == (len(DATA), False)
+    assert len(requested) > downloads